@@ -0,0 +1,86 @@
+"""Latency and recall@k of the BM25 backend against the TF-IDF path.
+
+Run from the repository root::
+
+    python -m benchmarks.bm25_vs_tfidf --chunks 100000 --queries 500
+
+A synthetic corpus is written to a temporary directory, both indexes are
+built, and each labeled query (rare terms sampled from one passage) is run
+through ``retriever_local.search`` and ``retriever_bm25.search``. Results are
+printed as JSON.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic import labeled_queries, write_corpus
+from src.services import retriever_bm25, retriever_local
+
+
+def _run(search, index, queries, k):
+    latencies, found = [], 0
+    for query, row in queries:
+        t0 = time.perf_counter()
+        hits = search(index, query, k=k)
+        latencies.append(time.perf_counter() - t0)
+        path, _, chunk_id = index["meta"][row]
+        found += any(h.path == path and h.chunk_id == chunk_id for h in hits)
+    ms = np.asarray(latencies) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        f"recall@{k}": round(found / len(queries), 4),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        docs, index_path = Path(tmp) / "docs", Path(tmp) / "index"
+        write_corpus(docs, args.chunks, seed=args.seed)
+
+        t0 = time.perf_counter()
+        tfidf = retriever_local.build_or_load_index(str(docs), str(index_path))
+        tfidf_build = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        bm25 = retriever_bm25.build_or_load_index(str(docs), str(index_path))
+        bm25_build = time.perf_counter() - t0
+
+        queries = labeled_queries(tfidf, args.queries, seed=args.seed + 1)
+
+        visited, exhaustive = 0, 0
+        for query, _ in queries:
+            terms, weights = retriever_bm25._query_terms(bm25, query)
+            visited += retriever_bm25._score(bm25, terms, weights, args.k)[2]
+            exhaustive += int(np.sum(np.diff(bm25["indptr"])[terms]))
+
+        report = {
+            "chunks": tfidf["chunks"],
+            "terms": len(tfidf["vocabulary"]),
+            "queries": len(queries),
+            "k": args.k,
+            "tfidf": {"build_s": round(tfidf_build, 2), **_run(retriever_local.search, tfidf, queries, args.k)},
+            "bm25": {
+                "postings_build_s": round(bm25_build, 2),
+                **_run(retriever_bm25.search, bm25, queries, args.k),
+                "postings_visited_ratio": round(visited / max(exhaustive, 1), 4),
+            },
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Memory saved versus recall@k lost by compact TF-IDF indexes.
+
+Run from the repository root::
+
+    python -m benchmarks.compact_index --chunks 50000 --queries 300
+    python -m benchmarks.compact_index --configs "float32;uint8;uint8,min_df=2,row_terms=48"
+
+A synthetic corpus is indexed once at full precision; its exhaustive top-k
+for labeled queries (see :mod:`benchmarks.synthetic`) is the reference.
+Every configuration (``dtype[,min_df=N][,max_features=N][,row_terms=N]``)
+then rewrites the same index from its counts and reports the bytes the query
+path maps (served terms, IDF, scales, postings), the generation size on disk,
+search latency and recall@k against the reference. Results are printed (and
+optionally written) as JSON.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmarks.retrieval import exhaustive_labels, measure_queries
+from benchmarks.synthetic import labeled_queries, write_corpus
+from src.services import retriever_local
+from src.services.retriever_local import Compaction
+
+CONFIGS = "float32;uint8;uint8,min_df=2;uint8,max_features=200000;uint8,row_terms=128;uint8,min_df=2,row_terms=128"
+
+
+def parse_config(spec: str) -> Compaction:
+    """``"uint8,min_df=2,row_terms=64"`` -> :class:`Compaction`."""
+    dtype, *options = [part.strip() for part in spec.split(",") if part.strip()]
+    fields = {}
+    for option in options:
+        name, _, value = option.partition("=")
+        if name not in ("min_df", "max_features", "row_terms"):
+            raise ValueError(f"Unknown compaction option {name!r} in {spec!r}")
+        fields[name] = int(value)
+    return Compaction(dtype=dtype, **fields)
+
+
+def _dir_mb(path: Path) -> float:
+    return round(sum(f.stat().st_size for f in path.iterdir() if f.is_file()) / 2**20, 2)
+
+
+def measure(index: Dict, queries: List[str], labels: List[set], k: int, batch: int) -> Dict:
+    return {
+        "postings": int(index["postings"].nnz),
+        "serving_mb": round(retriever_local.serving_bytes(index) / 2**20, 2),
+        "index_mb": _dir_mb(index["_dir"]),
+        **measure_queries(retriever_local, index, queries, labels, k, batch),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--configs", default=CONFIGS, help="';'-separated dtype[,option=value...] specs")
+    parser.add_argument("--output")
+    args = parser.parse_args(argv)
+
+    configs = [parse_config(spec) for spec in args.configs.split(";") if spec.strip()]
+    with tempfile.TemporaryDirectory() as tmp:
+        docs, index_path = Path(tmp) / "docs", str(Path(tmp) / "index")
+        write_corpus(docs, args.chunks, seed=args.seed)
+        full = retriever_local.build_or_load_index(str(docs), index_path)
+        queries = [q for q, _ in labeled_queries(full, args.queries, seed=args.seed + 1)]
+        labels = exhaustive_labels(full, queries, args.k)
+        reference = measure(full, queries, labels, args.k, args.batch)
+
+        report = {"chunks": int(full["chunks"]), "terms": len(full["vocabulary"]), "k": args.k,
+                  "queries": len(queries), "float64": reference, "compact": {}}
+        metric = f"recall@{args.k}"
+        for compaction in configs:
+            t0 = time.perf_counter()
+            index = retriever_local.build_or_load_index(str(docs), index_path, compaction=compaction)
+            rewrite_s = time.perf_counter() - t0
+            run = measure(index, queries, labels, args.k, args.batch)
+            name = ",".join([compaction.dtype] + [f"{f}={getattr(compaction, f)}"
+                             for f in ("min_df", "max_features", "row_terms")
+                             if getattr(compaction, f) != getattr(retriever_local.FULL, f)])
+            report["compact"][name] = {
+                "rewrite_s": round(rewrite_s, 3),
+                **run,
+                "serving_saved": round(1 - run["serving_mb"] / max(reference["serving_mb"], 1e-9), 4),
+                "recall_lost": round(reference[metric] - run[metric], 4),
+            }
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Load generator for the /ask pipeline.
+
+Run from the repository root, fully offline (the app runs in-process with the
+mock LLM backend unless ``LLM_BACKEND`` is already set)::
+
+    python -m benchmarks.load --rate 20 --duration 30 --concurrency 64
+    python -m benchmarks.load --endpoint /ask/stream --rate 10 --duration 20
+    python -m benchmarks.load --url http://localhost:8088 --rate 5 --duration 60
+
+Requests arrive open-loop as a Poisson process at ``--rate`` per second, and
+at most ``--concurrency`` are in flight. ``queue_ms`` is how long a request
+waited for a free slot after its scheduled arrival. Once the app saturates,
+that wait grows while ``latency_ms`` (send to full response) stays flat.
+``latency_ms`` is measured from the send, so both are needed to see the
+total. Against a live server (``--url``), ``/ask/stream`` also reports the
+time to the first ``token`` event; in-process, httpx's ASGI transport
+buffers whole responses, so it is omitted there.
+
+Queries come from a JSONL request log (``query``/``title`` per line) and
+fall back to phrases taken from the indexed documents. Output is JSON.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import AsyncExitStack
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from benchmarks.retrieval import read_queries
+
+
+def _summary(seconds: List[float]) -> Dict[str, float]:
+    if not seconds:
+        return {}
+    ms = np.asarray(seconds) * 1000
+    return {
+        "p50": round(float(np.percentile(ms, 50)), 1),
+        "p90": round(float(np.percentile(ms, 90)), 1),
+        "p99": round(float(np.percentile(ms, 99)), 1),
+        "max": round(float(ms.max()), 1),
+    }
+
+
+def _doc_queries(n: int, seed: int) -> List[str]:
+    from src.app.deps import local_index
+
+    index = local_index()
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n if index.get("chunks") else 0):
+        words = index["passages"][rng.randrange(index["chunks"])].split()
+        start = rng.randrange(max(len(words) - 6, 1))
+        queries.append(" ".join(words[start:start + rng.randint(3, 6)]))
+    return queries or ["Como configurar o sistema?"]
+
+
+async def _one(client: httpx.AsyncClient, endpoint: str, query: str, result: Dict) -> None:
+    start = time.perf_counter()
+    try:
+        if endpoint.endswith("/stream"):
+            async with client.stream("POST", endpoint, json={"query": query}) as response:
+                result["status"] = response.status_code
+                async for line in response.aiter_lines():
+                    if line == "event: token" and "ttft" not in result:
+                        result["ttft"] = time.perf_counter() - start
+        else:
+            response = await client.post(endpoint, json={"query": query})
+            result["status"] = response.status_code
+    except httpx.HTTPError as exc:
+        result["status"] = type(exc).__name__
+    result["latency"] = time.perf_counter() - start
+
+
+async def run(
+    client: httpx.AsyncClient,
+    queries: List[str],
+    *,
+    endpoint: str = "/ask",
+    rate: float = 10.0,
+    duration: float = 10.0,
+    concurrency: int = 32,
+    seed: int = 0,
+    measure_ttft: bool = False,
+) -> Dict:
+    rng = random.Random(seed)
+    slots = asyncio.Semaphore(concurrency)
+    results: List[Dict] = []
+    tasks = []
+
+    async def fire(arrival: float, query: str) -> None:
+        async with slots:
+            result = {"queue": time.perf_counter() - arrival}
+            results.append(result)
+            await _one(client, endpoint, query, result)
+
+    begin = time.perf_counter()
+    arrival = begin
+    while arrival - begin < duration:
+        delay = arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(fire(arrival, rng.choice(queries))))
+        arrival += rng.expovariate(rate)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - begin
+
+    ok = [r for r in results if r.get("status") == 200]
+    return {
+        "endpoint": endpoint,
+        "offered_rps": rate,
+        "concurrency": concurrency,
+        "requests": len(results),
+        "ok": len(ok),
+        "status": dict(Counter(str(r.get("status")) for r in results)),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(ok) / elapsed, 2),
+        "latency_ms": _summary([r["latency"] for r in ok]),
+        "queue_ms": _summary([r["queue"] for r in results]),
+        **({"ttft_ms": _summary([r["ttft"] for r in ok if "ttft" in r])} if measure_ttft else {}),
+    }
+
+
+async def _main(args) -> Dict:
+    async with AsyncExitStack() as stack:
+        if args.url:
+            client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=httpx.Limits(max_connections=args.concurrency))
+            queries = read_queries(Path(args.requests), 10_000) or ["Como configurar o sistema?"]
+        else:
+            os.environ.setdefault("LLM_BACKEND", "mock")
+            # keep synthetic traffic out of the real request log
+            tmp = stack.enter_context(tempfile.TemporaryDirectory())
+            os.environ.setdefault("REQUEST_LOG_PATH", str(Path(tmp) / "requests.log"))
+            from src.app.main import app
+
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            client = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=args.timeout
+            )
+            queries = read_queries(Path(args.requests), 10_000) or _doc_queries(500, args.seed)
+        await stack.enter_async_context(client)
+        return await run(
+            client,
+            queries,
+            endpoint=args.endpoint,
+            rate=args.rate,
+            duration=args.duration,
+            concurrency=args.concurrency,
+            seed=args.seed,
+            measure_ttft=bool(args.url) and args.endpoint.endswith("/stream"),
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="target a running server instead of the in-process app")
+    parser.add_argument("--endpoint", default="/ask", choices=["/ask", "/ask/stream"])
+    parser.add_argument("--rate", type=float, default=10.0, help="offered load, requests per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of arrivals")
+    parser.add_argument("--concurrency", type=int, default=32, help="max requests in flight")
+    parser.add_argument("--requests", default="docs/requests.log", help="JSONL of real questions")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    report = asyncio.run(_main(args))
+    print(json.dumps(report, indent=2))
+    if not report["ok"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
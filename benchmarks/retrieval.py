@@ -0,0 +1,238 @@
+"""Retrieval benchmark and regression check.
+
+Run from the repository root::
+
+    python -m benchmarks.retrieval --sizes 1000,10000,50000 --output results.json
+    python -m benchmarks.retrieval --sizes 1000,10000 --baseline results.json
+
+For every corpus size a synthetic markdown corpus is written (see
+:mod:`benchmarks.synthetic`) and measured in a fresh process, so peak RSS is
+per size: cold build time, load time of the unchanged index, on-disk size,
+single-query and batched (``search_many``) latency, and recall@k of labeled
+queries sampled from the corpus.
+
+Real questions are timed too: queries are read from a JSONL file (the API
+request log by default; ``query`` or ``title`` field per line, e.g. the
+backlog ``requests.jsonl``) and run against ``--docs``. They have no
+relevance judgements, so only their latency is reported.
+
+Results are printed (and optionally written) as JSON. With ``--baseline``,
+latency more than ``--max-slowdown`` times the baseline or recall more than
+``--max-recall-drop`` below it is reported and the exit status is 1.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from benchmarks.synthetic import labeled_queries, write_corpus
+from src.services import retriever_local
+from src.services.retriever import get_retriever
+
+
+def _percentiles(seconds: List[float]) -> Dict[str, float]:
+    ms = np.asarray(seconds) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+    }
+
+
+def _dir_bytes(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def measure_queries(
+    backend, index, queries: List[str], labels: Optional[List[set]], k: int, batch: int
+) -> Dict:
+    """Single and batched latency plus recall@k of ``queries`` against ``labels`` (sets of rows).
+
+    Without ``labels`` only latency is measured.
+    """
+    rows_of = {}
+    for row, (path, _, chunk_id) in enumerate(index["meta"]):
+        rows_of[(path, chunk_id)] = row
+
+    single, found, relevant = [], 0, 0
+    for i, query in enumerate(queries):
+        t0 = time.perf_counter()
+        hits = backend.search(index, query, k=k)
+        single.append(time.perf_counter() - t0)
+        if labels is not None:
+            got = {rows_of[(h.path, h.chunk_id)] for h in hits}
+            found += len(got & labels[i])
+            relevant += len(labels[i])
+
+    batched, total = [], 0.0
+    for start in range(0, len(queries), batch):
+        chunk = queries[start:start + batch]
+        t0 = time.perf_counter()
+        backend.search_many(index, chunk, k=k)
+        elapsed = time.perf_counter() - t0
+        total += elapsed
+        batched.append(elapsed / max(len(chunk), 1))  # per-query share of the batch
+
+    report = {
+        "single": {**_percentiles(single), "qps": round(len(single) / max(sum(single), 1e-9), 1)},
+        "batched": {**_percentiles(batched), "batch": batch, "qps": round(len(queries) / max(total, 1e-9), 1)},
+    }
+    if labels is not None:
+        report[f"recall@{k}"] = round(found / max(relevant, 1), 4)
+    return report
+
+
+def run_size(n_chunks: int, backend_name: str, n_queries: int, k: int, batch: int, seed: int) -> Dict:
+    """Benchmark one synthetic corpus size; meant to run in its own process."""
+    backend = get_retriever(backend_name)
+    with tempfile.TemporaryDirectory() as tmp:
+        docs, index_path = Path(tmp) / "docs", Path(tmp) / "index"
+        files = write_corpus(docs, n_chunks, seed=seed)
+
+        t0 = time.perf_counter()
+        backend.build_or_load_index(str(docs), str(index_path))
+        build_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        index = backend.build_or_load_index(str(docs), str(index_path))
+        load_s = time.perf_counter() - t0
+
+        pairs = labeled_queries(index, n_queries, seed=seed + 1)
+        report = {
+            "chunks": int(index["chunks"]),
+            "files": files,
+            "terms": len(index["vocabulary"]),
+            "build_s": round(build_s, 3),
+            "load_s": round(load_s, 3),
+            "index_mb": round(_dir_bytes(index_path) / 2**20, 2),
+            **measure_queries(backend, index, [q for q, _ in pairs], [{row} for _, row in pairs], k, batch),
+        }
+        report["peak_rss_mb"] = _peak_rss_mb()
+    return report
+
+
+def read_queries(path: Path, limit: int) -> List[str]:
+    """Questions from a JSONL file (``query`` or ``title`` per line), deduplicated in order."""
+    queries: List[str] = []
+    seen = set()
+    if not path.is_file():
+        return queries
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        text = (record.get("query") or record.get("title") or "").strip() if isinstance(record, dict) else ""
+        if text and text not in seen:
+            seen.add(text)
+            queries.append(text)
+    return queries[:limit]
+
+
+def exhaustive_labels(index, queries: List[str], k: int) -> List[set]:
+    """Reference top-k rows per query from a dense cosine product over the whole matrix.
+
+    These are TF-IDF's own exact results, not relevance judgements.
+    """
+    if not queries or index["chunks"] == 0:
+        return [set() for _ in queries]
+    scores = (retriever_local._transform(index, queries) @ index["matrix"].T).toarray()
+    labels = []
+    for row_scores in scores:
+        top = np.argsort(-row_scores, kind="stable")[:k]
+        labels.append({int(r) for r in top if row_scores[r] > 0})
+    return labels
+
+
+def run_real(docs: Path, queries_path: Path, backend_name: str, limit: int, k: int, batch: int) -> Dict:
+    queries = read_queries(queries_path, limit)
+    if not queries or not docs.is_dir():
+        return {"queries": 0, "source": str(queries_path)}
+    backend = get_retriever(backend_name)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = backend.build_or_load_index(str(docs), str(Path(tmp) / "index"))
+        return {
+            "queries": len(queries),
+            "source": str(queries_path),
+            "chunks": int(index["chunks"]),
+            **measure_queries(backend, index, queries, None, k, batch),
+        }
+
+
+def compare(current: Dict, baseline: Dict, max_slowdown: float, max_recall_drop: float) -> List[str]:
+    """Regressions of ``current`` against ``baseline`` as human-readable lines."""
+    problems: List[str] = []
+    k = current["k"]
+    pairs: List[Tuple[str, Dict, Dict]] = [
+        (f"{size} chunks", run, baseline.get("sizes", {}).get(size)) for size, run in current["sizes"].items()
+    ]
+    pairs.append(("real queries", current.get("real", {}), baseline.get("real")))
+    for name, run, base in pairs:
+        if not base or "single" not in run or "single" not in base:
+            continue
+        for mode in ("single", "batched"):
+            now, before = run[mode]["p50_ms"], base[mode]["p50_ms"]
+            if before > 0 and now > before * max_slowdown:
+                problems.append(f"{name}: {mode} p50 {now} ms vs {before} ms")
+        metric = f"recall@{k}"
+        if metric in base and metric in run and run[metric] < base[metric] - max_recall_drop:
+            problems.append(f"{name}: {metric} {run[metric]} vs {base[metric]}")
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,50000", help="comma-separated corpus sizes in chunks (up to 200000)")
+    parser.add_argument("--backend", default="tfidf")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--docs", default="docs")
+    parser.add_argument("--requests", default="docs/requests.log", help="JSONL of real questions")
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    parser.add_argument("--max-slowdown", type=float, default=1.25)
+    parser.add_argument("--max-recall-drop", type=float, default=0.01)
+    args = parser.parse_args()
+
+    report = {"backend": args.backend, "k": args.k, "queries": args.queries, "sizes": {}}
+    spawn = multiprocessing.get_context("spawn")
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+            report["sizes"][str(size)] = pool.submit(
+                run_size, size, args.backend, args.queries, args.k, args.batch, args.seed
+            ).result()
+        print(f"{size} chunks done", file=sys.stderr)
+    report["real"] = run_real(Path(args.docs), Path(args.requests), args.backend, args.queries, args.k, args.batch)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    if args.baseline:
+        problems = compare(report, json.loads(Path(args.baseline).read_text(encoding="utf-8")),
+                           args.max_slowdown, args.max_recall_drop)
+        for line in problems:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Import-time and boot-time report for the API.
+
+Run from the repository root::
+
+    python -m benchmarks.startup --runs 5 --output startup.json
+    python -m benchmarks.startup --baseline startup.json
+
+Every run is a fresh interpreter (an instant mock LLM, no docs watcher, a
+throwaway request log) that measures, in milliseconds: importing
+``src.app.main``, the lifespan startup (which maps the index), the first
+``/search/batch`` and the first ``/ask``, plus which heavy optional modules
+had been loaded after the import. The first run may build the index and is
+reported on its own; the medians cover the rest. One more run under
+``python -X importtime`` gives the slowest top-level imports.
+
+With ``--baseline``, a median more than ``--max-slowdown`` times the
+baseline is reported and the exit status is 1.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+HEAVY_MODULES = ("sklearn", "agno", "markdown_it", "scipy.stats")
+PHASES = ("import_ms", "lifespan_ms", "first_search_ms", "first_ask_ms", "boot_ms")
+QUERY = "Como configurar o sistema?"
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 1)
+
+
+def probe() -> Dict:
+    """Boot the app in this (fresh) interpreter and time each phase."""
+    import asyncio
+
+    start = time.perf_counter()
+    from src.app.main import app
+
+    imported = time.perf_counter()
+    loaded = [m for m in HEAVY_MODULES if m in sys.modules]
+
+    async def boot() -> Dict:
+        import httpx
+
+        async with app.router.lifespan_context(app):
+            ready = time.perf_counter()
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://startup", timeout=60) as client:
+                (await client.post("/search/batch", json={"queries": [QUERY]})).raise_for_status()
+                searched = time.perf_counter()
+                (await client.post("/ask", json={"query": QUERY})).raise_for_status()
+                asked = time.perf_counter()
+        return {
+            "import_ms": _ms(imported - start),
+            "lifespan_ms": _ms(ready - imported),
+            "first_search_ms": _ms(searched - ready),
+            "first_ask_ms": _ms(asked - searched),
+            "boot_ms": _ms(ready - start),
+        }
+
+    return {**asyncio.run(boot()), "loaded_after_import": loaded}
+
+
+def parse_importtime(stderr: str, top: int = 10) -> List[Dict]:
+    """Slowest top-level imports in ``python -X importtime`` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = (part for part in line.replace("import time:", "|", 1).split("|"))
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        if depth == 0:
+            rows.append({"module": name.strip(), "cumulative_ms": _ms(int(cumulative_us) / 1e6),
+                         "self_ms": _ms(int(self_us) / 1e6)})
+    return sorted(rows, key=lambda r: -r["cumulative_ms"])[:top]
+
+
+def _run(env: Dict[str, str], importtime: bool = False) -> subprocess.CompletedProcess:
+    flags = ["-X", "importtime"] if importtime else []
+    return subprocess.run(
+        [sys.executable, *flags, "-m", "benchmarks.startup", "--probe"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+
+
+def compare(current: Dict, baseline: Dict, max_slowdown: float) -> List[str]:
+    """Regressions of ``current`` against ``baseline`` as human-readable lines."""
+    problems = []
+    for phase in PHASES:
+        now, before = current["median"].get(phase), baseline.get("median", {}).get(phase)
+        if now is not None and before and now > before * max_slowdown:
+            problems.append(f"{phase}: {now} ms vs {before} ms")
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--docs", default="docs")
+    parser.add_argument("--index", default=".local_index")
+    parser.add_argument("--top", type=int, default=10, help="slowest top-level imports to list")
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    parser.add_argument("--max-slowdown", type=float, default=1.25)
+    parser.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.probe:
+        print(json.dumps(probe()))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "LLM_BACKEND": "mock",
+            # instant model: first_ask_ms is the cost of loading the agents, not generation
+            "MOCK_LLM_TTFT_MS": "0",
+            "MOCK_LLM_TOKENS_PER_SECOND": "0",
+            "WATCH_DOCS": "false",
+            "DOCS_DIR": args.docs,
+            "INDEX_PATH": args.index,
+            "REQUEST_LOG_PATH": str(Path(tmp) / "requests.log"),
+            "ANSWER_CACHE_DB": "",
+        }
+        runs = [json.loads(_run(env).stdout) for _ in range(max(args.runs, 2))]
+        traced = _run(env, importtime=True)
+
+    rest = runs[1:]
+    report = {
+        "python": sys.version.split()[0],
+        "runs": len(rest),
+        "first": runs[0],
+        "median": {phase: round(statistics.median(r[phase] for r in rest), 1) for phase in PHASES},
+        "loaded_after_import": rest[-1]["loaded_after_import"],
+        "slowest_imports": parse_importtime(traced.stderr, args.top),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    if args.baseline:
+        problems = compare(report, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.max_slowdown)
+        for line in problems:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
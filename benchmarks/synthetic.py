@@ -0,0 +1,73 @@
+"""Synthetic markdown corpora and labeled queries for retrieval benchmarks."""
+from __future__ import annotations
+
+import random
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from src.services import retriever_local
+
+
+SYLLABLES = ["ba", "ce", "di", "fo", "gu", "la", "me", "ni", "po", "qu", "ra", "se", "ti", "vo", "xa", "ze", "ão", "ção"]
+
+
+def vocabulary(size: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def write_corpus(
+    target: Path,
+    n_chunks: int,
+    *,
+    chunks_per_file: int = 50,
+    vocab_size: int = 20000,
+    seed: int = 0,
+) -> int:
+    """Write markdown files yielding roughly ``n_chunks`` passages; returns the file count.
+
+    Word frequencies follow a Zipf-like law so postings lengths look like a
+    real corpus: a few very common terms and a long tail of rare ones.
+    """
+    rng = random.Random(seed)
+    words = vocabulary(vocab_size, seed)
+    step = retriever_local.CHUNK_SIZE
+    target.mkdir(parents=True, exist_ok=True)
+    n_files = max(1, -(-n_chunks // chunks_per_file))
+    for f in range(n_files):
+        sections = []
+        length = 0
+        while length < chunks_per_file * step:
+            sentence = " ".join(
+                words[min(int(rng.paretovariate(1.05)) - 1, vocab_size - 1) if rng.random() < 0.7 else rng.randrange(vocab_size)]
+                for _ in range(rng.randint(8, 20))
+            )
+            sections.append(sentence.capitalize() + ".")
+            length += len(sentence) + 2
+        (target / f"doc{f:05d}.md").write_text(f"# Documento {f}\n\n" + "\n\n".join(sections), encoding="utf-8")
+    return n_files
+
+
+def labeled_queries(index: Dict, n: int, *, rare: int = 3, common: int = 2, seed: int = 1) -> List[Tuple[str, int]]:
+    """``(query, relevant_row)`` pairs sampled from random passages.
+
+    Each query mixes ``rare`` discriminative terms with ``common`` frequent
+    ones, like a real question ("como configurar o ..."), so long postings
+    lists are exercised as well.
+    """
+    rng = random.Random(seed)
+    vocab = index["vocabulary"]
+    df = index["df"]
+    queries: List[Tuple[str, int]] = []
+    while len(queries) < n:
+        row = rng.randrange(index["chunks"])
+        unigrams = sorted({t for t in retriever_local._analyze(index["passages"][row]) if " " not in t}, key=lambda t: df[vocab.get(t)])
+        if len(unigrams) < (rare + common) * 3:
+            continue
+        picked = rng.sample(unigrams[: rare * 3], rare) + rng.sample(unigrams[-common * 3:], common)
+        rng.shuffle(picked)
+        queries.append((" ".join(picked), row))
+    return queries
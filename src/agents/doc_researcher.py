@@ -2,11 +2,14 @@ from __future__ import annotations
 
 import json
 import logging
-from typing import List
+from typing import AsyncIterator, List, Tuple
 
 from agno.agent import Agent
 # from agno.tools.duckduckgo import DuckDuckGoTools
 
+from src.agents.models import build_model
+from src.agents.streaming import AnswerExtractor, stream_content
+from src.core import metrics
 from src.core.config import Settings
 
 
@@ -22,6 +25,7 @@ class DocResearcher:
     def __init__(self, settings: Settings) -> None:
         self.agent = Agent(
             name="doc_researcher",
+            model=build_model(settings),
             instructions=settings.agent_instructions,
             tools=[],
         )
@@ -31,15 +35,64 @@ class DocResearcher:
         if not passages:
             return {"answer": "Não encontrado", "sources": []}
 
+        prompt = self._timed_prompt(query, passages)
+        with metrics.span("agent.run", agent=self.agent.name):
+            response = self.agent.run(prompt)
+        return self._timed_parse(response, sources)
+
+    async def ahandle_local(self, query: str, passages: List[str], sources: List[str]) -> dict:
+        """Async variant of :meth:`handle_local` (``Agent.arun``), for the async API."""
+        if not passages:
+            return {"answer": "Não encontrado", "sources": []}
+
+        prompt = self._timed_prompt(query, passages)
+        with metrics.span("agent.run", agent=self.agent.name):
+            response = await self.agent.arun(prompt)
+        return self._timed_parse(response, sources)
+
+    async def astream_local(
+        self, query: str, passages: List[str], sources: List[str]
+    ) -> AsyncIterator[Tuple[str, dict]]:
+        """Stream :meth:`handle_local`: ``("token", {"text"})`` events while the
+        model writes, then one ``("answer", {"answer", "sources"})`` event."""
+        if not passages:
+            yield "answer", {"answer": "Não encontrado", "sources": []}
+            return
+
+        extractor = AnswerExtractor()
+        content = []
+        prompt = self._timed_prompt(query, passages)
+        with metrics.span("agent.run", agent=self.agent.name, stream="true"):
+            async for delta in stream_content(self.agent.arun(prompt, stream=True)):
+                content.append(delta)
+                text = extractor.feed(delta)
+                if text:
+                    yield "token", {"text": text}
+        yield "answer", self._timed_parse("".join(content), sources)
+
+    def _timed_prompt(self, query: str, passages: List[str]) -> str:
+        with metrics.span("agent.prompt", agent=self.agent.name):
+            prompt = self._local_prompt(query, passages)
+        metrics.PROMPT_CHARS.observe(len(prompt), agent=self.agent.name)
+        return prompt
+
+    def _timed_parse(self, response, sources: List[str]) -> dict:
+        metrics.RESPONSE_CHARS.observe(len(str(getattr(response, "content", response))), agent=self.agent.name)
+        with metrics.span("agent.parse", agent=self.agent.name):
+            return self._parse_local(response, sources)
+
+    @staticmethod
+    def _local_prompt(query: str, passages: List[str]) -> str:
         context = "\n\n".join(passages)
-        prompt = (
+        return (
             "Contexto:\n" + context + "\n\n" +
             "Pergunta: " + query + "\n" +
             "Instruções: Responda apenas com base no Contexto e sempre em Português do Brasil. "
             "Retorne JSON: {\"answer\": string, \"sources\": string[]}"
         )
 
-        response = self.agent.run(prompt)
+    @staticmethod
+    def _parse_local(response, sources: List[str]) -> dict:
         content = getattr(response, "content", str(response)).strip()
         # remove markdown ```json fences if present
         if content.startswith("```"):
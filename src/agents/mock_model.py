@@ -0,0 +1,127 @@
+"""Deterministic local stand-in for the LLM, for offline runs and load tests.
+
+``MockModel`` is an Agno ``Model``: agents built with it go through the real
+``Agent.run``/``arun`` machinery (prompt assembly, streaming events, response
+parsing) but no request leaves the process. Each call sleeps for a
+time-to-first-token drawn from a log-normal distribution and then "generates"
+its output at ``tokens_per_second`` (also jittered), so queueing and
+concurrency behave like a real provider.
+
+Everything is seeded from ``seed`` and the prompt text: the same prompt gets
+the same answer and the same latency on every run.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Iterator, List, Tuple
+
+from agno.models.base import Model
+from agno.models.message import Message
+from agno.models.response import ModelResponse
+
+from src.core.config import Settings
+
+
+CHARS_PER_TOKEN = 4
+STREAM_CHUNK_TOKENS = 4
+
+
+@dataclass
+class MockModel(Model):
+    id: str = "mock"
+    name: str = "MockModel"
+    provider: str = "Mock"
+
+    ttft_ms: float = 300.0
+    jitter: float = 0.5
+    tokens_per_second: float = 50.0
+    output_tokens: int = 120
+    seed: int = 0
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "MockModel":
+        return cls(
+            ttft_ms=settings.mock_llm_ttft_ms,
+            jitter=settings.mock_llm_jitter,
+            tokens_per_second=settings.mock_llm_tokens_per_second,
+            output_tokens=settings.mock_llm_output_tokens,
+            seed=settings.mock_llm_seed,
+        )
+
+    # -- generation -------------------------------------------------------
+
+    def _plan(self, messages: List[Message]) -> Tuple[str, float, float]:
+        """``(content, time to first token, seconds per token)`` for this conversation."""
+        prompt = "\n".join(str(m.content) for m in messages if m.role == "user" and m.content)
+        rng = random.Random(self.seed ^ zlib.crc32(prompt.encode("utf-8")))
+        ttft = self.ttft_ms / 1000.0 * rng.lognormvariate(0.0, self.jitter) if self.ttft_ms > 0 else 0.0
+        rate = self.tokens_per_second * rng.lognormvariate(0.0, self.jitter / 2) if self.tokens_per_second > 0 else 0.0
+        n_tokens = max(1, int(rng.gauss(self.output_tokens, self.output_tokens / 4)))
+        return self._content(prompt, n_tokens), ttft, (1.0 / rate if rate > 0 else 0.0)
+
+    @staticmethod
+    def _content(prompt: str, n_tokens: int) -> str:
+        # Answer from the prompt's own context, in the JSON shape the agents ask for.
+        match = re.search(r"Contexto:\n(.*?)\n\nPergunta:", prompt, re.S)
+        source = " ".join((match.group(1) if match else prompt).split())
+        answer = source[: n_tokens * CHARS_PER_TOKEN] or "Resposta simulada."
+        return json.dumps({"answer": answer, "sources": []}, ensure_ascii=False)
+
+    @staticmethod
+    def _pieces(content: str) -> Iterator[str]:
+        step = STREAM_CHUNK_TOKENS * CHARS_PER_TOKEN
+        for i in range(0, len(content), step):
+            yield content[i:i + step]
+
+    @staticmethod
+    def _generation_time(content: str, per_token: float) -> float:
+        return math.ceil(len(content) / CHARS_PER_TOKEN) * per_token
+
+    # -- Model interface --------------------------------------------------
+
+    def invoke(self, messages: List[Message], assistant_message: Message, *args, **kwargs) -> ModelResponse:
+        content, ttft, per_token = self._plan(messages)
+        assistant_message.metrics.start_timer()
+        time.sleep(ttft + self._generation_time(content, per_token))
+        assistant_message.metrics.stop_timer()
+        return ModelResponse(role="assistant", content=content)
+
+    async def ainvoke(self, messages: List[Message], assistant_message: Message, *args, **kwargs) -> ModelResponse:
+        content, ttft, per_token = self._plan(messages)
+        assistant_message.metrics.start_timer()
+        await asyncio.sleep(ttft + self._generation_time(content, per_token))
+        assistant_message.metrics.stop_timer()
+        return ModelResponse(role="assistant", content=content)
+
+    def invoke_stream(self, messages: List[Message], assistant_message: Message, *args, **kwargs) -> Iterator[ModelResponse]:
+        content, ttft, per_token = self._plan(messages)
+        assistant_message.metrics.start_timer()
+        time.sleep(ttft)
+        for piece in self._pieces(content):
+            time.sleep(self._generation_time(piece, per_token))
+            yield ModelResponse(role="assistant", content=piece)
+        assistant_message.metrics.stop_timer()
+
+    async def ainvoke_stream(
+        self, messages: List[Message], assistant_message: Message, *args, **kwargs
+    ) -> AsyncIterator[ModelResponse]:
+        content, ttft, per_token = self._plan(messages)
+        assistant_message.metrics.start_timer()
+        await asyncio.sleep(ttft)
+        for piece in self._pieces(content):
+            await asyncio.sleep(self._generation_time(piece, per_token))
+            yield ModelResponse(role="assistant", content=piece)
+        assistant_message.metrics.stop_timer()
+
+    def _parse_provider_response(self, response: Any, **kwargs) -> ModelResponse:
+        return response
+
+    def _parse_provider_response_delta(self, response: Any) -> ModelResponse:
+        return response
@@ -0,0 +1,22 @@
+"""Model backend selection for the agents (``Settings.llm_backend``)."""
+from __future__ import annotations
+
+from typing import Optional
+
+from agno.models.base import Model
+
+from src.core.config import Settings
+
+
+LLM_BACKENDS = ("openai", "mock")
+
+
+def build_model(settings: Settings) -> Optional[Model]:
+    """Model for the agents; ``None`` keeps Agno's default OpenAI model."""
+    if settings.llm_backend == "openai":
+        return None
+    if settings.llm_backend == "mock":
+        from src.agents.mock_model import MockModel
+
+        return MockModel.from_settings(settings)
+    raise ValueError(f"Unknown LLM backend {settings.llm_backend!r}; expected one of {list(LLM_BACKENDS)}")
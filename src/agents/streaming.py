@@ -0,0 +1,92 @@
+"""Token streaming helpers shared by the agents."""
+from __future__ import annotations
+
+import re
+from typing import AsyncIterator
+
+from agno.run.agent import RunEvent
+
+
+_ANSWER_KEY = re.compile(r'"answer"\s*:\s*"')
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class AnswerExtractor:
+    """Incrementally decode the ``"answer"`` string of a streamed JSON reply.
+
+    The agents ask the model for ``{"answer": ..., "sources": [...]}``; while
+    the reply streams in, :meth:`feed` returns the newly completed part of the
+    answer text so users see prose instead of raw JSON. Replies that do not
+    look like JSON are passed through unchanged.
+    """
+
+    def __init__(self) -> None:
+        self._buf = ""
+        self._pos = -1  # start of the undecoded answer text in ``_buf``
+        self._raw = False
+        self._done = False
+
+    def feed(self, delta: str) -> str:
+        if self._raw:
+            return delta
+        self._buf += delta
+        if self._done:
+            return ""
+        if self._pos < 0:
+            head = self._buf.lstrip()
+            if head.startswith("```"):
+                head = head[3:].lstrip()
+                if head and "json".startswith(head.lower()):
+                    return ""  # fence language tag still arriving
+                if head[:4].lower() == "json":
+                    head = head[4:].lstrip()
+            elif head and "```".startswith(head):
+                return ""  # could still be an opening fence
+            if head and not head.startswith("{"):
+                self._raw = True
+                return self._buf
+            match = _ANSWER_KEY.search(self._buf)
+            if match is None:
+                return ""
+            self._pos = match.end()
+        return self._decode()
+
+    def _decode(self) -> str:
+        out = []
+        buf, i = self._buf, self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self._done = True
+                i += 1
+                break
+            if ch != "\\":
+                out.append(ch)
+                i += 1
+                continue
+            if i + 1 >= len(buf):
+                break  # incomplete escape, wait for more input
+            code = buf[i + 1]
+            if code == "u":
+                if i + 6 > len(buf):
+                    break
+                try:
+                    out.append(chr(int(buf[i + 2:i + 6], 16)))
+                except ValueError:
+                    out.append(buf[i:i + 6])
+                i += 6
+            else:
+                out.append(_ESCAPES.get(code, code))
+                i += 2
+        self._pos = i
+        return "".join(out)
+
+
+async def stream_content(stream) -> AsyncIterator[str]:
+    """Content deltas (strings) from an ``Agent.arun(..., stream=True)`` iterator."""
+    async for event in stream:
+        if getattr(event, "event", None) != RunEvent.run_content.value:
+            continue
+        content = getattr(event, "content", None)
+        if isinstance(content, str) and content:
+            yield content
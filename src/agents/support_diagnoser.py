@@ -2,11 +2,14 @@ from __future__ import annotations
 
 import json
 import logging
-from typing import List
+from typing import AsyncIterator, Tuple
 
 from agno.agent import Agent
+from src.agents.models import build_model
+from src.agents.streaming import AnswerExtractor, stream_content
 from src.agents.tools.n8n_webhook import N8nWebhookTool
 
+from src.core import metrics
 from src.core.config import Settings
 
 
@@ -19,27 +22,71 @@ class SupportDiagnoser:
     def __init__(self, settings: Settings) -> None:
         self.agent = Agent(
             name="support_diagnoser",
+            model=build_model(settings),
             instructions=settings.support_agent_instructions,
-            tools=[N8nWebhookTool(settings).get_error_logs],
+            tools=[N8nWebhookTool(settings)],
         )
 
     def diagnose(self, query: str) -> dict:
         """Diagnose an issue using web search."""
-        prompt = (
+        prompt = self._timed_prompt(query)
+        with metrics.span("agent.run", agent=self.agent.name):
+            response = self.agent.run(prompt)
+        return self._timed_parse(response)
+
+    async def adiagnose(self, query: str) -> dict:
+        """Async variant of :meth:`diagnose`; the n8n tool runs on the shared async client."""
+        prompt = self._timed_prompt(query)
+        with metrics.span("agent.run", agent=self.agent.name):
+            response = await self.agent.arun(prompt)
+        return self._timed_parse(response)
+
+    async def astream_diagnose(self, query: str) -> AsyncIterator[Tuple[str, dict]]:
+        """Stream :meth:`diagnose` as ``("token", ...)`` events and a final ``("answer", ...)``."""
+        extractor = AnswerExtractor()
+        content = []
+        prompt = self._timed_prompt(query)
+        with metrics.span("agent.run", agent=self.agent.name, stream="true"):
+            async for delta in stream_content(self.agent.arun(prompt, stream=True)):
+                content.append(delta)
+                text = extractor.feed(delta)
+                if text:
+                    yield "token", {"text": text}
+        yield "answer", self._timed_parse("".join(content))
+
+    def _timed_prompt(self, query: str) -> str:
+        with metrics.span("agent.prompt", agent=self.agent.name):
+            prompt = self._prompt(query)
+        metrics.PROMPT_CHARS.observe(len(prompt), agent=self.agent.name)
+        return prompt
+
+    def _timed_parse(self, response) -> dict:
+        metrics.RESPONSE_CHARS.observe(len(str(getattr(response, "content", response))), agent=self.agent.name)
+        with metrics.span("agent.parse", agent=self.agent.name):
+            return self._parse(response)
+
+    @staticmethod
+    def _prompt(query: str) -> str:
+        return (
             f"Diagnose the following support issue: {query}. "
             "You have access to a tool to retrieve error logs from an n8n webhook. "
-            "When you use the n8n webhook tool, you will receive a JSON object containing an 'incidents' array. "
-            "Each item in the 'incidents' array represents an n8n workflow execution incident with the following fields: "
-            "workflow (full workflow name), count (number of occurrences), first_ts and last_ts (timestamp of first and last occurrence), "
-            "responsibles (array of responsible user IDs), error_signatures (list of combinations of last executed node, error message, and count), "
-            "and executions (list of executions with ts, last_node, error_message, execution_url). "
+            "When you use the n8n webhook tool, you will receive a JSON digest of the open incidents: "
+            "incidents and occurrences (totals), window (first_ts and last_ts over all incidents), "
+            "top_workflows (the workflows with the most occurrences: workflow, count, first_ts, last_ts, responsibles), "
+            "error_signatures (last executed node and error message with their total count and the workflows where they occur) "
+            "and latest_executions (most recent executions: workflow, ts, last_node, error_message, execution_url). "
+            "If the digest has \"stale\": true the webhook could not be reached and the data may be out of date. "
+            "For targeted questions prefer the filtered n8n tools, which return only the matching rows: "
+            "get_n8n_workflow_incidents (one workflow), get_n8n_recent_incidents (last N hours, optionally one workflow) "
+            "and get_n8n_top_error_signatures (most frequent node + error message pairs, optionally within the last N hours). "
             "You MUST use the n8n webhook tool to retrieve error logs if the query seems related to system errors or logs. "
-            "Analyze the 'incidents' data to diagnose the request. "
+            "Analyze the incident digest to diagnose the request. "
             "Provide a concise answer and relevant sources. "
             "Return JSON: {\"answer\": string, \"sources\": string[]}"
         )
 
-        response = self.agent.run(prompt)
+    @staticmethod
+    def _parse(response) -> dict:
         content = getattr(response, "content", str(response)).strip()
 
         # Similar JSON parsing logic as in DocResearcher
@@ -1,32 +1,127 @@
 from __future__ import annotations
 
-import httpx
+import asyncio
+import json
 
 from agno.tools.decorator import tool
 from agno.tools import Toolkit
 
 from src.core.config import Settings
+from src.services.incident_store import IncidentStore
+from src.services.incidents import IncidentFeed
+
+
+MAX_ROWS = 50
 
 
 class N8nWebhookTool(Toolkit):
-    """Toolkit que expõe a função `get_error_logs` para recuperar logs de erro via webhook n8n."""
+    """Toolkit que expõe a função `get_error_logs` para recuperar logs de erro via webhook n8n.
+
+    `Agent.run` usa a versão síncrona e `Agent.arun` a assíncrona (`aget_error_logs`).
+    Ambas passam pelo mesmo `IncidentFeed`: a resposta do webhook vira um resumo compacto
+    (workflows mais afetados, assinaturas de erro agrupadas, últimas execuções), guardado
+    por `N8N_CACHE_TTL` segundos, e chamadas simultâneas compartilham uma única requisição.
+
+    Cada resposta nova do webhook também é incorporada a um `IncidentStore` (SQLite em
+    `INCIDENT_DB`), consultado pelas ferramentas filtradas: por workflow, por janela de
+    tempo e assinaturas de erro mais frequentes.
+    """
 
     def __init__(self, settings: Settings):
         self.settings = settings
+        self.store = IncidentStore(settings.incident_db, retention_hours=settings.incident_retention_hours)
+        self.feed = IncidentFeed(settings.n8n_webhook_url, ttl=settings.n8n_cache_ttl, on_payload=self.store.ingest)
 
-        # Registra a ferramenta (função) no Toolkit
-        super().__init__(name="n8n_webhook", tools=[self.get_error_logs])
+        # Registra as ferramentas (funções) no Toolkit
+        super().__init__(
+            name="n8n_webhook",
+            tools=[self.get_error_logs, self.get_workflow_incidents, self.get_recent_incidents, self.get_top_signatures],
+            async_tools=[
+                (self.aget_error_logs, "get_n8n_error_logs"),
+                (self.aget_workflow_incidents, "get_n8n_workflow_incidents"),
+                (self.aget_recent_incidents, "get_n8n_recent_incidents"),
+                (self.aget_top_signatures, "get_n8n_top_error_signatures"),
+            ],
+        )
 
-    @tool(name="get_n8n_error_logs", description="Recupera logs de erro do webhook n8n configurado em N8N_WEBHOOK_URL")
+    @tool(name="get_n8n_error_logs", description="Recupera um resumo dos incidentes do webhook n8n configurado em N8N_WEBHOOK_URL")
     def get_error_logs(self) -> str:  # type: ignore[override]
-        """Busca logs de erro no webhook n8n indicado em settings.n8n_webhook_url."""
+        """Busca o resumo dos incidentes no webhook n8n indicado em settings.n8n_webhook_url."""
+        return self.feed.fetch()
+
+    async def aget_error_logs(self) -> str:
+        """Recupera um resumo dos incidentes do webhook n8n configurado em N8N_WEBHOOK_URL."""
+        return await self.feed.afetch()
+
+    @tool(name="get_n8n_workflow_incidents", description="Incidentes, assinaturas de erro e últimas execuções de um workflow n8n")
+    def get_workflow_incidents(self, workflow: str, limit: int = 10) -> str:  # type: ignore[override]
+        """Incidentes dos workflows cujo nome contém `workflow`.
+
+        Args:
+            workflow: Nome (ou parte do nome) do workflow.
+            limit: Máximo de workflows e de execuções por workflow.
+        """
+        self.feed.fetch()
+        return _dumps(self.store.workflow(workflow, limit=_clamp(limit)))
+
+    async def aget_workflow_incidents(self, workflow: str, limit: int = 10) -> str:
+        """Incidentes dos workflows cujo nome contém `workflow`.
+
+        Args:
+            workflow: Nome (ou parte do nome) do workflow.
+            limit: Máximo de workflows e de execuções por workflow.
+        """
+        await self.feed.afetch()
+        return _dumps(await asyncio.to_thread(self.store.workflow, workflow, limit=_clamp(limit)))
+
+    @tool(name="get_n8n_recent_incidents", description="Execuções com erro nas últimas horas, por workflow, com as mais recentes")
+    def get_recent_incidents(self, hours: float = 1.0, workflow: str = "", limit: int = 20) -> str:  # type: ignore[override]
+        """Execuções com erro nas últimas `hours` horas.
+
+        Args:
+            hours: Tamanho da janela, em horas, contada a partir de agora.
+            workflow: Filtra pelos workflows cujo nome contém este texto (vazio = todos).
+            limit: Máximo de execuções recentes listadas.
+        """
+        self.feed.fetch()
+        return _dumps(self.store.since(hours, workflow=workflow, limit=_clamp(limit)))
+
+    async def aget_recent_incidents(self, hours: float = 1.0, workflow: str = "", limit: int = 20) -> str:
+        """Execuções com erro nas últimas `hours` horas.
+
+        Args:
+            hours: Tamanho da janela, em horas, contada a partir de agora.
+            workflow: Filtra pelos workflows cujo nome contém este texto (vazio = todos).
+            limit: Máximo de execuções recentes listadas.
+        """
+        await self.feed.afetch()
+        return _dumps(await asyncio.to_thread(self.store.since, hours, workflow=workflow, limit=_clamp(limit)))
+
+    @tool(name="get_n8n_top_error_signatures", description="Assinaturas de erro (nó + mensagem) mais frequentes entre os workflows n8n")
+    def get_top_signatures(self, n: int = 10, hours: float = 0) -> str:  # type: ignore[override]
+        """As `n` assinaturas de erro mais frequentes.
+
+        Args:
+            n: Quantidade de assinaturas.
+            hours: Considera só as execuções das últimas `hours` horas (0 = todo o histórico).
+        """
+        self.feed.fetch()
+        return _dumps(self.store.top_signatures(_clamp(n), hours=hours))
+
+    async def aget_top_signatures(self, n: int = 10, hours: float = 0) -> str:
+        """As `n` assinaturas de erro mais frequentes.
+
+        Args:
+            n: Quantidade de assinaturas.
+            hours: Considera só as execuções das últimas `hours` horas (0 = todo o histórico).
+        """
+        await self.feed.afetch()
+        return _dumps(await asyncio.to_thread(self.store.top_signatures, _clamp(n), hours=hours))
+
+
+def _clamp(limit: int) -> int:
+    return max(1, min(int(limit), MAX_ROWS))
 
-        if not getattr(self.settings, "n8n_webhook_url", None):
-            return "n8n webhook URL não configurada."
 
-        try:
-            response = httpx.get(self.settings.n8n_webhook_url, timeout=10)
-            response.raise_for_status()
-            return response.text
-        except httpx.RequestError as e:
-            return f"Erro ao buscar logs no webhook n8n: {e}"
\ No newline at end of file
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
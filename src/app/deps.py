@@ -1,12 +1,27 @@
 from __future__ import annotations
 
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+from fastapi import Depends
 
-from src.agents.doc_researcher import DocResearcher
-from src.agents.support_diagnoser import SupportDiagnoser
 from src.core.config import get_settings, Settings
-from src.services import retriever_local
+from src.core.request_log import RequestLog
+from src.services.answer_cache import AnswerCache
+from src.services import shards
+from src.services.admission import Limiter, SingleFlight
+from src.services.faq import FaqIndex
+from src.services.retrieval_cache import RetrievalCache
+from src.services.index_watcher import DocsWatcher, LiveIndex
+from src.services.retriever import Retriever, get_retriever
+from src.services.retriever_local import Compaction
+
+if TYPE_CHECKING:
+    from src.agents.doc_researcher import DocResearcher
+    from src.agents.support_diagnoser import SupportDiagnoser
 
 
 @lru_cache(maxsize=1)
@@ -15,22 +30,143 @@ def settings() -> Settings:
 
 
 @lru_cache(maxsize=1)
+def retriever() -> Retriever:
+    return get_retriever(settings().retriever_backend)
+
+
+def shard_layout() -> Dict[str, Tuple[str, str]]:
+    """``{shard: (docs_dir, index_path)}``; without ``DOCS_SHARDS`` one shard over ``docs_dir``."""
+    s = settings()
+    if not s.shards:
+        return {shards.DEFAULT: (s.docs_dir, s.index_path)}
+    return {name: (docs_dir, os.path.join(s.index_path, "shards", name)) for name, docs_dir in s.shards.items()}
+
+
+@lru_cache(maxsize=1)
+def live_indexes() -> Dict[str, LiveIndex]:
+    """One :class:`LiveIndex` per shard, each with its own build lock."""
+    s = settings()
+    compaction = Compaction(s.index_dtype, s.index_min_df, s.index_max_features, s.index_row_terms)
+
+    def builder(name: str, docs_dir: str, index_path: str):
+        def build():
+            logging.getLogger(__name__).info(
+                "Building/Loading local index (%s) for shard %s from %s", s.retriever_backend, name, docs_dir
+            )
+            return retriever().build_or_load_index(
+                docs_dir, index_path, workers=s.ingest_workers, compaction=compaction
+            )
+        return build
+
+    return {name: LiveIndex(builder(name, *paths)) for name, paths in shard_layout().items()}
+
+
+def live_index() -> LiveIndex:
+    """The first (or only) shard."""
+    return next(iter(live_indexes().values()))
+
+
 def local_index():
+    """Current index generation; resolved per request so hot reloads apply."""
+    return live_index().get()
+
+
+def local_indexes(index=Depends(local_index)) -> Dict[str, Dict]:
+    """Current generation of every shard; the first comes through :func:`local_index`."""
+    lives = live_indexes()
+    first = next(iter(lives))
+    return {name: index if name == first else live.get() for name, live in lives.items()}
+
+
+@lru_cache(maxsize=1)
+def docs_watchers() -> List[DocsWatcher]:
     s = settings()
-    logging.getLogger(__name__).info(
-        "Building/Loading local index from %s", s.docs_dir
-    )
-    return retriever_local.build_or_load_index(s.docs_dir, s.index_path)
+    return [
+        DocsWatcher(
+            shard_layout()[name][0],
+            live.refresh,
+            debounce=s.watch_debounce,
+            poll_interval=s.watch_poll_interval,
+        )
+        for name, live in live_indexes().items()
+    ]
+
+
+# The agents (and agno behind them) are imported on first use, not at boot.
 
 
 @lru_cache(maxsize=1)
-def doc_researcher() -> DocResearcher:
+def doc_researcher() -> "DocResearcher":
+    from src.agents.doc_researcher import DocResearcher
+
     s = settings()
     return DocResearcher(s)
 
 
 @lru_cache(maxsize=1)
-def support_diagnoser() -> SupportDiagnoser:
+def support_diagnoser() -> "SupportDiagnoser":
+    from src.agents.support_diagnoser import SupportDiagnoser
+
     s = settings()
     return SupportDiagnoser(s)
 
+
+@lru_cache(maxsize=1)
+def answer_cache() -> AnswerCache:
+    s = settings()
+    return AnswerCache(
+        max_entries=s.answer_cache_size,
+        ttl=s.answer_cache_ttl,
+        similarity=s.answer_cache_similarity,
+        db_path=s.answer_cache_db,
+    )
+
+
+@lru_cache(maxsize=1)
+def retrieval_cache() -> RetrievalCache:
+    s = settings()
+    return RetrievalCache(max_entries=s.retrieval_cache_size, db_path=s.retrieval_cache_db)
+
+
+@lru_cache(maxsize=1)
+def faq_index() -> FaqIndex:
+    s = settings()
+    return FaqIndex.load(s.faq_path, min_similarity=s.faq_min_similarity)
+
+
+@lru_cache(maxsize=1)
+def request_log() -> RequestLog:
+    s = settings()
+    return RequestLog(
+        s.request_log_path,
+        max_queue=s.request_log_queue,
+        max_bytes=s.request_log_max_bytes,
+        rotate_seconds=s.request_log_rotate_seconds,
+        backups=s.request_log_backups,
+        policy=s.request_log_policy,
+    )
+
+
+@lru_cache(maxsize=1)
+def llm_limiter() -> Limiter:
+    """Bounds concurrent model calls (both agents) and the queue in front of them."""
+    s = settings()
+    return Limiter(s.llm_backend, s.llm_max_concurrency, s.llm_max_queue, s.llm_queue_timeout)
+
+
+@lru_cache(maxsize=1)
+def retrieval_limiter() -> Limiter:
+    """One request per retrieval worker at a time, so the executor queue stays short."""
+    s = settings()
+    return Limiter("retrieval", s.retrieval_workers, s.retrieval_max_queue, s.retrieval_queue_timeout)
+
+
+@lru_cache(maxsize=1)
+def ask_flights() -> SingleFlight:
+    return SingleFlight("answer")
+
+
+@lru_cache(maxsize=1)
+def retrieval_executor() -> ThreadPoolExecutor:
+    """Bounded pool for CPU-bound retrieval work off the event loop."""
+    return ThreadPoolExecutor(max_workers=settings().retrieval_workers, thread_name_prefix="retrieval")
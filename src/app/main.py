@@ -1,25 +1,60 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import logging
-from typing import List, Optional
+import math
+import time
+from concurrent.futures import Executor
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from functools import partial
+from typing import Dict, List, Optional
 
-from fastapi import Depends, FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
+from src.core import metrics
 from src.core.config import Settings
+from src.core.http import aclose_async_client, get_async_client
+from src.core.request_log import RequestLog
 from src.core.logging import setup_logging
-from src.services import retriever_local
-from src.agents.doc_researcher import DocResearcher
-from src.app.deps import doc_researcher, local_index, settings, support_diagnoser
+from src.services import context_packer, shards
+from src.services.admission import Limiter, Overloaded, SingleFlight
+from src.services.answer_cache import AnswerCache, normalize_query
+from src.services.faq import FaqIndex
+from src.services.retrieval_cache import RetrievalCache
+from src.services.index_watcher import LiveIndex
+from src.services.retriever import Retriever
+from src.app.deps import (
+    answer_cache,
+    ask_flights,
+    doc_researcher,
+    docs_watchers,
+    faq_index,
+    live_indexes,
+    llm_limiter,
+    local_indexes,
+    request_log,
+    retrieval_cache,
+    retrieval_executor,
+    retrieval_limiter,
+    retriever,
+    settings,
+    support_diagnoser,
+)
 
 
 setup_logging(settings().log_level)
+metrics.configure(settings().metrics_enabled)
 logger = logging.getLogger(__name__)
 
 
 class AskRequest(BaseModel):
     query: str
     k: Optional[int] = None
+    shards: Optional[List[str]] = None
 
 
 class AskResponse(BaseModel):
@@ -27,51 +62,320 @@ class AskResponse(BaseModel):
     sources: List[str]
 
 
-app = FastAPI(title="Agno Doc Bot", version="0.2.0")
+class SearchBatchRequest(BaseModel):
+    queries: List[str]
+    k: Optional[int] = None
+    shards: Optional[List[str]] = None
+
+
+class PassageResponse(BaseModel):
+    text: str
+    path: str
+    title: str
+    chunk_id: int
+    score: float
+    section: str = ""
+    shard: str = ""
+
+
+class SearchBatchResponse(BaseModel):
+    results: List[List[PassageResponse]]
+
+
+def _warm_indexes() -> None:
+    start = time.perf_counter()
+    for live in live_indexes().values():
+        live.get()
+    logger.info("Local index warm in %.2fs", time.perf_counter() - start)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled HTTP client for outbound calls (n8n webhook) per worker.
+    get_async_client()
+    if settings().warm_index:
+        # map every shard's index now rather than on the first request
+        await asyncio.to_thread(_warm_indexes)
+    faq_index()  # vectorize the FAQ before the first request
+    await request_log().start()
+    if settings().watch_docs:
+        for watcher in docs_watchers():
+            watcher.start()
+    yield
+    for watcher in docs_watchers():
+        watcher.stop()
+    await request_log().stop()
+    await aclose_async_client()
+    retrieval_executor().shutdown(wait=False)
+    retrieval_executor.cache_clear()
+
+
+app = FastAPI(title="Agno Doc Bot", version="0.2.0", lifespan=lifespan)
+
+
+async def _time_requests(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.SPAN_SECONDS.observe(
+        time.perf_counter() - start, span="http.request", path=getattr(route, "path", "unmatched")
+    )
+    return response
+
+
+if metrics.enabled():
+    # Registered only when enabled so a disabled build pays nothing per request.
+    app.middleware("http")(_time_requests)
+
+
+@app.exception_handler(Overloaded)
+async def _overloaded(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
+
+
+async def _offload(executor: Executor, fn, *args, **kwargs):
+    """Run blocking retrieval/cache work on the bounded executor."""
+    return await asyncio.get_running_loop().run_in_executor(executor, partial(fn, *args, **kwargs))
+
+
+def _select_shards(indexes: Dict[str, Dict], names: Optional[List[str]]) -> Dict[str, Dict]:
+    try:
+        return shards.select(indexes, names)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from None
+
+
+async def _faq_match(executor: Executor, faq: FaqIndex, query: str, selected: Dict, indexes: Dict):
+    # The FAQ covers the whole deployment, not any one shard: a request
+    # narrowed to some shards is answered from those shards only.
+    if len(selected) < len(indexes):
+        return None
+    return await _offload(executor, faq.match, query)
+
+
+def _cache_view(indexes: Dict[str, Dict], passages) -> Dict:
+    return shards.cache_view(indexes, passages[0].shard if passages else "")
 
 
 @app.post("/ask", response_model=AskResponse)
-def ask(
+async def ask(
     req: AskRequest,
-    agent: DocResearcher = Depends(doc_researcher),
-    index = Depends(local_index),
+    agent=Depends(doc_researcher),
+    indexes: Dict[str, Dict] = Depends(local_indexes),
     settings: Settings = Depends(settings),
-    support_agent: SupportDiagnoser = Depends(support_diagnoser),
+    support_agent=Depends(support_diagnoser),
+    retriever: Retriever = Depends(retriever),
+    cache: AnswerCache = Depends(answer_cache),
+    executor: Executor = Depends(retrieval_executor),
+    results_cache: RetrievalCache = Depends(retrieval_cache),
+    requests: RequestLog = Depends(request_log),
+    faq: FaqIndex = Depends(faq_index),
+    llm: Limiter = Depends(llm_limiter),
+    retrieval: Limiter = Depends(retrieval_limiter),
+    flights: SingleFlight = Depends(ask_flights),
 ) -> AskResponse:
-    # Save request
-    with open("docs/requests.log", "a") as f:
-        f.write(req.model_dump_json() + "\n")
-
     query = (req.query or "").strip()
     if not query:
         raise HTTPException(status_code=400, detail="Query must not be empty")
 
+    # Save request (queued; written in batches by the request log writer)
+    await requests.log(req.model_dump())
+
+    selected = _select_shards(indexes, req.shards)
+
+    # FAQ fast path: a confident match skips retrieval and the model
+    hit = await _faq_match(executor, faq, query, selected, indexes)
+    if hit is not None:
+        entry, score = hit
+        logger.info("FAQ hit (%.2f): %s", score, entry.question)
+        return AskResponse(answer=entry.answer, sources=entry.sources)
+
     k = req.k or settings.k
 
     # Local first
-    logger.info("Local search start: k=%s, index_stats=%s", k, retriever_local.stats(index))
-    local_passages = retriever_local.search(index, query, k=k)
-    passages_text = [p.text for p in local_passages]
-    sources_local = [p.path for p in local_passages]
+    logger.info("Local search start: k=%s, shards=%s", k, list(selected))
+    async with retrieval:
+        local_passages = await shards.search(
+            executor, retriever, selected, query, k=k, min_score=settings.min_score, cache=results_cache
+        )
     logger.info("Local hits: %d", len(local_passages))
-    logger.info("Context size (chars): %d", sum(len(t) for t in passages_text))
+    with metrics.span("context.pack"):
+        context = context_packer.pack(local_passages, settings.context_token_budget)
+    logger.info(
+        "Context tokens: %d (saved %d, dropped %d)", context.tokens, context.tokens_saved, context.dropped
+    )
+
+    if context.passages:
+        view = _cache_view(indexes, local_passages)
+        data = await _offload(executor, cache.get, view, query, local_passages)
+        if data is not None:
+            logger.info("Answer cache hit")
+        else:
+            # identical questions in flight share one model call
+            async def answer():
+                async with llm:
+                    result = await agent.ahandle_local(query, context.passages, context.sources)
+                await _offload(executor, cache.put, view, query, local_passages, result)
+                return result
 
-    if passages_text:
-        data = agent.handle_local(query, passages_text, sources_local)
+            data = await flights.run(cache.key(view, query, local_passages), answer)
         return AskResponse(answer=data.get("answer", ""), sources=data.get("sources", []))
 
     else:
         # Call the support diagnoser agent
-        diagnosis_response = support_agent.diagnose(query)
+        async def diagnose():
+            async with llm:
+                return await support_agent.adiagnose(query)
+
+        diagnosis_response = await flights.run(f"diagnose\n{normalize_query(query)}", diagnose)
         return AskResponse(
             answer=diagnosis_response.get("answer", "Não foi possível diagnosticar o problema."),
             sources=diagnosis_response.get("sources", [])
         )
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _event_stream(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/ask/stream")
+async def ask_stream(
+    req: AskRequest,
+    agent=Depends(doc_researcher),
+    indexes: Dict[str, Dict] = Depends(local_indexes),
+    settings: Settings = Depends(settings),
+    support_agent=Depends(support_diagnoser),
+    retriever: Retriever = Depends(retriever),
+    cache: AnswerCache = Depends(answer_cache),
+    executor: Executor = Depends(retrieval_executor),
+    results_cache: RetrievalCache = Depends(retrieval_cache),
+    requests: RequestLog = Depends(request_log),
+    faq: FaqIndex = Depends(faq_index),
+    llm: Limiter = Depends(llm_limiter),
+    retrieval: Limiter = Depends(retrieval_limiter),
+) -> StreamingResponse:
+    """Server-Sent Events version of /ask.
+
+    Emits ``sources`` as soon as retrieval finishes, then ``token`` events
+    with answer text as the model writes it, and a final ``answer`` event
+    with the same ``{"answer", "sources"}`` payload /ask returns. If the
+    model queue times out after the stream started, an ``error`` event
+    carries the status /ask would have returned.
+    """
+    query = (req.query or "").strip()
+    if not query:
+        raise HTTPException(status_code=400, detail="Query must not be empty")
+    await requests.log(req.model_dump())
+
+    selected = _select_shards(indexes, req.shards)
+
+    hit = await _faq_match(executor, faq, query, selected, indexes)
+    if hit is not None:
+        entry, score = hit
+        logger.info("Stream: FAQ hit (%.2f): %s", score, entry.question)
+
+        async def canned():
+            yield _sse("sources", {"sources": entry.sources})
+            yield _sse("answer", {"answer": entry.answer, "sources": entry.sources})
+
+        return _event_stream(canned())
+
+    k = req.k or settings.k
+    async with retrieval:
+        local_passages = await shards.search(
+            executor, retriever, selected, query, k=k, min_score=settings.min_score, cache=results_cache
+        )
+    logger.info("Stream: local hits: %d", len(local_passages))
+    # shed before the response starts when the model queue is already full
+    llm.check()
+    with metrics.span("context.pack"):
+        context = context_packer.pack(local_passages, settings.context_token_budget)
+    logger.info(
+        "Context tokens: %d (saved %d, dropped %d)", context.tokens, context.tokens_saved, context.dropped
+    )
+
+    async def events():
+        yield _sse("sources", {"sources": context.sources})
+        if context.passages:
+            view = _cache_view(indexes, local_passages)
+            data = await _offload(executor, cache.get, view, query, local_passages)
+            if data is not None:
+                logger.info("Answer cache hit")
+                yield _sse("answer", data)
+                return
+            stream = agent.astream_local(query, context.passages, context.sources)
+        else:
+            stream = support_agent.astream_diagnose(query)
+        try:
+            await llm.acquire()
+        except Overloaded as exc:
+            yield _sse("error", {"detail": str(exc), "status": exc.status_code})
+            return
+        try:
+            async for event, payload in stream:
+                if event == "answer" and context.passages:
+                    await _offload(executor, cache.put, view, query, local_passages, payload)
+                yield _sse(event, payload)
+        finally:
+            llm.release()
+
+    return _event_stream(events())
+
+
+@app.post("/search/batch", response_model=SearchBatchResponse)
+async def search_batch(
+    req: SearchBatchRequest,
+    indexes: Dict[str, Dict] = Depends(local_indexes),
+    settings: Settings = Depends(settings),
+    retriever: Retriever = Depends(retriever),
+    executor: Executor = Depends(retrieval_executor),
+    results_cache: RetrievalCache = Depends(retrieval_cache),
+    retrieval: Limiter = Depends(retrieval_limiter),
+) -> SearchBatchResponse:
+    """Retrieve passages for many queries at once, without calling the LLM."""
+    if not req.queries:
+        raise HTTPException(status_code=400, detail="Queries must not be empty")
+
+    k = req.k or settings.k
+    selected = _select_shards(indexes, req.shards)
+    queries = [(q or "").strip() for q in req.queries]
+    logger.info("Batch search: %d queries, k=%s, shards=%s", len(queries), k, list(selected))
+    async with retrieval:
+        results = await shards.search_many(
+            executor, retriever, selected, queries, k=k, min_score=settings.min_score, cache=results_cache
+        )
+    return SearchBatchResponse(
+        results=[[PassageResponse(**asdict(p)) for p in passages] for passages in results]
+    )
+
+
 @app.get("/stats")
-def stats(index=Depends(local_index)):
-    return retriever_local.stats(index)
+def stats(
+    indexes: Dict[str, Dict] = Depends(local_indexes),
+    retriever: Retriever = Depends(retriever),
+    lives: Dict[str, LiveIndex] = Depends(live_indexes),
+):
+    return shards.stats(retriever, indexes, {name: live.stats() for name, live in lives.items()})
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Latency histograms, prompt/response sizes and cache outcomes (Prometheus text format)."""
+    if not metrics.enabled():
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.get("/health")
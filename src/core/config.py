@@ -4,8 +4,8 @@ Core configuration for the Agno Doc Bot
 from __future__ import annotations
 
 import os
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Dict, Optional
 
 from dotenv import load_dotenv
 
@@ -15,7 +15,24 @@ class Settings:
     docs_dir: str = "./docs"
     log_level: str = "INFO"
     k: int = 5
-    index_path: str = ".local_index.pkl"
+    min_score: float = 0.0
+    retrieval_workers: int = 4
+    retrieval_max_queue: int = 256
+    retrieval_queue_timeout: float = 2.0
+    context_token_budget: int = 2000
+    index_path: str = ".local_index"
+    shards: Dict[str, str] = field(default_factory=dict)
+    warm_index: bool = True
+    ingest_workers: int = 0
+    index_dtype: str = "float64"
+    index_min_df: int = 1
+    index_max_features: int = 0
+    index_row_terms: int = 0
+    watch_docs: bool = True
+    watch_debounce: float = 1.0
+    watch_poll_interval: float = 2.0
+    metrics_enabled: bool = True
+    retriever_backend: str = "tfidf"
     api_port: int = 8088
     allowed_domains: list[str] = list
     agent_instructions: str = """You are a Level 1 support agent. Your main goal is to answer questions based on the provided documentation.
@@ -35,10 +52,55 @@ You should provide a concise diagnosis and cite your sources from the web.
 If you cannot diagnose the issue, you should say so.
 """
 
+    answer_cache_size: int = 512
+    answer_cache_ttl: float = 3600.0
+    answer_cache_similarity: float = 0.9
+    answer_cache_db: Optional[str] = None
+    retrieval_cache_size: int = 1024
+    retrieval_cache_db: Optional[str] = None
+    faq_path: str = "./docs/faq.json"
+    faq_min_similarity: float = 0.9
+
+    request_log_path: str = "docs/requests.log"
+    request_log_queue: int = 10000
+    request_log_policy: str = "drop"
+    request_log_max_bytes: int = 10 * 1024 * 1024
+    request_log_rotate_seconds: float = 86400.0
+    request_log_backups: int = 5
+
+    llm_backend: str = "openai"
+    llm_max_concurrency: int = 16
+    llm_max_queue: int = 64
+    llm_queue_timeout: float = 15.0
+    mock_llm_ttft_ms: float = 300.0
+    mock_llm_jitter: float = 0.5
+    mock_llm_tokens_per_second: float = 50.0
+    mock_llm_output_tokens: int = 120
+    mock_llm_seed: int = 0
+
     openai_api_key: Optional[str] = None
     openai_base_url: str = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
     openai_model: str = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
     n8n_webhook_url: Optional[str] = None
+    n8n_cache_ttl: float = 30.0
+    incident_db: str = ".local_index/incidents.db"
+    incident_retention_hours: float = 168.0
+
+
+def parse_shards(spec: str) -> Dict[str, str]:
+    """``"name=dir,name=dir"`` -> ``{name: dir}``, in the given order."""
+    shards: Dict[str, str] = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, sep, docs_dir = item.partition("=")
+        name, docs_dir = name.strip(), docs_dir.strip()
+        if not sep or not name or not docs_dir:
+            raise ValueError(f"Invalid shard {item.strip()!r} in DOCS_SHARDS; expected name=docs_dir")
+        if name in shards:
+            raise ValueError(f"Duplicate shard {name!r} in DOCS_SHARDS")
+        shards[name] = docs_dir
+    return shards
 
 
 def get_settings() -> Settings:
@@ -46,7 +108,24 @@ def get_settings() -> Settings:
     docs_dir = os.getenv("DOCS_DIR", "./docs")
     log_level = os.getenv("LOG_LEVEL", "INFO")
     k = int(os.getenv("K", "5"))
-    index_path = os.getenv("INDEX_PATH", ".local_index.pkl")
+    min_score = float(os.getenv("MIN_SCORE", "0.0"))
+    retrieval_workers = int(os.getenv("RETRIEVAL_WORKERS", "4"))
+    retrieval_max_queue = int(os.getenv("RETRIEVAL_MAX_QUEUE", "256"))
+    retrieval_queue_timeout = float(os.getenv("RETRIEVAL_QUEUE_TIMEOUT", "2"))
+    context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+    index_path = os.getenv("INDEX_PATH", ".local_index")
+    shards = parse_shards(os.getenv("DOCS_SHARDS", ""))
+    warm_index = os.getenv("WARM_INDEX", "true").strip().lower() in ("1", "true", "yes", "on")
+    ingest_workers = int(os.getenv("INGEST_WORKERS", "0"))
+    index_dtype = os.getenv("INDEX_DTYPE", "float64").strip().lower()
+    index_min_df = int(os.getenv("INDEX_MIN_DF", "1"))
+    index_max_features = int(os.getenv("INDEX_MAX_FEATURES", "0"))
+    index_row_terms = int(os.getenv("INDEX_ROW_TERMS", "0"))
+    watch_docs = os.getenv("WATCH_DOCS", "true").strip().lower() in ("1", "true", "yes", "on")
+    watch_debounce = float(os.getenv("WATCH_DEBOUNCE", "1.0"))
+    watch_poll_interval = float(os.getenv("WATCH_POLL_INTERVAL", "2.0"))
+    metrics_enabled = os.getenv("METRICS_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+    retriever_backend = os.getenv("RETRIEVER_BACKEND", "tfidf")
     api_port = int(os.getenv("API_PORT", "8088"))
     allowed_domains = os.getenv("ALLOWED_DOMAINS", "notion.site,notion.so,www.notion.so").split(",")
     agent_instructions = os.getenv("AGENT_INSTRUCTIONS", """You are a Level 1 support agent. Your main goal is to answer questions based on the provided documentation.
@@ -66,23 +145,95 @@ You should provide a concise diagnosis and cite your sources from the web.
 If you cannot diagnose the issue, you should say so.
 """)
 
+    answer_cache_size = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+    answer_cache_ttl = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+    answer_cache_similarity = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.9"))
+    answer_cache_db = os.getenv("ANSWER_CACHE_DB")
+    retrieval_cache_size = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+    retrieval_cache_db = os.getenv("RETRIEVAL_CACHE_DB")
+    faq_path = os.getenv("FAQ_PATH", os.path.join(docs_dir, "faq.json"))
+    faq_min_similarity = float(os.getenv("FAQ_MIN_SIMILARITY", "0.9"))
+
+    request_log_path = os.getenv("REQUEST_LOG_PATH", "docs/requests.log")
+    request_log_queue = int(os.getenv("REQUEST_LOG_QUEUE", "10000"))
+    request_log_policy = os.getenv("REQUEST_LOG_POLICY", "drop")
+    request_log_max_bytes = int(os.getenv("REQUEST_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    request_log_rotate_seconds = float(os.getenv("REQUEST_LOG_ROTATE_SECONDS", "86400"))
+    request_log_backups = int(os.getenv("REQUEST_LOG_BACKUPS", "5"))
+
+    llm_backend = os.getenv("LLM_BACKEND", "openai")
+    llm_max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    llm_max_queue = int(os.getenv("LLM_MAX_QUEUE", "64"))
+    llm_queue_timeout = float(os.getenv("LLM_QUEUE_TIMEOUT", "15"))
+    mock_llm_ttft_ms = float(os.getenv("MOCK_LLM_TTFT_MS", "300"))
+    mock_llm_jitter = float(os.getenv("MOCK_LLM_JITTER", "0.5"))
+    mock_llm_tokens_per_second = float(os.getenv("MOCK_LLM_TOKENS_PER_SECOND", "50"))
+    mock_llm_output_tokens = int(os.getenv("MOCK_LLM_OUTPUT_TOKENS", "120"))
+    mock_llm_seed = int(os.getenv("MOCK_LLM_SEED", "0"))
+
     openai_api_key = os.getenv("OPENAI_API_KEY")
     openai_base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
     openai_model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
     n8n_webhook_url = os.getenv("N8N_WEBHOOK_URL")
+    n8n_cache_ttl = float(os.getenv("N8N_CACHE_TTL", "30"))
+    incident_db = os.getenv("INCIDENT_DB", os.path.join(index_path, "incidents.db"))
+    incident_retention_hours = float(os.getenv("INCIDENT_RETENTION_HOURS", "168"))
 
     return Settings(
         docs_dir=docs_dir,
         log_level=log_level,
         k=k,
+        min_score=min_score,
+        retrieval_workers=retrieval_workers,
+        retrieval_max_queue=retrieval_max_queue,
+        retrieval_queue_timeout=retrieval_queue_timeout,
+        context_token_budget=context_token_budget,
         index_path=index_path,
+        shards=shards,
+        warm_index=warm_index,
+        ingest_workers=ingest_workers,
+        index_dtype=index_dtype,
+        index_min_df=index_min_df,
+        index_max_features=index_max_features,
+        index_row_terms=index_row_terms,
+        watch_docs=watch_docs,
+        watch_debounce=watch_debounce,
+        watch_poll_interval=watch_poll_interval,
+        metrics_enabled=metrics_enabled,
+        retriever_backend=retriever_backend,
         api_port=api_port,
         allowed_domains=allowed_domains,
         agent_instructions=agent_instructions,
         support_agent_instructions=support_agent_instructions,
+        answer_cache_size=answer_cache_size,
+        answer_cache_ttl=answer_cache_ttl,
+        answer_cache_similarity=answer_cache_similarity,
+        answer_cache_db=answer_cache_db,
+        retrieval_cache_size=retrieval_cache_size,
+        retrieval_cache_db=retrieval_cache_db,
+        faq_path=faq_path,
+        faq_min_similarity=faq_min_similarity,
+        request_log_path=request_log_path,
+        request_log_queue=request_log_queue,
+        request_log_policy=request_log_policy,
+        request_log_max_bytes=request_log_max_bytes,
+        request_log_rotate_seconds=request_log_rotate_seconds,
+        request_log_backups=request_log_backups,
+        llm_backend=llm_backend,
+        llm_max_concurrency=llm_max_concurrency,
+        llm_max_queue=llm_max_queue,
+        llm_queue_timeout=llm_queue_timeout,
+        mock_llm_ttft_ms=mock_llm_ttft_ms,
+        mock_llm_jitter=mock_llm_jitter,
+        mock_llm_tokens_per_second=mock_llm_tokens_per_second,
+        mock_llm_output_tokens=mock_llm_output_tokens,
+        mock_llm_seed=mock_llm_seed,
         openai_api_key=openai_api_key,
         openai_base_url=openai_base_url,
         openai_model=openai_model,
         n8n_webhook_url=n8n_webhook_url,
+        n8n_cache_ttl=n8n_cache_ttl,
+        incident_db=incident_db,
+        incident_retention_hours=incident_retention_hours,
     )
 
@@ -0,0 +1,39 @@
+"""Shared, pooled HTTP clients.
+
+Clients are created lazily and reused so outbound calls (e.g. the n8n
+webhook) keep their connections alive instead of opening a new one per
+request. The async client is opened and closed by the app lifespan.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+import httpx
+
+
+TIMEOUT = httpx.Timeout(10.0)
+LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+
+_async_client: Optional[httpx.AsyncClient] = None
+_client: Optional[httpx.Client] = None
+
+
+def get_async_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(timeout=TIMEOUT, limits=LIMITS)
+    return _async_client
+
+
+async def aclose_async_client() -> None:
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+def get_client() -> httpx.Client:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.Client(timeout=TIMEOUT, limits=LIMITS)
+    return _client
@@ -0,0 +1,170 @@
+"""In-process metrics exposed in Prometheus text format at ``GET /metrics``.
+
+Instrumented code uses :func:`span` to time a step and the module-level
+metrics below for sizes and cache outcomes::
+
+    with metrics.span("agent.run", agent="doc_researcher"):
+        response = agent.run(prompt)
+    metrics.PROMPT_CHARS.observe(len(prompt), agent="doc_researcher")
+
+Everything is a no-op until :func:`configure` enables collection: a disabled
+:func:`span` returns a shared null context and ``observe``/``inc`` return
+after one flag check, so instrumentation can stay in hot paths.
+"""
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import nullcontext
+from typing import Dict, List, Sequence, Tuple
+
+
+_enabled = False
+_NOOP = nullcontext()
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def configure(enabled: bool) -> None:
+    global _enabled
+    _enabled = enabled
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        if not _enabled:
+            return
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {_number(value)}")
+        return lines
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Sequence[float]) -> None:
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Labels, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        if not _enabled:
+            return
+        key = _labels(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            series[slot] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._values.items()):
+                cumulative = 0.0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    le = _format_labels(labels, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{le} {_number(cumulative)}")
+                cumulative += series[len(self.buckets)]
+                le = _format_labels(labels, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{le} {_number(cumulative)}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_number(series[-1])}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {_number(cumulative)}")
+        return lines
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+SPAN_SECONDS = Histogram("docbot_span_seconds", "Latency of instrumented steps in seconds.", LATENCY_BUCKETS)
+PROMPT_CHARS = Histogram("docbot_prompt_chars", "Size of prompts sent to the model, in characters.", SIZE_BUCKETS)
+RESPONSE_CHARS = Histogram("docbot_response_chars", "Size of model responses, in characters.", SIZE_BUCKETS)
+CACHE_REQUESTS = Counter("docbot_cache_requests_total", "Cache lookups by cache and result (hit/miss).")
+TOOL_ERRORS = Counter("docbot_tool_errors_total", "Failed tool calls by tool.")
+SHED_REQUESTS = Counter("docbot_shed_requests_total", "Requests rejected by admission control, by limiter and status.")
+
+REGISTRY = [SPAN_SECONDS, PROMPT_CHARS, RESPONSE_CHARS, CACHE_REQUESTS, TOOL_ERRORS, SHED_REQUESTS]
+
+
+class _Span:
+    __slots__ = ("_labels", "_start")
+
+    def __init__(self, labels: Dict[str, object]) -> None:
+        self._labels = labels
+
+    def __enter__(self) -> "_Span":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        SPAN_SECONDS.observe(time.perf_counter() - self._start, **self._labels)
+
+
+def span(name: str, **labels):
+    """Context manager recording the duration of its block under ``span=name``."""
+    if not _enabled:
+        return _NOOP
+    labels["span"] = name
+    return _Span(labels)
+
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format (version 0.0.4)."""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    for metric in REGISTRY:
+        metric.reset()
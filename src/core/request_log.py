@@ -0,0 +1,231 @@
+"""Buffered, non-blocking request log (JSONL).
+
+Handlers call :meth:`RequestLog.log`, which only enqueues the record on a
+bounded in-memory queue. A writer task started by the app lifespan drains the
+queue in batches and appends each batch to the log file with a single
+``write`` on an ``O_APPEND`` descriptor, from a worker thread, so disk I/O
+never runs on the request path and lines from several workers do not
+interleave. The file is rotated by size and age (``path.1`` ... ``path.N``),
+and pending records are flushed on shutdown.
+
+When the queue is full the ``policy`` decides: ``"drop"`` discards the record
+(and counts it), ``"block"`` makes the caller wait for room.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not POSIX; rotation is not serialised
+    fcntl = None
+
+LOGGER = logging.getLogger(__name__)
+
+# Queued by :meth:`RequestLog.stop`: the writer flushes its batch and exits.
+_STOP = object()
+
+
+class RequestLog:
+    def __init__(
+        self,
+        path: str,
+        *,
+        max_queue: int = 10000,
+        batch_size: int = 256,
+        flush_interval: float = 1.0,
+        max_bytes: int = 10 * 1024 * 1024,
+        rotate_seconds: float = 86400.0,
+        backups: int = 5,
+        policy: str = "drop",
+    ) -> None:
+        if policy not in ("drop", "block"):
+            raise ValueError(f"Unknown request log policy {policy!r}; expected 'drop' or 'block'")
+        self.path = Path(path)
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backups = backups
+        self.policy = policy
+        self.dropped = 0
+        self.written = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._fd: Optional[int] = None
+        # (inode, ts of its first record) for the current file, see _started()
+        self._start: Optional[Tuple[int, float]] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run(), name="request-log-writer")
+
+    async def stop(self) -> None:
+        """Flush everything still queued and close the file."""
+        if self._task is not None:
+            if not self._task.done():
+                # not cancel(): the writer may hold a batch it has not written yet
+                await self._queue.put(_STOP)
+            try:
+                await self._task
+            except Exception:
+                LOGGER.exception("Request log writer failed")
+            self._task = None
+        if self._queue is not None:
+            await asyncio.to_thread(self._write, self._drain(self._queue.qsize()))
+        await asyncio.to_thread(self._close)
+
+    async def log(self, record: dict) -> None:
+        record = {"ts": time.time(), **record}
+        if not self.running:
+            # No writer (e.g. app running without lifespan): write through a thread.
+            await asyncio.to_thread(self._write, [self._line(record)])
+            return
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            if self.policy == "block":
+                await self._queue.put(record)
+            else:
+                self.dropped += 1
+                if self.dropped == 1 or self.dropped % 1000 == 0:
+                    LOGGER.warning("Request log queue full, %d records dropped so far", self.dropped)
+
+    # -- writer -----------------------------------------------------------
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is _STOP:
+                return
+            batch = [self._line(first)]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if record is _STOP:
+                    stopping = True
+                    break
+                batch.append(self._line(record))
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception:
+                LOGGER.exception("Failed to write %d request log records", len(batch))
+
+    def _drain(self, n: int) -> List[str]:
+        lines = []
+        for _ in range(n):
+            try:
+                record = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            if record is not _STOP:
+                lines.append(self._line(record))
+        return lines
+
+    @staticmethod
+    def _line(record: dict) -> str:
+        return json.dumps(record, ensure_ascii=False) + "\n"
+
+    def _write(self, lines: List[str]) -> None:
+        if not lines:
+            return
+        data = "".join(lines).encode("utf-8")
+        self._maybe_rotate(len(data))
+        os.write(self._open(), data)
+        self.written += len(lines)
+
+    def _open(self) -> int:
+        # Reopen if another worker rotated the file under us.
+        if self._fd is not None:
+            try:
+                same = os.fstat(self._fd).st_ino == os.stat(self.path).st_ino
+            except FileNotFoundError:
+                same = False
+            if not same:
+                self._close()
+        if self._fd is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def _close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    @contextmanager
+    def _rotation_lock(self) -> Iterator[None]:
+        """Exclusive ``flock`` on ``<path>.lock``, shared by every worker process."""
+        if fcntl is None:
+            yield
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path.with_name(f"{self.path.name}.lock"), os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # releases the lock
+
+    def _due(self, incoming: int) -> bool:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        too_big = self.max_bytes > 0 and st.st_size + incoming > self.max_bytes
+        too_old = False
+        if self.rotate_seconds > 0 and st.st_size > 0:
+            started = self._started(st)
+            too_old = started is not None and time.time() - started > self.rotate_seconds
+        return too_big or too_old
+
+    def _started(self, st: os.stat_result) -> Optional[float]:
+        """``ts`` of the file's first record, cached per inode.
+
+        Not ``st_mtime`` (under steady traffic the last write is always recent)
+        nor when this process opened the file (that resets on every restart and
+        differs between workers): the first record is what every worker sees.
+        """
+        if self._start is not None and self._start[0] == st.st_ino:
+            return self._start[1]
+        try:
+            with self.path.open("rb") as f:
+                started = float(json.loads(f.readline())["ts"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None  # unreadable first line: rotate by size only
+        self._start = (st.st_ino, started)
+        return started
+
+    def _maybe_rotate(self, incoming: int) -> None:
+        if self.backups <= 0 or not self._due(incoming):
+            return
+        with self._rotation_lock():
+            # Re-check under the lock: another worker may have rotated while we waited.
+            if self._due(incoming):
+                for i in range(self.backups - 1, 0, -1):
+                    src = self.path.with_name(f"{self.path.name}.{i}")
+                    if src.exists():
+                        os.replace(src, self.path.with_name(f"{self.path.name}.{i + 1}"))
+                os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        self._close()
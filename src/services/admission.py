@@ -0,0 +1,127 @@
+"""Admission control and single-flight coalescing for ``/ask``.
+
+A burst of users asking the same question would otherwise start one model
+call each, and a burst of different questions would pile up behind the
+model and the retrieval pool until every request is slow.
+
+:class:`SingleFlight` lets concurrent requests with the same key (the
+answer-cache key: normalized question plus retrieved chunks) share one
+in-flight call. :class:`Limiter` bounds the concurrent calls to one
+backend and the queue in front of it. A request that finds the queue
+full is shed at once with 429; one that waits longer than
+``queue_timeout`` gets 503. Both are raised as :class:`Overloaded` with a
+``Retry-After`` hint, so tail latency is bounded by the queue instead of
+growing with the burst.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict
+
+from src.core import metrics
+
+
+class Overloaded(Exception):
+    def __init__(self, limiter: str, status_code: int, retry_after: float) -> None:
+        super().__init__(f"{limiter} is overloaded, retry in {retry_after:g}s")
+        self.limiter = limiter
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class Limiter:
+    """At most ``max_concurrent`` holders, ``max_queue`` waiters, FIFO.
+
+    ``max_concurrent=0`` disables the limit. Waiters are plain futures on
+    the running loop, so an instance is not tied to one event loop.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int = 0, queue_timeout: float = 5.0) -> None:
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def _busy(self) -> bool:
+        return self._active >= self.max_concurrent or bool(self._waiters)
+
+    def check(self) -> None:
+        """Shed now, with 429, if a new request could not even queue."""
+        if self.max_concurrent > 0 and self._busy() and len(self._waiters) >= self.max_queue:
+            self._shed(429)
+
+    async def acquire(self) -> None:
+        if self.max_concurrent <= 0:
+            return
+        if not self._busy():
+            self._active += 1
+            return
+        self.check()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            with metrics.span("admission.wait", limiter=self.name):
+                await asyncio.wait_for(waiter, self.queue_timeout if self.queue_timeout > 0 else None)
+        except asyncio.TimeoutError:
+            self._shed(503)
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over just as we were cancelled; pass it on
+                self.release()
+            raise
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+
+    def release(self) -> None:
+        if self.max_concurrent <= 0:
+            return
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # the slot moves to the waiter
+                return
+        self._active -= 1
+
+    async def __aenter__(self) -> "Limiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {"active": self._active, "queued": len(self._waiters)}
+
+    def _shed(self, status_code: int) -> None:
+        metrics.SHED_REQUESTS.inc(limiter=self.name, status=status_code)
+        raise Overloaded(self.name, status_code, max(self.queue_timeout, 1.0))
+
+
+class SingleFlight:
+    """Concurrent :meth:`run` calls with the same key share one call of ``fn``."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        task = self._tasks.get(key)
+        if task is not None and not task.done() and task.get_loop() is loop:
+            metrics.CACHE_REQUESTS.inc(cache=self.name, result="coalesced")
+        else:
+            task = self._tasks[key] = loop.create_task(fn())
+            task.add_done_callback(lambda done: self._tasks.pop(key, None) if self._tasks.get(key) is done else None)
+        # shield: one cancelled caller must not cancel the shared call
+        return await asyncio.shield(task)
+
+    def __len__(self) -> int:
+        return len(self._tasks)
@@ -0,0 +1,256 @@
+"""Answer cache in front of ``DocResearcher.handle_local``.
+
+Answers are keyed on the normalized query plus the set of retrieved chunk
+ids. A chunk id embeds the content hash of its source file (see
+:func:`src.services.retriever_local.chunk_key`), so an answer can only be
+reused with exactly the context it was produced from. Lookups go through:
+
+1. the exact key in an in-memory LRU (with TTL);
+2. the exact key in the optional SQLite tier (promoted to memory on hit);
+3. near-duplicate queries that retrieved the same chunks, matched by cosine
+   similarity of their TF-IDF vectors above ``similarity``.
+
+When the index generation changes, entries referencing files whose hash
+changed (or that disappeared) are purged from both tiers.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from src.core import metrics
+from src.services import retriever_local
+from src.services.retriever_local import Passage
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, accent-free, punctuation-free form of ``query``."""
+    text = unicodedata.normalize("NFKD", query.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(re.findall(r"\w+", text))
+
+
+@dataclass
+class _Entry:
+    key: str
+    chunkset: str
+    chunk_ids: List[str]
+    vector: Dict[str, float]
+    answer: dict
+    created: float
+
+
+class AnswerCache:
+    """LRU/TTL answer cache with near-duplicate matching and an optional SQLite tier.
+
+    ``max_entries=0`` disables the cache.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl: float = 3600.0,
+        similarity: float = 0.9,
+        db_path: Optional[str] = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._by_chunkset: Dict[str, set] = {}
+        self._generation: Optional[str] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path and max_entries > 0:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                " key TEXT PRIMARY KEY, chunkset TEXT NOT NULL, chunk_ids TEXT NOT NULL,"
+                " vector TEXT NOT NULL, answer TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS answers_chunkset ON answers (chunkset)")
+            self._db.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    # -- public API -------------------------------------------------------
+
+    def get(self, index: Dict, query: str, passages: List[Passage]) -> Optional[dict]:
+        """Cached answer for ``query`` answered from ``passages``, if any."""
+        if not self.enabled or not passages:
+            return None
+        key, chunkset, chunk_ids = self._keys(index, query, passages)
+        with self._lock:
+            self._sync(index)
+            entry = self._get_exact(key)
+            if entry is None and self.similarity < 1.0:
+                entry = self._get_similar(chunkset, self._vector(index, query))
+            if entry is None:
+                self.misses += 1
+                metrics.CACHE_REQUESTS.inc(cache="answer", result="miss")
+                return None
+            self.hits += 1
+            metrics.CACHE_REQUESTS.inc(cache="answer", result="hit")
+            return dict(entry.answer)
+
+    def put(self, index: Dict, query: str, passages: List[Passage], answer: dict) -> None:
+        if not self.enabled or not passages:
+            return
+        key, chunkset, chunk_ids = self._keys(index, query, passages)
+        entry = _Entry(key, chunkset, chunk_ids, self._vector(index, query), dict(answer), time.time())
+        with self._lock:
+            self._sync(index)
+            self._remember(entry)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, chunkset, json.dumps(chunk_ids), json.dumps(entry.vector), json.dumps(entry.answer), entry.created),
+                )
+                self._db.commit()
+
+    def key(self, index: Dict, query: str, passages: List[Passage]) -> str:
+        """Exact-match key of ``query`` answered from ``passages``."""
+        return self._keys(index, query, passages)[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    # -- internals --------------------------------------------------------
+
+    def _keys(self, index: Dict, query: str, passages: List[Passage]):
+        chunk_ids = sorted({retriever_local.chunk_key(index, p) for p in passages})
+        chunkset = hashlib.sha1("\n".join(chunk_ids).encode("utf-8")).hexdigest()
+        key = hashlib.sha1(f"{normalize_query(query)}\n{chunkset}".encode("utf-8")).hexdigest()
+        return key, chunkset, chunk_ids
+
+    @staticmethod
+    def _vector(index: Dict, query: str) -> Dict[str, float]:
+        vec = retriever_local._transform(index, [query])
+        vocabulary = index.get("terms", index["vocabulary"])
+        return {vocabulary[int(col)]: float(w) for col, w in zip(vec.indices, vec.data)}
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def _remember(self, entry: _Entry) -> None:
+        if entry.key in self._entries:
+            self._forget(entry.key)
+        self._entries[entry.key] = entry
+        self._by_chunkset.setdefault(entry.chunkset, set()).add(entry.key)
+        while len(self._entries) > self.max_entries:
+            self._forget(next(iter(self._entries)))
+
+    def _forget(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        keys = self._by_chunkset.get(entry.chunkset)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_chunkset[entry.chunkset]
+
+    def _get_exact(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if self._expired(entry.created):
+                self._forget(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT key, chunkset, chunk_ids, vector, answer, created FROM answers WHERE key = ?", (key,)
+        ).fetchone()
+        return self._promote(row)
+
+    def _get_similar(self, chunkset: str, vector: Dict[str, float]) -> Optional[_Entry]:
+        if not vector:
+            return None
+        best, best_sim = None, self.similarity
+        for key in list(self._by_chunkset.get(chunkset, ())):
+            entry = self._entries[key]
+            if self._expired(entry.created):
+                self._forget(key)
+                continue
+            sim = _cosine(vector, entry.vector)
+            if sim >= best_sim:
+                best, best_sim = entry, sim
+        if best is None and self._db is not None:
+            rows = self._db.execute(
+                "SELECT key, chunkset, chunk_ids, vector, answer, created FROM answers"
+                " WHERE chunkset = ? ORDER BY created DESC LIMIT 64",
+                (chunkset,),
+            ).fetchall()
+            for row in rows:
+                sim = _cosine(vector, json.loads(row[3]))
+                if sim >= best_sim:
+                    best, best_sim = self._promote(row), sim
+        if best is not None:
+            self._entries.move_to_end(best.key)
+        return best
+
+    def _promote(self, row) -> Optional[_Entry]:
+        if row is None:
+            return None
+        entry = _Entry(row[0], row[1], json.loads(row[2]), json.loads(row[3]), json.loads(row[4]), row[5])
+        if self._expired(entry.created):
+            self._db.execute("DELETE FROM answers WHERE key = ?", (entry.key,))
+            self._db.commit()
+            return None
+        self._remember(entry)
+        return entry
+
+    def _sync(self, index: Dict) -> None:
+        """Purge entries built from files that changed since the last seen generation."""
+        generation = index.get("generation")
+        if generation == self._generation:
+            return
+        first = self._generation is None
+        self._generation = generation
+        if first and self._db is None:
+            return
+        manifest = index.get("manifest", {})
+        stale = [k for k, e in self._entries.items() if not _valid(e.chunk_ids, manifest)]
+        for key in stale:
+            self._forget(key)
+        removed = len(stale)
+        if self._db is not None:
+            rows = self._db.execute("SELECT key, chunk_ids FROM answers").fetchall()
+            dead = [(key,) for key, ids in rows if not _valid(json.loads(ids), manifest)]
+            self._db.executemany("DELETE FROM answers WHERE key = ?", dead)
+            self._db.commit()
+            removed += len(dead)
+        if removed:
+            LOGGER.info("Answer cache: dropped %d entries after index change", removed)
+
+
+def _valid(chunk_ids: List[str], manifest: Dict[str, Dict]) -> bool:
+    for chunk_id in chunk_ids:
+        path, _, digest = chunk_id.rpartition("@")
+        path = path.rpartition("#")[0]
+        entry = manifest.get(path)
+        if entry is None or not entry.get("sha1", "").startswith(digest):
+            return False
+    return True
+
+
+def _cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(t, 0.0) for t, w in a.items())
@@ -0,0 +1,128 @@
+"""Context assembly for ``DocResearcher`` prompts.
+
+Retrieved passages are packed before they reach the model:
+
+1. near-identical passages (word-trigram Jaccard above ``dedupe_threshold``)
+   are dropped, keeping the best-scored copy;
+2. adjacent chunks of the same file are merged, removing the text they
+   share through the chunker overlap;
+3. merged blocks are added in score order until ``token_budget`` is
+   reached; the block that crosses the budget is cut at a word boundary.
+
+Token counts are estimated (~4 characters per token), which is close enough
+for budgeting without pulling in a tokenizer.
+"""
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Set
+
+from src.services.retriever_local import Passage
+
+
+CHARS_PER_TOKEN = 4
+MIN_TRUNCATED_TOKENS = 64
+
+
+@dataclass
+class PackedContext:
+    """Packed prompt context; ``dropped`` counts duplicates plus blocks over budget."""
+
+    passages: List[str] = field(default_factory=list)
+    sources: List[str] = field(default_factory=list)
+    tokens: int = 0
+    tokens_saved: int = 0
+    dropped: int = 0
+
+
+@dataclass
+class _Block:
+    path: str
+    first: int
+    last: int
+    text: str
+    score: float
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _shingles(text: str) -> Set[int]:
+    words = text.lower().split()
+    if len(words) < 3:
+        return {hash(" ".join(words))}
+    return {hash(" ".join(words[i:i + 3])) for i in range(len(words) - 2)}
+
+
+def _merge_text(a: str, b: str) -> str:
+    """Concatenate consecutive chunks, collapsing the text they share."""
+    probe = b[:32]
+    idx = a.find(probe, max(0, len(a) - len(b)))
+    while idx != -1:
+        if b.startswith(a[idx:]):
+            return a + b[len(a) - idx:]
+        idx = a.find(probe, idx + 1)
+    return a + "\n\n" + b
+
+
+def _truncate(text: str, tokens: int) -> str:
+    cut = text[: tokens * CHARS_PER_TOKEN - 2]
+    space = cut.rfind(" ")
+    if space > len(cut) // 2:
+        cut = cut[:space]
+    return cut.rstrip() + " …"
+
+
+def pack(passages: List[Passage], token_budget: int = 0, dedupe_threshold: float = 0.9) -> PackedContext:
+    """Deduplicate, merge and budget ``passages`` (``token_budget <= 0``: no limit)."""
+    if not passages:
+        return PackedContext()
+    original_tokens = estimate_tokens("\n\n".join(p.text for p in passages))
+
+    kept: List[Passage] = []
+    seen: List[Set[int]] = []
+    for p in sorted(passages, key=lambda p: -p.score):
+        shingles = _shingles(p.text)
+        if any(len(shingles & s) / max(len(shingles | s), 1) >= dedupe_threshold for s in seen):
+            continue
+        kept.append(p)
+        seen.append(shingles)
+    dropped = len(passages) - len(kept)
+
+    by_path: Dict[str, List[Passage]] = {}
+    for p in kept:
+        by_path.setdefault(p.path, []).append(p)
+    blocks: List[_Block] = []
+    for path, group in by_path.items():
+        group.sort(key=lambda p: p.chunk_id)
+        block = _Block(path, group[0].chunk_id, group[0].chunk_id, group[0].text, group[0].score)
+        for p in group[1:]:
+            if p.chunk_id == block.last + 1:
+                block.text = _merge_text(block.text, p.text)
+                block.last = p.chunk_id
+                block.score = max(block.score, p.score)
+            else:
+                blocks.append(block)
+                block = _Block(path, p.chunk_id, p.chunk_id, p.text, p.score)
+        blocks.append(block)
+    blocks.sort(key=lambda b: -b.score)
+
+    packed = PackedContext(dropped=dropped)
+    for block in blocks:
+        tokens = estimate_tokens(block.text)
+        text = block.text
+        if token_budget > 0 and packed.tokens + tokens > token_budget:
+            remaining = token_budget - packed.tokens
+            if remaining < MIN_TRUNCATED_TOKENS:
+                packed.dropped += 1
+                continue
+            text = _truncate(text, remaining)
+            tokens = estimate_tokens(text)
+        packed.passages.append(text)
+        packed.tokens += tokens
+        if block.path not in packed.sources:
+            packed.sources.append(block.path)
+    packed.tokens_saved = max(original_tokens - estimate_tokens("\n\n".join(packed.passages)), 0)
+    return packed
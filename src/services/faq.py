@@ -0,0 +1,230 @@
+"""FAQ fast path: canned answers for questions asked over and over.
+
+``docs/faq.json`` holds question/answer pairs (a JSON object, a JSON list or
+one object per line)::
+
+    {"question": "Quanto tempo leva ...?", "answer": "...", "sources": ["..."],
+     "variants": ["outras formas de perguntar"]}
+
+Entries without an ``answer`` are kept in the file as candidates but not
+served. :class:`FaqIndex` vectorizes the questions and their variants once,
+with accent-folded character n-grams, so ``/ask`` can answer a close match
+in well under a millisecond without retrieval or the model.
+
+Candidates are mined offline from the request log: near-duplicate questions
+are grouped and the frequent ones not already covered are printed, ready to
+be given an answer and appended to the FAQ file::
+
+    python -m src.services.faq --requests docs/requests.log --min-count 3
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.core import metrics
+from src.services.answer_cache import normalize_query
+
+if TYPE_CHECKING:
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+# Misses only cost the normal path; a wrong canned answer is worse, so stay strict.
+MIN_SIMILARITY = 0.9
+CLUSTER_SIMILARITY = 0.75
+
+
+@dataclass
+class FaqEntry:
+    question: str
+    answer: str
+    sources: List[str] = field(default_factory=list)
+    variants: List[str] = field(default_factory=list)
+
+
+def _records(text: str) -> List[Dict]:
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = []
+        for line in text.splitlines():
+            try:
+                data.append(json.loads(line))
+            except ValueError:
+                continue
+    if isinstance(data, dict):
+        data = data.get("faq", [data]) if "question" not in data else [data]
+    return [r for r in data if isinstance(r, dict)] if isinstance(data, list) else []
+
+
+def load_faq(path: str) -> List[FaqEntry]:
+    """Answered entries of the FAQ file at ``path`` (missing file: none)."""
+    fp = Path(path)
+    if not fp.is_file():
+        return []
+    entries: List[FaqEntry] = []
+    skipped = 0
+    for record in _records(fp.read_text(encoding="utf-8")):
+        question = str(record.get("question") or "").strip()
+        answer = str(record.get("answer") or "").strip()
+        if not question or not answer:
+            skipped += 1
+            continue
+        sources = record.get("sources") or [fp.name]
+        variants = [str(v) for v in record.get("variants") or [] if str(v).strip()]
+        entries.append(FaqEntry(question, answer, [str(s) for s in sources], variants))
+    LOGGER.info("FAQ: %d entries loaded from %s (%d without answer skipped)", len(entries), path, skipped)
+    return entries
+
+
+def _vectorizer() -> "TfidfVectorizer":
+    # imported on first use: an empty FAQ never loads sklearn
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    return TfidfVectorizer(analyzer="char_wb", ngram_range=(3, 5), preprocessor=normalize_query, sublinear_tf=True)
+
+
+class FaqIndex:
+    """Nearest FAQ question by cosine similarity of character n-gram TF-IDF vectors."""
+
+    def __init__(self, entries: List[FaqEntry], min_similarity: float = MIN_SIMILARITY) -> None:
+        self.entries = entries
+        self.min_similarity = min_similarity
+        self._owner: List[int] = []
+        questions: List[str] = []
+        for i, entry in enumerate(entries):
+            for question in (entry.question, *entry.variants):
+                questions.append(question)
+                self._owner.append(i)
+        self._vectorizer = _vectorizer() if questions else None
+        self._matrix = self._vectorizer.fit_transform(questions) if questions else None
+
+    @classmethod
+    def load(cls, path: str, min_similarity: float = MIN_SIMILARITY) -> "FaqIndex":
+        return cls(load_faq(path), min_similarity)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def match(self, query: str) -> Optional[Tuple[FaqEntry, float]]:
+        """Best entry for ``query`` if its similarity reaches ``min_similarity``."""
+        if self._matrix is None or not normalize_query(query):
+            return None
+        scores = (self._matrix @ self._vectorizer.transform([query]).T).toarray().ravel()
+        best = int(np.argmax(scores))
+        if scores[best] < self.min_similarity:
+            metrics.CACHE_REQUESTS.inc(cache="faq", result="miss")
+            return None
+        metrics.CACHE_REQUESTS.inc(cache="faq", result="hit")
+        return self.entries[self._owner[best]], float(scores[best])
+
+
+# -- offline candidate mining ---------------------------------------------
+
+
+def read_questions(paths: Iterable[Path]) -> List[str]:
+    """Every question (``query`` or ``title`` field) of JSONL request logs, repeats included."""
+    questions: List[str] = []
+    for path in paths:
+        if not path.is_file():
+            continue
+        for line in path.read_text(encoding="utf-8").splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            text = (record.get("query") or record.get("title") or "").strip() if isinstance(record, dict) else ""
+            if text:
+                questions.append(text)
+    return questions
+
+
+def mine_candidates(
+    questions: List[str],
+    existing: Optional[FaqIndex] = None,
+    *,
+    min_count: int = 3,
+    similarity: float = CLUSTER_SIMILARITY,
+    max_variants: int = 5,
+) -> List[Dict]:
+    """Groups of near-duplicate ``questions`` asked at least ``min_count`` times.
+
+    Questions are grouped greedily, most frequent wording first, by cosine
+    similarity of their character n-gram vectors. Groups already answered
+    by ``existing`` are left out. Candidates come back most asked first, in
+    the FAQ file format with an empty ``answer``.
+    """
+    counts = Counter(questions)
+    by_form: Dict[str, Counter] = {}
+    for question, n in counts.items():
+        form = normalize_query(question)
+        if form:
+            by_form.setdefault(form, Counter())[question] += n
+    forms = sorted(by_form, key=lambda f: (-sum(by_form[f].values()), f))
+    if not forms:
+        return []
+
+    matrix = _vectorizer().fit_transform(forms)
+    leader = np.full(len(forms), -1)
+    for i in range(len(forms)):
+        if leader[i] >= 0:
+            continue
+        leader[i] = i
+        sims = (matrix[i + 1:] @ matrix[i].T).toarray().ravel()
+        free = np.flatnonzero((sims >= similarity) & (leader[i + 1:] < 0)) + i + 1
+        leader[free] = i
+
+    candidates: List[Dict] = []
+    for head in np.unique(leader).tolist():
+        wordings: Counter = Counter()
+        for member in np.flatnonzero(leader == head).tolist():
+            wordings.update(by_form[forms[member]])
+        total = sum(wordings.values())
+        if total < min_count:
+            continue
+        ranked = [q for q, _ in wordings.most_common()]
+        if existing is not None and any(existing.match(q) for q in ranked[:max_variants]):
+            continue
+        candidates.append(
+            {"question": ranked[0], "answer": "", "count": total, "variants": ranked[1:max_variants + 1]}
+        )
+    candidates.sort(key=lambda c: (-c["count"], c["question"]))
+    return candidates
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Mine FAQ candidates from request logs.")
+    parser.add_argument("--requests", nargs="+", default=["docs/requests.log"], help="JSONL request logs")
+    parser.add_argument("--faq", default="docs/faq.json", help="existing FAQ; answered questions are skipped")
+    parser.add_argument("--min-count", type=int, default=3)
+    parser.add_argument("--similarity", type=float, default=CLUSTER_SIMILARITY)
+    parser.add_argument("--output", help="write candidates as JSONL here instead of stdout")
+    args = parser.parse_args(argv)
+
+    candidates = mine_candidates(
+        read_questions(Path(p) for p in args.requests),
+        FaqIndex.load(args.faq),
+        min_count=args.min_count,
+        similarity=args.similarity,
+    )
+    lines = "".join(json.dumps(c, ensure_ascii=False) + "\n" for c in candidates)
+    if args.output:
+        Path(args.output).write_text(lines, encoding="utf-8")
+    else:
+        sys.stdout.write(lines)
+    print(f"{len(candidates)} candidates", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""Local SQLite store of n8n incidents for filtered diagnosis queries.
+
+Every payload fetched by :class:`src.services.incidents.IncidentFeed` is
+ingested incrementally: incidents and their error signatures are upserted by
+workflow, and executions are inserted once (keyed on workflow, timestamp and
+execution URL), so history outlives the webhook's own window until
+``retention_hours`` prunes it. Timestamps are stored as UTC ISO-8601 strings
+(``2024-05-01T12:00:00Z``), which sort and compare correctly as text.
+
+A signature is the pair (last executed node, error message), identified by a
+short hash so the same failure groups across workflows and executions.
+Indexes on workflow, timestamp and signature keep the queries behind the
+diagnoser tools (:meth:`IncidentStore.workflow`, :meth:`~IncidentStore.since`,
+:meth:`~IncidentStore.top_signatures`) cheap as incident volume grows.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.services.incidents import incidents_of
+
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS incidents ("
+    " workflow TEXT PRIMARY KEY, count INTEGER NOT NULL, first_ts TEXT, last_ts TEXT,"
+    " responsibles TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS incidents_last_ts ON incidents (last_ts)",
+    "CREATE TABLE IF NOT EXISTS signatures ("
+    " workflow TEXT NOT NULL, signature TEXT NOT NULL, last_node TEXT NOT NULL,"
+    " error_message TEXT NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (workflow, signature))",
+    "CREATE INDEX IF NOT EXISTS signatures_signature ON signatures (signature)",
+    "CREATE TABLE IF NOT EXISTS executions ("
+    " workflow TEXT NOT NULL, ts TEXT NOT NULL, last_node TEXT NOT NULL, error_message TEXT NOT NULL,"
+    " signature TEXT NOT NULL, execution_url TEXT NOT NULL, UNIQUE (workflow, ts, execution_url))",
+    "CREATE INDEX IF NOT EXISTS executions_ts ON executions (ts)",
+    "CREATE INDEX IF NOT EXISTS executions_workflow_ts ON executions (workflow, ts)",
+    "CREATE INDEX IF NOT EXISTS executions_signature_ts ON executions (signature, ts)",
+)
+
+
+def signature_id(last_node: str, error_message: str) -> str:
+    return hashlib.sha1(f"{last_node}\n{error_message}".encode("utf-8")).hexdigest()[:10]
+
+
+def utc_ts(value: Any) -> Optional[str]:
+    """``value`` as ``YYYY-MM-DDTHH:MM:SSZ`` (naive times are taken as UTC); unparseable text is kept."""
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime):
+        moment = value
+    else:
+        try:
+            moment = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return str(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _int(value: Any, default: int = 0) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class IncidentStore:
+    def __init__(self, db_path: str = ":memory:", retention_hours: float = 168.0) -> None:
+        self.retention_hours = retention_hours
+        self._lock = threading.Lock()
+        if db_path != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        # every worker ingests into the same file
+        self._db = sqlite3.connect(db_path, timeout=5.0, check_same_thread=False)
+        if db_path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.row_factory = sqlite3.Row
+        for statement in SCHEMA:
+            self._db.execute(statement)
+        self._db.commit()
+
+    # -- ingest -----------------------------------------------------------
+
+    def ingest(self, payload: Any, now: Optional[datetime] = None) -> int:
+        """Merge a webhook payload into the store; returns the number of new executions."""
+        cutoff = self._cutoff(self.retention_hours, now) if self.retention_hours > 0 else ""
+        incidents, signatures, executions = [], [], []
+        for incident in incidents_of(payload):
+            workflow = str(incident.get("workflow", ""))
+            incidents.append((
+                workflow,
+                _int(incident.get("count")),
+                utc_ts(incident.get("first_ts")),
+                utc_ts(incident.get("last_ts")),
+                json.dumps(incident.get("responsibles") or [], ensure_ascii=False),
+            ))
+            for sig in incident.get("error_signatures") or []:
+                if isinstance(sig, dict):
+                    node, message = str(sig.get("last_node", "")), str(sig.get("error_message", ""))
+                    signatures.append((workflow, signature_id(node, message), node, message, _int(sig.get("count"), 1)))
+            for execution in incident.get("executions") or []:
+                ts = utc_ts(execution.get("ts")) if isinstance(execution, dict) else None
+                if ts is None or ts < cutoff:
+                    continue
+                node, message = str(execution.get("last_node", "")), str(execution.get("error_message", ""))
+                executions.append(
+                    (workflow, ts, node, message, signature_id(node, message), str(execution.get("execution_url", "")))
+                )
+
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT INTO incidents VALUES (?, ?, ?, ?, ?) ON CONFLICT (workflow) DO UPDATE SET"
+                " count = excluded.count, responsibles = excluded.responsibles,"
+                " first_ts = COALESCE(MIN(incidents.first_ts, excluded.first_ts), incidents.first_ts, excluded.first_ts),"
+                " last_ts = COALESCE(MAX(incidents.last_ts, excluded.last_ts), incidents.last_ts, excluded.last_ts)",
+                incidents,
+            )
+            self._db.executemany(
+                "INSERT INTO signatures VALUES (?, ?, ?, ?, ?) ON CONFLICT (workflow, signature) DO UPDATE SET"
+                " count = excluded.count",
+                signatures,
+            )
+            before = self._db.total_changes
+            self._db.executemany("INSERT OR IGNORE INTO executions VALUES (?, ?, ?, ?, ?, ?)", executions)
+            added = self._db.total_changes - before
+            if cutoff:
+                self._db.execute("DELETE FROM executions WHERE ts < ?", (cutoff,))
+        return added
+
+    # -- queries ----------------------------------------------------------
+
+    def workflow(self, name: str, limit: int = 10) -> List[Dict]:
+        """Incidents whose workflow name contains ``name`` (case-insensitive), with signatures and latest executions."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM incidents WHERE workflow LIKE ? ESCAPE '\\' ORDER BY count DESC LIMIT ?",
+                (f"%{_like(name)}%", limit),
+            ).fetchall()
+            result = []
+            for row in rows:
+                signatures = self._db.execute(
+                    "SELECT signature, last_node, error_message, count FROM signatures"
+                    " WHERE workflow = ? ORDER BY count DESC",
+                    (row["workflow"],),
+                ).fetchall()
+                executions = self._db.execute(
+                    "SELECT ts, last_node, error_message, signature, execution_url FROM executions"
+                    " WHERE workflow = ? ORDER BY ts DESC LIMIT ?",
+                    (row["workflow"], limit),
+                ).fetchall()
+                result.append({
+                    **dict(row),
+                    "responsibles": json.loads(row["responsibles"]),
+                    "error_signatures": [dict(s) for s in signatures],
+                    "executions": [dict(e) for e in executions],
+                })
+        return result
+
+    def since(self, hours: float, workflow: str = "", limit: int = 20, now: Optional[datetime] = None) -> Dict:
+        """Executions of the last ``hours`` (optionally of one workflow): per-workflow counts and the latest rows."""
+        cutoff = self._cutoff(hours, now)
+        where, args = "ts >= ?", [cutoff]
+        if workflow:
+            where += " AND workflow LIKE ? ESCAPE '\\'"
+            args.append(f"%{_like(workflow)}%")
+        with self._lock:
+            counts = self._db.execute(
+                f"SELECT workflow, COUNT(*) AS count, MIN(ts) AS first_ts, MAX(ts) AS last_ts FROM executions"
+                f" WHERE {where} GROUP BY workflow ORDER BY count DESC",
+                args,
+            ).fetchall()
+            latest = self._db.execute(
+                f"SELECT workflow, ts, last_node, error_message, signature, execution_url FROM executions"
+                f" WHERE {where} ORDER BY ts DESC LIMIT ?",
+                [*args, limit],
+            ).fetchall()
+        return {
+            "since": cutoff,
+            "executions": sum(r["count"] for r in counts),
+            "workflows": [dict(r) for r in counts],
+            "latest": [dict(r) for r in latest],
+        }
+
+    def top_signatures(self, n: int = 10, hours: float = 0, now: Optional[datetime] = None) -> List[Dict]:
+        """Most frequent error signatures across workflows, overall or within the last ``hours``."""
+        with self._lock:
+            if hours > 0:
+                rows = self._db.execute(
+                    "SELECT signature, last_node, error_message, COUNT(*) AS count,"
+                    " json_group_array(DISTINCT workflow) AS workflows, MAX(ts) AS last_ts FROM executions"
+                    " WHERE ts >= ? GROUP BY signature ORDER BY count DESC LIMIT ?",
+                    (self._cutoff(hours, now), n),
+                ).fetchall()
+            else:
+                rows = self._db.execute(
+                    "SELECT signature, last_node, error_message, SUM(count) AS count,"
+                    " json_group_array(DISTINCT workflow) AS workflows FROM signatures"
+                    " GROUP BY signature ORDER BY count DESC LIMIT ?",
+                    (n,),
+                ).fetchall()
+        return [{**dict(r), "workflows": json.loads(r["workflows"])} for r in rows]
+
+    def close(self) -> None:
+        self._db.close()
+
+    @staticmethod
+    def _cutoff(hours: float, now: Optional[datetime]) -> str:
+        return utc_ts((now or datetime.now(timezone.utc)) - timedelta(hours=hours))
+
+
+def _like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
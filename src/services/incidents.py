@@ -0,0 +1,235 @@
+"""n8n incident feed: cached, coalesced fetches and a compact digest.
+
+The n8n webhook returns every open incident with all its executions; pushed
+verbatim into the model context that is slow and expensive, and during an
+outage many concurrent diagnoses would fetch the very same payload.
+:class:`IncidentFeed` keeps the last digest for ``ttl`` seconds, lets
+concurrent callers share one in-flight request (single-flight, for both the
+threaded and the async path), goes through the shared pooled HTTP clients,
+and serves the last good digest (marked ``stale``) if a refresh fails.
+Each payload actually fetched is also handed to ``on_payload`` (e.g.
+:meth:`src.services.incident_store.IncidentStore.ingest`).
+
+:func:`digest` reduces the payload to what a diagnosis needs: top workflows
+by ``count``, error signatures grouped across workflows, and the latest
+executions.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from src.core import metrics
+from src.core.http import get_async_client, get_client
+
+
+LOGGER = logging.getLogger(__name__)
+
+TOP_WORKFLOWS = 5
+TOP_SIGNATURES = 8
+LATEST_EXECUTIONS = 5
+MAX_RAW_CHARS = 4000
+
+
+def incidents_of(payload: Any) -> List[Dict]:
+    """The ``incidents`` list of a webhook payload (bare, wrapped or a list of wrappers)."""
+    if isinstance(payload, dict):
+        items = payload.get("incidents", [])
+        return [i for i in items if isinstance(i, dict)] if isinstance(items, list) else []
+    if isinstance(payload, list):
+        if all(isinstance(p, dict) and "incidents" in p for p in payload):
+            return [i for p in payload for i in incidents_of(p)]
+        return [i for i in payload if isinstance(i, dict)]
+    return []
+
+
+def _count(value: Any) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def digest(
+    payload: Any,
+    *,
+    top_workflows: int = TOP_WORKFLOWS,
+    top_signatures: int = TOP_SIGNATURES,
+    latest_executions: int = LATEST_EXECUTIONS,
+) -> Dict:
+    incidents = incidents_of(payload)
+    workflows = sorted(incidents, key=lambda i: (-_count(i.get("count")), str(i.get("workflow", ""))))
+
+    signatures: Dict[Tuple[str, str], Dict] = {}
+    executions: List[Dict] = []
+    for incident in incidents:
+        workflow = incident.get("workflow", "")
+        for sig in incident.get("error_signatures") or []:
+            if not isinstance(sig, dict):
+                continue
+            key = (str(sig.get("last_node", "")), str(sig.get("error_message", "")))
+            entry = signatures.setdefault(
+                key, {"last_node": key[0], "error_message": key[1], "count": 0, "workflows": []}
+            )
+            entry["count"] += _count(sig.get("count", 1))
+            if workflow not in entry["workflows"]:
+                entry["workflows"].append(workflow)
+        for execution in incident.get("executions") or []:
+            if isinstance(execution, dict):
+                executions.append({"workflow": workflow, **execution})
+
+    executions.sort(key=lambda e: str(e.get("ts", "")), reverse=True)
+    first = [str(i["first_ts"]) for i in incidents if i.get("first_ts")]
+    last = [str(i["last_ts"]) for i in incidents if i.get("last_ts")]
+    return {
+        "incidents": len(incidents),
+        "occurrences": sum(_count(i.get("count")) for i in incidents),
+        "window": {"first_ts": min(first, default=None), "last_ts": max(last, default=None)},
+        "top_workflows": [
+            {k: i.get(k) for k in ("workflow", "count", "first_ts", "last_ts", "responsibles")}
+            for i in workflows[:top_workflows]
+        ],
+        "error_signatures": sorted(signatures.values(), key=lambda s: -s["count"])[:top_signatures],
+        "latest_executions": [
+            {k: e.get(k) for k in ("workflow", "ts", "last_node", "error_message", "execution_url")}
+            for e in executions[:latest_executions]
+        ],
+    }
+
+
+def _dumps(value: Dict) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class _Flight:
+    __slots__ = ("done", "result")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = ""
+
+
+class IncidentFeed:
+    """TTL-cached, single-flight access to the n8n incidents webhook."""
+
+    def __init__(
+        self, url: Optional[str], ttl: float = 30.0, on_payload: Optional[Callable[[Any], Any]] = None
+    ) -> None:
+        self.url = url
+        self.ttl = ttl
+        self.on_payload = on_payload
+        self._lock = threading.Lock()
+        self._value: Optional[str] = None
+        self._fetched_at = 0.0
+        self._payload: Any = None
+        self._flight: Optional[_Flight] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # -- cache ------------------------------------------------------------
+
+    def _fresh(self) -> Optional[str]:
+        if self._value is not None and time.monotonic() - self._fetched_at < self.ttl:
+            metrics.CACHE_REQUESTS.inc(cache="n8n", result="hit")
+            return self._value
+        return None
+
+    def _settle(self, response: Optional[httpx.Response], error: Optional[Exception]) -> Tuple[str, Any]:
+        """``(tool output, freshly fetched payload or None)`` for one webhook call."""
+        if error is None:
+            try:
+                response.raise_for_status()
+            except httpx.HTTPStatusError as exc:
+                error = exc
+        if error is not None:
+            metrics.TOOL_ERRORS.inc(tool="n8n_webhook")
+            if isinstance(self._payload, (dict, list)):
+                return _dumps({**digest(self._payload), "stale": True}), None
+            return (self._value if self._value is not None else f"Erro ao buscar logs no webhook n8n: {error}"), None
+        try:
+            self._payload = response.json()
+            value = _dumps(digest(self._payload))
+        except ValueError:
+            self._payload = None
+            value = response.text[:MAX_RAW_CHARS]
+        self._value, self._fetched_at = value, time.monotonic()
+        return value, self._payload
+
+    def _deliver(self, payload: Any) -> None:
+        if self.on_payload is None:
+            return
+        try:
+            self.on_payload(payload)
+        except Exception:
+            LOGGER.exception("n8n incident feed: on_payload failed")
+
+    def payload(self) -> Any:
+        """Parsed body of the last successful fetch (``None`` before the first)."""
+        return self._payload
+
+    # -- fetch ------------------------------------------------------------
+
+    def fetch(self) -> str:
+        if not self.url:
+            return "n8n webhook URL não configurada."
+        cached = self._fresh()
+        if cached is not None:
+            return cached
+        with self._lock:
+            flight = self._flight
+            leader = flight is None
+            if leader:
+                flight = self._flight = _Flight()
+        if not leader:
+            metrics.CACHE_REQUESTS.inc(cache="n8n", result="coalesced")
+            flight.done.wait()
+            return flight.result
+        metrics.CACHE_REQUESTS.inc(cache="n8n", result="miss")
+        try:
+            response, error = None, None
+            try:
+                with metrics.span("tool.n8n_webhook"):
+                    response = get_client().get(self.url)
+            except httpx.HTTPError as exc:
+                error = exc
+            flight.result, payload = self._settle(response, error)
+            if payload is not None:
+                self._deliver(payload)
+        finally:
+            with self._lock:
+                self._flight = None
+            flight.done.set()
+        return flight.result
+
+    async def afetch(self) -> str:
+        if not self.url:
+            return "n8n webhook URL não configurada."
+        cached = self._fresh()
+        if cached is not None:
+            return cached
+        loop = asyncio.get_running_loop()
+        task = self._task
+        if task is not None and not task.done() and task.get_loop() is loop:
+            metrics.CACHE_REQUESTS.inc(cache="n8n", result="coalesced")
+        else:
+            metrics.CACHE_REQUESTS.inc(cache="n8n", result="miss")
+            task = self._task = loop.create_task(self._aload())
+        # shield: one cancelled caller must not cancel the shared request
+        return await asyncio.shield(task)
+
+    async def _aload(self) -> str:
+        response, error = None, None
+        try:
+            with metrics.span("tool.n8n_webhook"):
+                response = await get_async_client().get(self.url)
+        except httpx.HTTPError as exc:
+            error = exc
+        value, payload = self._settle(response, error)
+        if payload is not None and self.on_payload is not None:
+            await asyncio.to_thread(self._deliver, payload)
+        return value
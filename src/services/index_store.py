@@ -0,0 +1,247 @@
+"""Versioned, memory-mapped on-disk layout for retrieval indexes.
+
+An index directory holds one sub-directory per published generation plus a
+``CURRENT`` pointer file::
+
+    .local_index/
+        CURRENT                 # name of the live generation, e.g. "gen-..."
+        gen-<id>/
+            manifest.json       # format version, counts and per-file manifest
+            <name>.npy          # numeric arrays, opened with mmap_mode="r"
+            <name>.bin          # utf-8 blobs of string tables
+            <name>_offsets.npy  # start offsets into the blob (len + 1)
+
+Arrays are opened read-only with ``np.load(..., mmap_mode="r")`` so every
+worker process on a host shares the same page-cached copy instead of holding
+a private unpickled one.
+
+Writers serialise on :func:`lock` (an ``flock`` on the index directory):
+whoever gets it second re-reads ``CURRENT`` and reuses what the first one
+published instead of building its own generation.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not POSIX; writers are not serialised
+    fcntl = None
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+FORMAT_VERSION = 1
+CURRENT = "CURRENT"
+MANIFEST = "manifest.json"
+KEEP_GENERATIONS = 2
+
+
+class StringTable:
+    """Read-only table of utf-8 strings addressed by row.
+
+    Strings are concatenated into a single blob with an ``offsets`` array of
+    ``len + 1`` boundaries, so reading row ``i`` only touches its own bytes.
+    When the strings were written in :func:`sort_terms` order, :meth:`get`
+    maps a string back to its row by binary search, which lets a sorted
+    vocabulary stand in for a ``dict`` without materialising it in every
+    worker.
+    """
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray) -> None:
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return max(int(self._offsets.shape[0]) - 1, 0)
+
+    def _bytes(self, i: int) -> bytes:
+        return self._blob[int(self._offsets[i]):int(self._offsets[i + 1])].tobytes()
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._bytes(i).decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def get(self, key: str, default: Optional[int] = None) -> Optional[int]:
+        """Row of ``key`` in a sorted table, or ``default``."""
+        needle = key.encode("utf-8")
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(mid) < needle:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self) and self._bytes(lo) == needle:
+            return lo
+        return default
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    @property
+    def nbytes(self) -> int:
+        return int(self._blob.nbytes + self._offsets.nbytes)
+
+    def to_dict(self) -> Dict[str, int]:
+        return {s: i for i, s in enumerate(self)}
+
+
+def sort_terms(terms: Iterable[str]) -> List[str]:
+    """Order used by sorted string tables (utf-8 byte order)."""
+    return sorted(terms, key=lambda t: t.encode("utf-8"))
+
+
+def write_string_table(gen_dir: Path, name: str, strings: List[str]) -> None:
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    with (gen_dir / f"{name}.bin").open("wb") as f:
+        for b in encoded:
+            f.write(b)
+    np.save(gen_dir / f"{name}_offsets.npy", offsets)
+
+
+def open_string_table(gen_dir: Path, name: str) -> StringTable:
+    blob_path = gen_dir / f"{name}.bin"
+    if blob_path.stat().st_size:
+        blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+    else:
+        blob = np.zeros(0, dtype=np.uint8)
+    return StringTable(blob, load_array(gen_dir, f"{name}_offsets"))
+
+
+def save_array(gen_dir: Path, name: str, array: np.ndarray) -> None:
+    np.save(gen_dir / f"{name}.npy", np.ascontiguousarray(array))
+
+
+def load_array(gen_dir: Path, name: str) -> np.ndarray:
+    return np.load(gen_dir / f"{name}.npy", mmap_mode="r")
+
+
+def current_generation(index_dir: Path) -> Optional[Path]:
+    """Directory of the live generation, or ``None`` if nothing was published."""
+    pointer = index_dir / CURRENT
+    if not pointer.is_file():
+        return None
+    gen_dir = index_dir / pointer.read_text(encoding="utf-8").strip()
+    if not (gen_dir / MANIFEST).is_file():
+        return None
+    return gen_dir
+
+
+def read_manifest(gen_dir: Path) -> Dict:
+    with (gen_dir / MANIFEST).open("r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported index format version: {manifest.get('version')}")
+    return manifest
+
+
+@contextmanager
+def lock(index_dir: Path) -> Iterator[None]:
+    """Hold the exclusive writer lock of ``index_dir`` (created if missing).
+
+    Every process (and thread) that builds or publishes into ``index_dir``
+    takes it, so only one writer is active at a time; readers never need
+    it. Not reentrant: :func:`publish` expects the caller to hold it.
+    """
+    if index_dir.is_file():
+        # Pre-memmap indexes were a single pickle at the same path.
+        LOGGER.info("Removing legacy index file %s", index_dir)
+        index_dir.unlink()
+    index_dir.mkdir(parents=True, exist_ok=True)
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(index_dir, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)  # releases the lock
+
+
+def publish(index_dir: Path, manifest: Dict, write: Callable[[Path], None]) -> Path:
+    """Write a new generation with ``write`` and atomically make it current.
+
+    ``write`` receives the (empty) generation directory and fills in the
+    arrays; the manifest is written last and ``CURRENT`` is swapped with
+    ``os.replace`` so readers never observe a partial generation. Call with
+    :func:`lock` held.
+    """
+    index_dir.mkdir(parents=True, exist_ok=True)
+
+    name = f"gen-{time.time_ns():x}-{os.getpid()}"
+    gen_dir = index_dir / name
+    gen_dir.mkdir()
+    write(gen_dir)
+    with (gen_dir / MANIFEST).open("w", encoding="utf-8") as f:
+        json.dump({**manifest, "version": FORMAT_VERSION, "generation": name}, f)
+
+    tmp = index_dir / f"{CURRENT}.tmp{os.getpid()}"
+    tmp.write_text(name, encoding="utf-8")
+    os.replace(tmp, index_dir / CURRENT)
+    _prune(index_dir, keep=name)
+    return gen_dir
+
+
+def rewrite_manifest(gen_dir: Path, manifest: Dict) -> None:
+    """Atomically replace the manifest of an existing generation (metadata only)."""
+    current = read_manifest(gen_dir)
+    tmp = gen_dir / f"{MANIFEST}.tmp{os.getpid()}"
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump({**manifest, "version": current["version"], "generation": current["generation"]}, f)
+    os.replace(tmp, gen_dir / MANIFEST)
+
+
+def _published_at(gen_dir: Path) -> Optional[int]:
+    try:
+        return (gen_dir / MANIFEST).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _prune(index_dir: Path, keep: str) -> None:
+    """Drop fully published generations older than ``keep`` (the new ``CURRENT``).
+
+    The newest of them are kept around: other workers may still be opening
+    them. Already-mapped files stay valid after unlink on POSIX. Directories
+    without a manifest were left by a writer that died mid-build (the caller
+    holds :func:`lock`, so nobody else is writing one) and are removed too.
+    """
+    current = _published_at(index_dir / keep)
+    if current is None:
+        return
+    published = []
+    for p in index_dir.iterdir():
+        if p.is_dir() and p.name.startswith("gen-") and p.name != keep:
+            at = _published_at(p)
+            if at is None:
+                if fcntl is not None:  # without the lock it may still be in progress
+                    shutil.rmtree(p, ignore_errors=True)
+            elif at <= current:
+                published.append((at, p))
+    published.sort()
+    for _, old in published[: max(len(published) - (KEEP_GENERATIONS - 1), 0)]:
+        shutil.rmtree(old, ignore_errors=True)
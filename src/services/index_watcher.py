@@ -0,0 +1,253 @@
+"""Hot reload of the local index when ``docs_dir`` changes.
+
+:class:`LiveIndex` holds the current index and swaps in a new one with a
+single reference assignment: requests that already resolved the old index
+keep searching it (its memory maps stay valid even after the generation is
+pruned), new requests see the new one.
+
+:class:`DocsWatcher` is a background thread that waits for markdown changes
+under ``docs_dir`` -- through inotify on Linux, or by polling mtimes/sizes
+elsewhere -- debounces bursts of events (editors, ``git pull``) and then
+calls :meth:`LiveIndex.refresh`, which runs the usual incremental
+``build_or_load_index`` off the request path.
+
+Every API worker runs its own watcher, so one edit triggers a refresh in
+each of them. The rebuild itself happens under the index directory lock
+(:func:`src.services.index_store.lock`): the first worker to get it
+publishes the new generation, and the others then find ``CURRENT`` up to
+date and just map it.
+"""
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class LiveIndex:
+    """Current index plus build bookkeeping; ``build`` returns a fresh index."""
+
+    def __init__(self, build: Callable[[], Dict]) -> None:
+        self._build = build
+        self._lock = threading.Lock()
+        self._index: Optional[Dict] = None
+        self.build_seconds = 0.0
+        self.built_at: Optional[float] = None
+        self.reloads = 0
+
+    def get(self) -> Dict:
+        index = self._index
+        if index is None:
+            with self._lock:
+                if self._index is None:
+                    self._reload()
+                index = self._index
+        return index
+
+    def refresh(self) -> bool:
+        """Rebuild/update and swap in the result; True if the generation changed."""
+        with self._lock:
+            return self._reload()
+
+    def stats(self) -> Dict:
+        index = self._index or {}
+        return {
+            "generation": index.get("generation"),
+            "build_seconds": round(self.build_seconds, 3),
+            "built_at": self.built_at,
+            "reloads": self.reloads,
+        }
+
+    def _reload(self) -> bool:
+        start = time.perf_counter()
+        index = self._build()
+        previous = self._index
+        self._index = index
+        changed = previous is None or previous.get("generation") != index.get("generation")
+        if changed:
+            self.build_seconds = time.perf_counter() - start
+            self.built_at = time.time()
+            if previous is not None:
+                self.reloads += 1
+                LOGGER.info(
+                    "Local index reloaded: generation %s in %.2fs", index.get("generation"), self.build_seconds
+                )
+        return changed
+
+
+# -- change sources ---------------------------------------------------------
+
+_IN_MODIFY = 0x002
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_DELETE_SELF = 0x400
+_IN_MOVE_SELF = 0x800
+_IN_Q_OVERFLOW = 0x4000
+_IN_ISDIR = 0x40000000
+_MASK = (
+    _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO
+    | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF
+)
+_EVENT = struct.Struct("iIII")
+
+
+class _Inotify:
+    """Recursive inotify watch over a directory tree (Linux only)."""
+
+    def __init__(self, root: Path) -> None:
+        self._root = root
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        for dirpath, _, _ in os.walk(root):
+            self._add(dirpath)
+
+    def _add(self, path: str) -> None:
+        if self._libc.inotify_add_watch(self._fd, os.fsencode(path), _MASK) < 0:
+            LOGGER.warning("inotify: cannot watch %s (errno %s)", path, ctypes.get_errno())
+
+    def wait(self, timeout: float) -> bool:
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return False
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        relevant = new_dirs = False
+        pos = 0
+        while pos < len(data):
+            _, mask, _, length = _EVENT.unpack_from(data, pos)
+            name = data[pos + _EVENT.size:pos + _EVENT.size + length].rstrip(b"\0").decode(errors="ignore")
+            pos += _EVENT.size + length
+            if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+                new_dirs = True
+            if mask & (_IN_Q_OVERFLOW | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ISDIR) or name.endswith(".md"):
+                relevant = True
+        if new_dirs:
+            self._rewatch()
+        return relevant
+
+    def _rewatch(self) -> None:
+        # inotify_add_watch on an already watched path just updates its mask,
+        # so re-walking picks up new subdirectories without duplicates.
+        for dirpath, _, _ in os.walk(self._root):
+            self._add(dirpath)
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class _Poller:
+    """Portable fallback: compare ``(mtime_ns, size)`` of every markdown file."""
+
+    def __init__(self, root: Path, stop: threading.Event) -> None:
+        self._root = root
+        self._stop = stop
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for fp in self._root.glob("**/*.md"):
+            try:
+                st = fp.stat()
+            except FileNotFoundError:
+                continue
+            snapshot[str(fp)] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def wait(self, timeout: float) -> bool:
+        if self._stop.wait(timeout):
+            return False
+        snapshot = self._scan()
+        changed = snapshot != self._snapshot
+        self._snapshot = snapshot
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class DocsWatcher:
+    """Background thread calling ``on_change`` after markdown changes settle.
+
+    ``debounce`` is the quiet period required after the last event before
+    ``on_change`` runs; ``poll_interval`` only applies to the polling
+    fallback, used when inotify is unavailable or ``use_inotify`` is False.
+    """
+
+    def __init__(
+        self,
+        docs_dir: str,
+        on_change: Callable[[], object],
+        *,
+        debounce: float = 1.0,
+        poll_interval: float = 2.0,
+        use_inotify: bool = True,
+    ) -> None:
+        self.docs_dir = Path(docs_dir)
+        self.on_change = on_change
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.mode: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._source = None
+
+    def start(self) -> None:
+        if self._thread is not None or not self.docs_dir.is_dir():
+            return
+        self._source = self._open_source()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="docs-watcher", daemon=True)
+        self._thread.start()
+        LOGGER.info("Watching %s for changes (%s)", self.docs_dir, self.mode)
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._source.close()
+
+    def _open_source(self):
+        if self.use_inotify and sys.platform.startswith("linux"):
+            try:
+                source = _Inotify(self.docs_dir)
+                self.mode = "inotify"
+                return source
+            except (OSError, AttributeError) as exc:
+                LOGGER.info("inotify unavailable (%s), polling instead", exc)
+        self.mode = "poll"
+        return _Poller(self.docs_dir, self._stop)
+
+    def _run(self) -> None:
+        idle = 0.5 if self.mode == "inotify" else self.poll_interval
+        while not self._stop.is_set():
+            if not self._source.wait(idle):
+                continue
+            # debounce: wait for a quiet period before rebuilding
+            while not self._stop.is_set() and self._source.wait(self.debounce):
+                pass
+            if self._stop.is_set():
+                return
+            try:
+                self.on_change()
+            except Exception:
+                LOGGER.exception("Index reload failed; keeping the current generation")
@@ -0,0 +1,193 @@
+"""Retrieval-result cache in front of ``Retriever.search_many``.
+
+Popular questions repeat, and each repeat would otherwise vectorize the
+query and run the similarity product again. Results are keyed on the
+backend, the shard and its index generation, ``k``, ``min_score`` and the
+query with case and whitespace folded (the only normalization every
+backend's analyzer is insensitive to, so a hit returns exactly what a
+search would). Lookups go through:
+
+1. an in-process LRU;
+2. the optional SQLite tier, shared by every worker on the host (WAL mode;
+   hits are promoted to memory).
+
+Keys embed the generation, so a rebuilt index can never be served old
+results (indexes without a generation are not cached); when a shard's
+generation changes, its older entries are dropped from both tiers. Outcomes
+are counted in ``docbot_cache_requests_total`` with ``cache="retrieval"``
+(memory) and ``cache="retrieval_shared"`` (SQLite).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Dict, List, Optional, Tuple
+
+from src.core import metrics
+from src.services.retriever_local import Passage
+
+
+LOGGER = logging.getLogger(__name__)
+
+# Trim the shared tier back to ``db_max_entries`` every this many writes.
+PRUNE_EVERY = 256
+
+
+def fold_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class RetrievalCache:
+    """Two-tier cache of ranked passages; ``max_entries=0`` disables it."""
+
+    def __init__(self, max_entries: int = 1024, db_path: Optional[str] = None, db_max_entries: int = 100_000) -> None:
+        self.max_entries = max_entries
+        self.db_max_entries = db_max_entries
+        self._entries: "OrderedDict[str, Tuple[str, str, List[Passage]]]" = OrderedDict()
+        self._generations: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path and max_entries > 0:
+            self._db = sqlite3.connect(db_path, timeout=1.0, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS retrievals ("
+                " key TEXT PRIMARY KEY, shard TEXT NOT NULL, generation TEXT NOT NULL,"
+                " passages TEXT NOT NULL, created REAL NOT NULL DEFAULT (julianday('now')))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS retrievals_shard ON retrievals (shard, generation)")
+            self._db.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    # -- public API -------------------------------------------------------
+
+    def get_many(
+        self, backend: str, shard: str, index: Dict, queries: List[str], k: int, min_score: float
+    ) -> List[Optional[List[Passage]]]:
+        """Cached results per query (``None`` for misses)."""
+        if not self.enabled or index.get("generation") is None:
+            return [None] * len(queries)
+        generation = str(index.get("generation"))
+        keys = [_key(backend, shard, generation, q, k, min_score) for q in queries]
+        with self._lock:
+            self._sync(shard, generation)
+            found: List[Optional[List[Passage]]] = []
+            for key in keys:
+                passages = self._get(key, shard, generation)
+                if passages is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                found.append(None if passages is None else list(passages))
+        return found
+
+    def put_many(
+        self,
+        backend: str,
+        shard: str,
+        index: Dict,
+        queries: List[str],
+        k: int,
+        min_score: float,
+        results: List[List[Passage]],
+    ) -> None:
+        if not self.enabled or not queries or index.get("generation") is None:
+            return
+        generation = str(index.get("generation"))
+        rows = []
+        with self._lock:
+            self._sync(shard, generation)
+            for query, passages in zip(queries, results):
+                key = _key(backend, shard, generation, query, k, min_score)
+                self._remember(key, shard, generation, list(passages))
+                rows.append((key, shard, generation, json.dumps([asdict(p) for p in passages], ensure_ascii=False)))
+            if self._db is not None:
+                self._write(rows)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    # -- internals --------------------------------------------------------
+
+    def _get(self, key: str, shard: str, generation: str) -> Optional[List[Passage]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            metrics.CACHE_REQUESTS.inc(cache="retrieval", result="hit")
+            return entry[2]
+        metrics.CACHE_REQUESTS.inc(cache="retrieval", result="miss")
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute("SELECT passages FROM retrievals WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as exc:
+            LOGGER.debug("Retrieval cache: shared lookup failed: %s", exc)
+            row = None
+        if row is None:
+            metrics.CACHE_REQUESTS.inc(cache="retrieval_shared", result="miss")
+            return None
+        metrics.CACHE_REQUESTS.inc(cache="retrieval_shared", result="hit")
+        passages = [Passage(**p) for p in json.loads(row[0])]
+        self._remember(key, shard, generation, passages)
+        return passages
+
+    def _remember(self, key: str, shard: str, generation: str, passages: List[Passage]) -> None:
+        self._entries[key] = (shard, generation, passages)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _write(self, rows: List[Tuple[str, str, str, str]]) -> None:
+        try:
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO retrievals (key, shard, generation, passages) VALUES (?, ?, ?, ?)", rows
+                )
+                self._writes += len(rows)
+                if self._writes >= PRUNE_EVERY:
+                    self._writes = 0
+                    self._db.execute(
+                        "DELETE FROM retrievals WHERE key IN"
+                        " (SELECT key FROM retrievals ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                        (self.db_max_entries,),
+                    )
+        except sqlite3.Error as exc:
+            # another worker holds the write lock; the entries stay in memory
+            LOGGER.debug("Retrieval cache: shared write skipped: %s", exc)
+
+    def _sync(self, shard: str, generation: str) -> None:
+        """Drop a shard's entries from older generations once a new one is seen."""
+        previous = self._generations.get(shard)
+        if previous == generation:
+            return
+        self._generations[shard] = generation
+        if previous is None:
+            return
+        stale = [key for key, (owner, gen, _) in self._entries.items() if owner == shard and gen != generation]
+        for key in stale:
+            del self._entries[key]
+        if self._db is not None:
+            try:
+                with self._db:
+                    self._db.execute(
+                        "DELETE FROM retrievals WHERE shard = ? AND generation != ?", (shard, generation)
+                    )
+            except sqlite3.Error as exc:
+                LOGGER.debug("Retrieval cache: shared purge skipped: %s", exc)
+        LOGGER.info("Retrieval cache: shard %s moved to generation %s", shard, generation)
+
+
+def _key(backend: str, shard: str, generation: str, query: str, k: int, min_score: float) -> str:
+    raw = f"{backend}\n{shard}\n{generation}\n{k}\n{min_score!r}\n{fold_query(query)}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
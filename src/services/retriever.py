@@ -0,0 +1,49 @@
+"""Pluggable retriever backends.
+
+A backend is any module (or object) exposing the functions of the
+:class:`Retriever` protocol; :mod:`src.services.retriever_local` (TF-IDF),
+:mod:`src.services.retriever_bm25` (BM25) and
+:mod:`src.services.retriever_hybrid` (TF-IDF fused with dense vectors) all
+satisfy it. The active backend is chosen with ``Settings.retriever_backend``.
+"""
+from __future__ import annotations
+
+import importlib
+from typing import Dict, List, Protocol
+
+from src.services.retriever_local import Compaction, Passage
+
+
+BACKENDS: Dict[str, str] = {
+    "tfidf": "src.services.retriever_local",
+    "bm25": "src.services.retriever_bm25",
+    "hybrid": "src.services.retriever_hybrid",
+}
+
+
+class Retriever(Protocol):
+    def build_or_load_index(
+        self,
+        docs_dir: str,
+        index_path: str = ...,
+        force_rebuild: bool = False,
+        workers: int = 0,
+        compaction: Compaction = ...,
+    ) -> Dict: ...
+
+    def search(self, index: Dict, query: str, k: int = 5, min_score: float = 0.0) -> List[Passage]: ...
+
+    def search_many(self, index: Dict, queries: List[str], k: int = 5, min_score: float = 0.0) -> List[List[Passage]]: ...
+
+    def score_ceiling(self, index: Dict, query: str) -> float: ...
+
+    def stats(self, index: Dict) -> Dict[str, int]: ...
+
+
+def get_retriever(name: str) -> Retriever:
+    """Return the backend registered under ``name``."""
+    try:
+        module = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown retriever backend {name!r}; expected one of {sorted(BACKENDS)}") from None
+    return importlib.import_module(module)  # type: ignore[return-value]
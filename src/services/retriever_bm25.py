@@ -0,0 +1,221 @@
+"""BM25 retriever over a compact inverted index.
+
+The BM25 engine reuses the chunk store of :mod:`src.services.retriever_local`
+(passages, manifest, vocabulary and raw term counts, updated incrementally)
+and derives its own postings from the counts:
+
+* ``doc_ids``  int32   passage row of every posting, grouped by term;
+* ``impacts``  float32 precomputed BM25 contribution of the posting;
+* ``indptr``   postings range of every term;
+* ``max_impact`` float32 upper bound of each term's contribution.
+
+Postings live in ``<index_path>/bm25`` as their own memory-mapped generation
+and are only recomputed (vectorised, no re-tokenisation) when the base index
+generation changes. Queries are evaluated term-at-a-time with MaxScore
+pruning: once the remaining terms cannot lift an unseen passage above the
+current k-th best score, their postings are only probed for the existing
+candidates instead of being scanned.
+"""
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.core import metrics
+from src.services import index_store, retriever_local
+from src.services.retriever_local import Passage
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+K1 = 1.2
+B = 0.75
+SUBDIR = "bm25"
+
+
+def _bm25_postings(counts, df: np.ndarray) -> Dict[str, np.ndarray]:
+    """Impact-scored postings from a (passages x terms) raw count matrix."""
+    n_docs = counts.shape[0]
+    doc_len = np.asarray(counts.sum(axis=1)).ravel().astype(np.float64)
+    avgdl = float(doc_len.mean()) if n_docs else 0.0
+    idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+
+    postings = counts.tocsc()
+    postings.sort_indices()
+    doc_ids = postings.indices.astype(np.int32)
+    tf = postings.data.astype(np.float64)
+    term_of = np.repeat(np.arange(postings.shape[1]), np.diff(postings.indptr))
+    norm = K1 * (1.0 - B + B * doc_len[doc_ids] / avgdl) if avgdl else np.full(tf.shape, K1)
+    impacts = (idf[term_of] * tf * (K1 + 1.0) / (tf + norm)).astype(np.float32)
+
+    max_impact = np.zeros(postings.shape[1], dtype=np.float32)
+    if impacts.size:
+        np.maximum.at(max_impact, term_of, impacts)
+    return {
+        "doc_ids": doc_ids,
+        "impacts": impacts,
+        "indptr": postings.indptr.astype(np.int64),
+        "max_impact": max_impact,
+    }
+
+
+def _open(gen_dir: Path, base: Dict) -> Dict:
+    manifest = index_store.read_manifest(gen_dir)
+    return {
+        **base,
+        "base_generation": manifest["base_generation"],
+        "generation": manifest["generation"],
+        "doc_ids": index_store.load_array(gen_dir, "doc_ids"),
+        "impacts": index_store.load_array(gen_dir, "impacts"),
+        "indptr": index_store.load_array(gen_dir, "indptr"),
+        "max_impact": index_store.load_array(gen_dir, "max_impact"),
+    }
+
+
+def build_or_load_index(
+    docs_dir: str,
+    index_path: str = ".local_index",
+    force_rebuild: bool = False,
+    workers: int = 0,
+    compaction: retriever_local.Compaction = retriever_local.FULL,
+) -> Dict:
+    """Load the BM25 postings, recomputing them when the base index changed."""
+    base = retriever_local.build_or_load_index(
+        docs_dir, index_path, force_rebuild=force_rebuild, workers=workers, compaction=compaction
+    )
+    bm25_dir = Path(index_path) / SUBDIR
+
+    index = None if force_rebuild else _load(bm25_dir, base)
+    if index is not None:
+        return index
+    with index_store.lock(bm25_dir):
+        # another worker may have built them for this base while we waited
+        index = _load(bm25_dir, base)
+        if index is not None:
+            return index
+
+        arrays = _bm25_postings(base["counts"], np.asarray(base["df"], dtype=np.float64))
+
+        def write(target: Path) -> None:
+            for name, array in arrays.items():
+                index_store.save_array(target, name, array)
+
+        gen_dir = index_store.publish(bm25_dir, {"base_generation": base["generation"]}, write)
+    LOGGER.info("BM25 postings built: %s terms, %s postings", arrays["max_impact"].size, arrays["doc_ids"].size)
+    return _open(gen_dir, base)
+
+
+def _load(bm25_dir: Path, base: Dict) -> Optional[Dict]:
+    """The current postings if they were built from ``base``."""
+    gen_dir = index_store.current_generation(bm25_dir) if bm25_dir.is_dir() else None
+    if gen_dir is None:
+        return None
+    try:
+        index = _open(gen_dir, base)
+    except Exception:
+        LOGGER.warning("Failed to load BM25 postings, rebuilding.")
+        return None
+    return index if index["base_generation"] == base["generation"] else None
+
+
+def _query_terms(index: Dict, query: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Vocabulary ids of the query terms and their query-side frequency."""
+    vocabulary = index["vocabulary"]
+    weights: Dict[int, float] = {}
+    for term in retriever_local._analyze(query):
+        col = vocabulary.get(term)
+        if col is not None:
+            weights[col] = weights.get(col, 0.0) + 1.0
+    return np.fromiter(weights.keys(), dtype=np.int64), np.fromiter(weights.values(), dtype=np.float64)
+
+
+def _merge(docs: np.ndarray, scores: np.ndarray, new_docs: np.ndarray, new_scores: np.ndarray):
+    if docs.size == 0:
+        return new_docs.astype(np.int64), new_scores
+    merged, inverse = np.unique(np.concatenate([docs, new_docs]), return_inverse=True)
+    return merged, np.bincount(inverse, weights=np.concatenate([scores, new_scores]), minlength=merged.size)
+
+
+def _kth(scores: np.ndarray, k: int) -> float:
+    if scores.size < k:
+        return 0.0
+    return float(np.partition(scores, scores.size - k)[scores.size - k])
+
+
+def _score(index: Dict, terms: np.ndarray, weights: np.ndarray, k: int, min_score: float = 0.0):
+    """MaxScore term-at-a-time evaluation; returns (rows, scores, postings visited).
+
+    Terms are processed by decreasing upper bound. While an unseen passage
+    could still reach the current threshold, a term's postings are merged
+    into the candidate set in full; afterwards they are only probed (by
+    binary search) for the surviving candidates, and candidates that cannot
+    reach the threshold even with every remaining term are dropped.
+    """
+    doc_ids, impacts, indptr = index["doc_ids"], index["impacts"], index["indptr"]
+    upper = index["max_impact"][terms].astype(np.float64) * weights
+    order = np.argsort(-upper, kind="stable")
+    terms, weights, upper = terms[order], weights[order], upper[order]
+    remaining = np.concatenate([np.cumsum(upper[::-1])[::-1], [0.0]])
+
+    docs = np.zeros(0, dtype=np.int64)
+    scores = np.zeros(0, dtype=np.float64)
+    visited = 0
+    for i, (term, weight) in enumerate(zip(terms.tolist(), weights.tolist())):
+        start, stop = int(indptr[term]), int(indptr[term + 1])
+        postings = doc_ids[start:stop]
+        theta = _kth(scores, k)
+        if (theta > 0 and remaining[i] <= theta) or remaining[i] < min_score:
+            # Non-essential term: no unseen passage can make it into the top k.
+            if docs.size and postings.size and docs.size <= postings.size:
+                pos = np.minimum(np.searchsorted(postings, docs), postings.size - 1)
+                hit = postings[pos] == docs
+                scores[hit] += weight * impacts[start:stop][pos[hit]]
+            elif docs.size and postings.size:
+                # Candidates are sorted (np.unique), so probe the other way round.
+                pos = np.minimum(np.searchsorted(docs, postings), docs.size - 1)
+                hit = docs[pos] == postings
+                scores[pos[hit]] += weight * impacts[start:stop][hit]
+            visited += min(docs.size, postings.size)
+        else:
+            docs, scores = _merge(docs, scores, postings, weight * impacts[start:stop].astype(np.float64))
+            visited += postings.size
+        bound = max(_kth(scores, k), min_score)
+        if bound > 0:
+            alive = scores + remaining[i + 1] >= bound - 1e-9
+            docs, scores = docs[alive], scores[alive]
+    return docs, scores, visited
+
+
+def search(index: Dict, query: str, k: int = 5, min_score: float = 0.0) -> List[Passage]:
+    """Top ``k`` passages for ``query`` by BM25; ``min_score`` is in BM25 units."""
+    if not index or index.get("doc_ids") is None or index.get("chunks", 0) == 0 or k <= 0:
+        return []
+    with metrics.span("retrieval.vectorize", backend="bm25"):
+        terms, weights = _query_terms(index, query)
+    if terms.size == 0:
+        return []
+    with metrics.span("retrieval.score", backend="bm25"):
+        docs, scores, _ = _score(index, terms, weights, k, min_score)
+        rows, scores = retriever_local._top_k(docs, scores, k, min_score)
+        return retriever_local._passages(index, rows, scores)
+
+
+def search_many(index: Dict, queries: List[str], k: int = 5, min_score: float = 0.0) -> List[List[Passage]]:
+    # MaxScore prunes per query, so there is no shared product to batch.
+    return [search(index, query, k=k, min_score=min_score) for query in queries]
+
+
+def score_ceiling(index: Dict, query: str) -> float:
+    """Sum of the query terms' ``max_impact``: no passage can score higher."""
+    if not index or index.get("max_impact") is None:
+        return 0.0
+    terms, weights = _query_terms(index, query)
+    return float(index["max_impact"][terms].astype(np.float64) @ weights)
+
+
+def stats(index: Dict) -> Dict[str, int]:
+    return retriever_local.stats(index)
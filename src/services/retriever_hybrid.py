@@ -0,0 +1,377 @@
+"""Hybrid lexical + dense retrieval with a local IVF index.
+
+The lexical channel is the TF-IDF engine of :mod:`src.services.retriever_local`.
+The dense channel embeds every chunk without a model download or GPU:
+
+* character 3-5-grams (accent-folded, within word boundaries) are hashed
+  into ``HASH_FEATURES`` buckets with sublinear term frequency and IDF;
+* a fixed, seeded signed projection folds them into ``DIM`` dimensions,
+  which are L2-normalised.
+
+Shared character n-grams survive inflections, typos and compound words that
+exact terms miss ("configurar" / "configuração"), so the channel mostly
+rescues near-miss wording rather than true synonyms.
+
+Vectors live in ``<index_path>/dense`` as their own memory-mapped generation,
+quantised to int8 with one scale per row (or stored as float16), grouped by
+inverted-file (IVF) list: ``centroids`` come from k-means over the chunks
+and a query only scans the ``NPROBE`` lists whose centroids are closest.
+Small corpora use a single list, i.e. exact search.
+
+The dense generation follows the base index: when the base generation
+changes, rows of files whose content hash is unchanged are copied over and
+only new chunks are embedded and assigned to the existing centroids. IDF
+and centroids are refitted from scratch once the corpus has grown or shrunk
+by ``RETRAIN_GROWTH`` since they were trained.
+
+Each channel contributes its best ``FANOUT`` rows (lexical ones above
+``min_score``, dense ones above ``DENSE_MIN_SCORE`` cosine) and the lists are
+merged by reciprocal-rank fusion; :attr:`Passage.score` is the fused score.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix, vstack
+
+from src.core import metrics
+from src.services import index_store, retriever_local
+from src.services.retriever_local import Passage
+
+if TYPE_CHECKING:
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+DIM = 384
+NGRAMS = (3, 5)
+HASH_FEATURES = 2**18
+# Identifies the embedding function; a dense generation built by another one is rebuilt.
+EMBEDDER = f"char{NGRAMS[0]}{NGRAMS[1]}-h{HASH_FEATURES}-d{DIM}-v1"
+DTYPES = ("int8", "float16")
+DTYPE = "int8"
+SUBDIR = "dense"
+
+# Below this many chunks the index is a single list (exact search).
+MIN_IVF_ROWS = 4096
+MAX_LISTS = 1024
+NPROBE = 8
+RETRAIN_GROWTH = 2.0
+TRAIN_SAMPLE_PER_LIST = 64
+
+FANOUT = 50
+RRF_K = 60
+DENSE_MIN_SCORE = 0.2
+# Below this many chunks to embed, process start-up costs more than it saves.
+PARALLEL_MIN_TEXTS = 2000
+EMBED_BATCH = 512
+
+
+@lru_cache(maxsize=1)
+def _hasher() -> "HashingVectorizer":
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    return HashingVectorizer(
+        analyzer="char_wb",
+        ngram_range=NGRAMS,
+        n_features=HASH_FEATURES,
+        strip_accents="unicode",
+        alternate_sign=False,
+        norm=None,
+    )
+
+
+@lru_cache(maxsize=1)
+def _projection() -> csr_matrix:
+    """Signed bucket projection ``HASH_FEATURES -> DIM`` (one non-zero per row)."""
+    rng = np.random.default_rng(0)
+    buckets = rng.integers(0, DIM, HASH_FEATURES)
+    signs = rng.choice(np.array([-1.0, 1.0], dtype=np.float32), HASH_FEATURES)
+    return csr_matrix((signs, (np.arange(HASH_FEATURES), buckets)), shape=(HASH_FEATURES, DIM))
+
+
+def _hash_texts(texts: List[str]) -> csr_matrix:
+    """Sublinear hashed n-gram counts of ``texts``; runs in the worker processes."""
+    counts = _hasher().transform(texts).tocsr()
+    counts.data = np.log1p(counts.data).astype(np.float32)
+    return counts
+
+
+def _hash_all(texts: List[str], workers: int) -> csr_matrix:
+    if not texts:
+        return csr_matrix((0, HASH_FEATURES), dtype=np.float32)
+    workers = workers if workers > 0 else (os.cpu_count() or 1)
+    batches = [texts[i:i + EMBED_BATCH] for i in range(0, len(texts), EMBED_BATCH)]
+    if workers <= 1 or len(texts) < PARALLEL_MIN_TEXTS:
+        return vstack([_hash_texts(batch) for batch in batches], format="csr")
+    context = multiprocessing.get_context(retriever_local.START_METHOD)
+    with ProcessPoolExecutor(max_workers=min(workers, len(batches)), mp_context=context) as pool:
+        return vstack(list(pool.map(_hash_texts, batches)), format="csr")
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def _fit_idf(hashed: csr_matrix) -> np.ndarray:
+    df = np.bincount(hashed.indices, minlength=HASH_FEATURES)
+    return (np.log((1.0 + hashed.shape[0]) / (1.0 + df)) + 1.0).astype(np.float32)
+
+
+def _project(hashed: csr_matrix, idf: np.ndarray) -> np.ndarray:
+    weighted = csr_matrix((hashed.data * idf[hashed.indices], hashed.indices, hashed.indptr), shape=hashed.shape)
+    return _unit(np.asarray((weighted @ _projection()).todense(), dtype=np.float32))
+
+
+def embed(index: Dict, texts: List[str]) -> np.ndarray:
+    """Unit-length ``DIM``-dimensional embeddings of ``texts`` with the index IDF."""
+    return _project(_hash_texts(texts), np.asarray(index["dense_idf"]))
+
+
+def _quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Stored vectors and per-row scales (``vector ~ stored * scale``)."""
+    if dtype == "float16":
+        return vectors.astype(np.float16), np.ones(vectors.shape[0], dtype=np.float32)
+    peak = np.abs(vectors).max(axis=1) if vectors.size else np.zeros(vectors.shape[0], dtype=np.float32)
+    scales = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+    return np.rint(vectors / scales[:, None]).astype(np.int8), scales
+
+
+def _n_lists(n_rows: int) -> int:
+    if n_rows < MIN_IVF_ROWS:
+        return 1
+    return min(int(round(math.sqrt(n_rows))), MAX_LISTS)
+
+
+def _train(vectors: np.ndarray) -> np.ndarray:
+    """Unit-length IVF centroids (k-means over a sample of the chunks)."""
+    n_lists = _n_lists(vectors.shape[0])
+    if n_lists == 1:
+        centroid = vectors.mean(axis=0, keepdims=True) if vectors.size else np.zeros((1, DIM), dtype=np.float32)
+        return _unit(centroid).astype(np.float32)
+    rng = np.random.default_rng(0)
+    sample_size = min(vectors.shape[0], n_lists * TRAIN_SAMPLE_PER_LIST)
+    sample = vectors[np.sort(rng.choice(vectors.shape[0], sample_size, replace=False))]
+    from sklearn.cluster import KMeans
+
+    kmeans = KMeans(n_clusters=n_lists, n_init=1, max_iter=20, random_state=0).fit(sample)
+    return _unit(kmeans.cluster_centers_).astype(np.float32)
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, batch: int = 8192) -> np.ndarray:
+    lists = np.zeros(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], batch):
+        lists[start:start + batch] = np.argmax(vectors[start:start + batch] @ centroids.T, axis=1)
+    return lists
+
+
+def _build(base: Dict, previous: Optional[Dict], workers: int, dtype: str) -> Tuple[Dict[str, np.ndarray], Dict]:
+    """Dense arrays and manifest for ``base``, reusing ``previous`` rows where possible."""
+    n_rows = int(base["chunks"])
+    documents = sorted(base["manifest"].values(), key=lambda d: (d["start"], d["stop"]))
+    trained_on = int(previous["dense_trained_on"]) if previous is not None else 0
+    retrain = previous is None or not (trained_on / RETRAIN_GROWTH <= n_rows <= trained_on * RETRAIN_GROWTH)
+
+    stored = np.zeros((n_rows, DIM), dtype=np.int8 if dtype == "int8" else np.float16)
+    scales = np.ones(n_rows, dtype=np.float32)
+    lists = np.zeros(n_rows, dtype=np.int64)
+    fresh = np.ones(n_rows, dtype=bool)
+
+    if retrain:
+        hashed = _hash_all(list(base["passages"]), workers)
+        idf = _fit_idf(hashed)
+        vectors = _project(hashed, idf)
+        centroids = _train(vectors)
+        stored, scales = _quantize(vectors, dtype)
+        lists = _assign(vectors, centroids)
+        trained_on = n_rows
+        reused = 0
+    else:
+        idf = np.asarray(previous["dense_idf"])
+        centroids = np.asarray(previous["dense_centroids"])
+        # previous rows -> position in the list-ordered arrays
+        prev_rows = np.asarray(previous["dense_rows"])
+        position = np.empty(prev_rows.size, dtype=np.int64)
+        position[prev_rows] = np.arange(prev_rows.size)
+        prev_lists = np.repeat(np.arange(centroids.shape[0]), np.diff(np.asarray(previous["dense_offsets"])))
+        prev_docs = previous["dense_documents"]
+        for doc in documents:
+            old = prev_docs.get(doc["path"])
+            if old is None or old["sha1"] != doc["sha1"] or old["stop"] - old["start"] != doc["stop"] - doc["start"]:
+                continue
+            pos = position[old["start"]:old["stop"]]
+            stored[doc["start"]:doc["stop"]] = previous["dense_vectors"][pos]
+            scales[doc["start"]:doc["stop"]] = previous["dense_scales"][pos]
+            lists[doc["start"]:doc["stop"]] = prev_lists[pos]
+            fresh[doc["start"]:doc["stop"]] = False
+        new_rows = np.flatnonzero(fresh)
+        if new_rows.size:
+            vectors = _project(_hash_all([base["passages"][int(r)] for r in new_rows], workers), idf)
+            stored[new_rows], scales[new_rows] = _quantize(vectors, dtype)
+            lists[new_rows] = _assign(vectors, centroids)
+        reused = n_rows - new_rows.size
+
+    order = np.argsort(lists, kind="stable")
+    offsets = np.zeros(centroids.shape[0] + 1, dtype=np.int64)
+    np.cumsum(np.bincount(lists, minlength=centroids.shape[0]), out=offsets[1:])
+    LOGGER.info(
+        "Dense index: %s chunks (%s reused, %s embedded), %s lists%s",
+        n_rows, reused, n_rows - reused, centroids.shape[0], " (retrained)" if retrain else "",
+    )
+    arrays = {
+        "vectors": stored[order],
+        "scales": scales[order],
+        "rows": order.astype(np.int32),
+        "offsets": offsets,
+        "centroids": centroids,
+        "idf": idf,
+    }
+    manifest = {
+        "base_generation": base["generation"],
+        "embedder": EMBEDDER,
+        "dtype": dtype,
+        "trained_on": trained_on,
+        "documents": [{key: d[key] for key in ("path", "sha1", "start", "stop")} for d in documents],
+    }
+    return arrays, manifest
+
+
+def _open(gen_dir: Path, base: Dict) -> Dict:
+    manifest = index_store.read_manifest(gen_dir)
+    return {
+        **base,
+        "base_generation": manifest["base_generation"],
+        "generation": manifest["generation"],
+        "dense_embedder": manifest["embedder"],
+        "dense_dtype": manifest["dtype"],
+        "dense_trained_on": manifest["trained_on"],
+        "dense_documents": {d["path"]: d for d in manifest["documents"]},
+        **{f"dense_{name}": index_store.load_array(gen_dir, name)
+           for name in ("vectors", "scales", "rows", "offsets", "centroids", "idf")},
+    }
+
+
+def build_or_load_index(
+    docs_dir: str,
+    index_path: str = ".local_index",
+    force_rebuild: bool = False,
+    workers: int = 0,
+    compaction: retriever_local.Compaction = retriever_local.FULL,
+    dtype: str = DTYPE,
+) -> Dict:
+    """Load the dense index, updating it when the base TF-IDF index changed."""
+    if dtype not in DTYPES:
+        raise ValueError(f"Unknown dense dtype {dtype!r}; expected one of {list(DTYPES)}")
+    base = retriever_local.build_or_load_index(
+        docs_dir, index_path, force_rebuild=force_rebuild, workers=workers, compaction=compaction
+    )
+    dense_dir = Path(index_path) / SUBDIR
+
+    previous = None if force_rebuild else _load(dense_dir, base, dtype)
+    if previous is not None and previous["base_generation"] == base["generation"]:
+        return previous
+    with index_store.lock(dense_dir):
+        # another worker may have updated it for this base while we waited
+        previous = None if force_rebuild else _load(dense_dir, base, dtype)
+        if previous is not None and previous["base_generation"] == base["generation"]:
+            return previous
+
+        arrays, manifest = _build(base, previous, workers, dtype)
+
+        def write(target: Path) -> None:
+            for name, array in arrays.items():
+                index_store.save_array(target, name, array)
+
+        gen_dir = index_store.publish(dense_dir, manifest, write)
+    return _open(gen_dir, base)
+
+
+def _load(dense_dir: Path, base: Dict, dtype: str) -> Optional[Dict]:
+    """The current dense generation if it was built with this embedder and ``dtype``."""
+    gen_dir = index_store.current_generation(dense_dir) if dense_dir.is_dir() else None
+    if gen_dir is None:
+        return None
+    try:
+        previous = _open(gen_dir, base)
+    except Exception:
+        LOGGER.warning("Failed to load dense index, rebuilding.")
+        return None
+    if previous["dense_embedder"] != EMBEDDER or previous["dense_dtype"] != dtype:
+        return None
+    return previous
+
+
+def _dense_top(index: Dict, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Approximate top ``k`` rows by cosine, scanning the ``NPROBE`` closest lists."""
+    centroids, offsets = index["dense_centroids"], index["dense_offsets"]
+    probe = np.argsort(-(centroids @ query), kind="stable")[:NPROBE]
+    positions = np.concatenate([np.arange(offsets[l], offsets[l + 1]) for l in probe.tolist()])
+    if positions.size == 0:
+        return positions, np.zeros(0)
+    # lists are contiguous, so this reads a few runs of the mapped file
+    vectors = np.asarray(index["dense_vectors"][positions], dtype=np.float32)
+    scores = (vectors @ query) * index["dense_scales"][positions]
+    return retriever_local._top_k(np.asarray(index["dense_rows"][positions], dtype=np.int64), scores, k, DENSE_MIN_SCORE)
+
+
+def _fuse(channels: List[np.ndarray], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Reciprocal-rank fusion of ranked row lists: ``sum(1 / (RRF_K + rank))``."""
+    fused: Dict[int, float] = {}
+    for rows in channels:
+        for rank, row in enumerate(rows.tolist(), start=1):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (RRF_K + rank)
+    if not fused:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    rows = np.fromiter(fused.keys(), dtype=np.int64, count=len(fused))
+    scores = np.fromiter(fused.values(), dtype=np.float64, count=len(fused))
+    return retriever_local._top_k(rows, scores, k, 0.0)
+
+
+def search(index: Dict, query: str, k: int = 5, min_score: float = 0.0) -> List[Passage]:
+    """Top ``k`` passages by fused rank; ``min_score`` applies to the lexical (cosine) channel."""
+    return search_many(index, [query], k=k, min_score=min_score)[0]
+
+
+def search_many(index: Dict, queries: List[str], k: int = 5, min_score: float = 0.0) -> List[List[Passage]]:
+    if not index or index.get("dense_vectors") is None or index.get("chunks", 0) == 0 or k <= 0:
+        return [[] for _ in queries]
+    if not queries:
+        return []
+    fanout = max(k, FANOUT)
+    with metrics.span("retrieval.vectorize", backend="hybrid"):
+        lexical = retriever_local._transform(index, list(queries))
+        dense = embed(index, list(queries))
+    with metrics.span("retrieval.score", backend="hybrid", channel="lexical"):
+        sim = retriever_local._similarities(index, lexical)
+        lexical_rows = [
+            retriever_local._top_k(sim.indices[sim.indptr[q]:sim.indptr[q + 1]],
+                                   sim.data[sim.indptr[q]:sim.indptr[q + 1]], fanout, min_score)[0]
+            for q in range(len(queries))
+        ]
+    with metrics.span("retrieval.score", backend="hybrid", channel="dense"):
+        dense_rows = [_dense_top(index, vector, fanout)[0] for vector in dense]
+    results: List[List[Passage]] = []
+    for lex, den in zip(lexical_rows, dense_rows):
+        rows, scores = _fuse([lex, den], k)
+        results.append(retriever_local._passages(index, rows, scores))
+    return results
+
+
+def score_ceiling(index: Dict, query: str) -> float:
+    """Fused score of a passage ranked first by both channels."""
+    return 2.0 / (RRF_K + 1)
+
+
+def stats(index: Dict) -> Dict[str, int]:
+    return retriever_local.stats(index)
@@ -1,17 +1,26 @@
 from __future__ import annotations
 
+import bisect
+import hashlib
 import logging
+import multiprocessing
 import os
-import pickle
 import re
-from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from itertools import accumulate
 from pathlib import Path
-from typing import Dict, Iterable, List, Tuple
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
 import numpy as np
-from markdown_it import MarkdownIt
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy.sparse import csc_matrix, csr_matrix, vstack
+
+from src.core import metrics
+from src.services import index_store
+
+if TYPE_CHECKING:
+    from markdown_it import MarkdownIt
 
 
 LOGGER = logging.getLogger(__name__)
@@ -19,6 +28,17 @@ LOGGER = logging.getLogger(__name__)
 
 CHUNK_SIZE = 900
 OVERLAP = 150
+# Identifies the chunking scheme; part of every file digest and index manifest
+# so switching chunkers re-chunks everything and invalidates cached answers.
+CHUNKER = "markdown-v1"
+# Fenced code and tables are kept whole up to this many times ``CHUNK_SIZE``.
+ATOMIC_FACTOR = 4
+# Below this many files to (re)read, process start-up costs more than it saves.
+PARALLEL_MIN_FILES = 32
+# Ingestion runs from the docs watcher thread and from ``asyncio.to_thread``
+# while other threads hold locks; forking then can deadlock the children.
+START_METHOD = "spawn"
+WEIGHT_DTYPES = ("float64", "float32", "uint8")
 
 
 @dataclass
@@ -28,6 +48,38 @@ class Passage:
     title: str
     chunk_id: int
     score: float
+    section: str = ""
+    shard: str = ""
+
+
+@dataclass(frozen=True)
+class Compaction:
+    """How the served TF-IDF weights are stored.
+
+    ``dtype`` is ``float64`` (exact), ``float32`` or ``uint8`` (one scale per
+    term). Terms in fewer than ``min_df`` passages or outside the
+    ``max_features`` most frequent ones (0: all) leave the served vocabulary,
+    and only the ``row_terms`` heaviest terms of a passage (0: all) keep a
+    posting. Raw counts, document frequencies and the full vocabulary are
+    always kept, so IDF and incremental updates are unaffected and changing
+    the settings only rewrites the served arrays.
+    """
+
+    dtype: str = "float64"
+    min_df: int = 1
+    max_features: int = 0
+    row_terms: int = 0
+
+    @property
+    def full(self) -> bool:
+        return self == FULL
+
+    @property
+    def prunes_terms(self) -> bool:
+        return self.min_df > 1 or self.max_features > 0
+
+
+FULL = Compaction()
 
 
 def _read_markdown(filepath: Path) -> str:
@@ -47,139 +99,769 @@ def _extract_title(md_text: str, default: str) -> str:
 
 
 def _chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = OVERLAP) -> List[str]:
+    """Split ``text`` into ~``chunk_size`` character windows overlapping by ``overlap``.
+
+    Windows never cut a word: ``text`` is split once into alternating
+    word/whitespace tokens, and window ends and step starts are found by
+    binary search over the prefix sums of the token lengths, so each window
+    is a single slice of ``text``.
+    """
     tokens = re.split(r"(\s+)", text)
-    # join tokens into roughly sized char windows maintaining whitespace
+    offsets = [0, *accumulate(len(t) for t in tokens)]
+    n = len(tokens)
+    step = max(chunk_size - overlap, 1)
     chunks: List[str] = []
     i = 0
-    while i < len(tokens):
-        acc = []
-        acc_len = 0
-        j = i
-        while j < len(tokens) and acc_len < chunk_size:
-            acc.append(tokens[j])
-            acc_len += len(tokens[j])
-            j += 1
-        chunk = "".join(acc).strip()
+    while i < n:
+        # first token boundary at least ``chunk_size`` (resp. ``step``) characters past ``i``
+        j = min(bisect.bisect_left(offsets, offsets[i] + chunk_size, i + 1), n)
+        chunk = text[offsets[i]:offsets[j]].strip()
         if chunk:
             chunks.append(chunk)
-        if j >= len(tokens):
+        if j >= n:
             break
-        # move by (chunk_size - overlap) in characters
-        step = max(chunk_size - overlap, 1)
-        # approximate by characters
-        consumed = 0
-        k = i
-        while k < len(tokens) and consumed < step:
-            consumed += len(tokens[k])
-            k += 1
-        i = k
+        i = min(bisect.bisect_left(offsets, offsets[i] + step, i + 1), n)
+    return chunks
+
+
+@lru_cache(maxsize=1)
+def _markdown() -> "MarkdownIt":
+    # Only index builds parse markdown; keep the import off the serving path.
+    from markdown_it import MarkdownIt
+
+    return MarkdownIt("commonmark").enable("table")
+
+
+def _split_lines(lines: List[str], size: int, head: List[str], tail: List[str]) -> List[str]:
+    """Cut an oversized code block or table on line boundaries, repeating ``head``/``tail``."""
+    budget = max(size - sum(map(len, head)) - sum(map(len, tail)), 1)
+    pieces: List[str] = []
+    acc: List[str] = []
+    acc_len = 0
+    for line in lines:
+        if acc and acc_len + len(line) > budget:
+            pieces.append("".join(head + acc + tail).strip())
+            acc, acc_len = [], 0
+        acc.append(line)
+        acc_len += len(line)
+    if acc:
+        pieces.append("".join(head + acc + tail).strip())
+    return pieces
+
+
+def _chunk_markdown(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = OVERLAP) -> List[Tuple[str, str]]:
+    """Structure-aware chunks of a markdown document: ``[(text, heading path), ...]``.
+
+    The markdown-it block stream is cut at every heading; within a section,
+    whole top-level blocks (paragraphs, lists, quotes, fenced code, tables)
+    are packed up to ``chunk_size`` characters. A heading with no body of its
+    own is carried into the next section. Fenced code and tables are never
+    split unless longer than ``ATOMIC_FACTOR * chunk_size`` (then on line
+    boundaries, repeating the fence or table header); other oversized blocks
+    fall back to :func:`_chunk_text` windows. The heading path looks like
+    ``"Loja > Frete"``.
+    """
+    lines = text.splitlines(keepends=True)
+    offsets = [0, *accumulate(len(line) for line in lines)]
+    tokens = _markdown().parse(text)
+
+    chunks: List[Tuple[str, str]] = []
+    headings: List[Tuple[int, str]] = []  # (level, text) stack
+    current: List[Tuple[int, int]] = []  # line ranges of the blocks being packed
+    has_body = False
+
+    def section() -> str:
+        return " > ".join(h for _, h in headings)
+
+    def flush() -> None:
+        nonlocal current, has_body
+        if current:
+            chunk = text[offsets[current[0][0]]:offsets[current[-1][1]]].strip()
+            if chunk:
+                chunks.append((chunk, section()))
+        current, has_body = [], False
+
+    for i, tok in enumerate(tokens):
+        if tok.level != 0 or tok.map is None:
+            continue
+        start, stop = tok.map
+        size = offsets[stop] - offsets[start]
+        if tok.type == "heading_open":
+            if has_body:
+                flush()
+            level = int(tok.tag[1:])
+            while headings and headings[-1][0] >= level:
+                headings.pop()
+            headings.append((level, tokens[i + 1].content.strip()))
+            current.append((start, stop))
+            continue
+
+        packed = offsets[current[-1][1]] - offsets[current[0][0]] if current else 0
+        if size > chunk_size:
+            atomic = tok.type in ("fence", "code_block", "table_open")
+            if atomic and size <= ATOMIC_FACTOR * chunk_size:
+                if has_body:
+                    flush()
+                current.append((start, stop))
+                has_body = True
+                flush()
+                continue
+            # Emit the pending heading(s) with the first piece.
+            prefix = text[offsets[current[0][0]]:offsets[start]] if current and not has_body else ""
+            if has_body:
+                flush()
+            block_lines = lines[start:stop]
+            if tok.type == "fence":
+                pieces = _split_lines(block_lines[1:-1], chunk_size, block_lines[:1], block_lines[-1:])
+            elif tok.type == "table_open":
+                pieces = _split_lines(block_lines[2:], chunk_size, block_lines[:2], [])
+            elif tok.type == "code_block":
+                pieces = _split_lines(block_lines, chunk_size, [], [])
+            else:
+                pieces = _chunk_text("".join(block_lines), chunk_size, overlap)
+            if prefix.strip() and pieces:
+                pieces[0] = prefix.strip() + "\n\n" + pieces[0]
+            chunks.extend((piece, section()) for piece in pieces)
+            current, has_body = [], False
+            continue
+
+        if has_body and packed + size > chunk_size:
+            flush()
+        current.append((start, stop))
+        has_body = True
+    flush()
     return chunks
 
 
+def _file_digest(text: str) -> str:
+    """Content hash of a file, salted with :data:`CHUNKER`."""
+    return hashlib.sha1(f"{CHUNKER}\n{text}".encode("utf-8", errors="ignore")).hexdigest()
+
+
+def _ingest_file(path: str, known_sha1: Optional[str] = None) -> Tuple[str, str, Optional[List[Tuple[str, str]]]]:
+    """Read, hash and chunk one markdown file: ``(sha1, title, [(chunk, section), ...])``.
+
+    ``chunks`` is ``None`` when the content hash equals ``known_sha1`` (file
+    touched but unchanged). Runs in the ingestion worker processes.
+    """
+    fp = Path(path)
+    raw = _read_markdown(fp)
+    digest = _file_digest(raw)
+    if digest == known_sha1:
+        return digest, "", None
+    return digest, _extract_title(raw, default=fp.name), _chunk_markdown(raw)
+
+
+def _ingest(
+    jobs: List[Tuple[str, Optional[str]]], workers: int
+) -> List[Tuple[str, str, Optional[List[Tuple[str, str]]]]]:
+    """:func:`_ingest_file` over ``jobs``, fanned out over processes when worthwhile.
+
+    Results come back in ``jobs`` order, so chunk order (and row ids) do not
+    depend on which worker finished first.
+    """
+    workers = workers if workers > 0 else (os.cpu_count() or 1)
+    workers = min(workers, len(jobs))
+    if workers <= 1 or len(jobs) < PARALLEL_MIN_FILES:
+        return [_ingest_file(path, sha) for path, sha in jobs]
+    paths, shas = zip(*jobs)
+    chunksize = max(1, -(-len(jobs) // (workers * 4)))
+    context = multiprocessing.get_context(START_METHOD)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        return list(pool.map(_ingest_file, paths, shas, chunksize=chunksize))
+
+
+_TOKEN = re.compile(r"(?u)\b\w\w+\b")
+
+
+def _analyze(text: str) -> List[str]:
+    """Lowercased ``\\w\\w+`` tokens followed by their bigrams.
+
+    The same terms, in the same order, as sklearn's
+    ``TfidfVectorizer(ngram_range=(1, 2))`` analyzer, so existing indexes keep
+    matching while serving never imports sklearn.
+    """
+    tokens = _TOKEN.findall(text.lower())
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def _count_terms(passages: List[str], vocabulary: Dict[str, int]) -> csr_matrix:
+    """Term-count matrix for ``passages``; unseen terms are appended to ``vocabulary``."""
+    indices: List[int] = []
+    values: List[int] = []
+    indptr = [0]
+    for text in passages:
+        counts: Dict[int, int] = {}
+        for term in _analyze(text):
+            col = vocabulary.setdefault(term, len(vocabulary))
+            counts[col] = counts.get(col, 0) + 1
+        indices.extend(counts.keys())
+        values.extend(counts.values())
+        indptr.append(len(indices))
+    return csr_matrix(
+        (np.asarray(values, dtype=np.int32), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+        shape=(len(passages), len(vocabulary)),
+    )
+
+
+def _idf(df: np.ndarray, n_docs: int) -> np.ndarray:
+    # smooth_idf=True, as in sklearn's TfidfTransformer
+    return np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+
+
+def _weight(counts: csr_matrix, idf: np.ndarray) -> csr_matrix:
+    """L2-normalised TF-IDF rows from raw counts; one vectorised pass over nnz."""
+    data = counts.data * idf[counts.indices]
+    lengths = np.diff(counts.indptr)
+    rows = np.repeat(np.arange(counts.shape[0]), lengths)
+    norms = np.sqrt(np.bincount(rows, weights=data * data, minlength=counts.shape[0]))
+    norms[norms == 0] = 1.0
+    data /= np.repeat(norms, lengths)
+    return csr_matrix((data, counts.indices, counts.indptr), shape=counts.shape)
+
+
+def _served_terms(df: np.ndarray, compaction: Compaction) -> np.ndarray:
+    """Mask of the terms that keep their postings: ``min_df``, then the ``max_features`` most frequent."""
+    keep = df >= max(compaction.min_df, 1)
+    if 0 < compaction.max_features < int(keep.sum()):
+        ranked = np.argsort(-np.where(keep, df, -1), kind="stable")[: compaction.max_features]
+        keep = np.zeros(df.size, dtype=bool)
+        keep[ranked] = True
+    return keep
+
+
+def _prune(matrix: csr_matrix, terms: np.ndarray, row_terms: int) -> csr_matrix:
+    """``matrix`` restricted to the ``terms`` columns (renumbered) and its ``row_terms`` heaviest
+    entries per row; rows are not renormalised, so scores stay below the exact ones."""
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    keep = terms[matrix.indices]
+    if row_terms > 0:
+        # rank of each surviving entry within its row, heaviest first
+        order = np.lexsort((-matrix.data, ~keep, rows))
+        starts = np.searchsorted(rows[order], rows[order], side="left")
+        rank = np.empty(order.size, dtype=np.int64)
+        rank[order] = np.arange(order.size) - starts
+        keep &= rank < row_terms
+    columns = np.cumsum(terms) - 1
+    lengths = np.bincount(rows[keep], minlength=matrix.shape[0])
+    indptr = np.concatenate([[0], np.cumsum(lengths)]).astype(matrix.indptr.dtype)
+    return csr_matrix(
+        (matrix.data[keep], columns[matrix.indices[keep]].astype(matrix.indices.dtype), indptr),
+        shape=(matrix.shape[0], int(terms.sum())),
+    )
+
+
+def _quantize(postings: csc_matrix, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Stored posting weights and, for ``uint8``, per-term scales (``weight ~ code * scale``)."""
+    if dtype != "uint8":
+        return postings.data.astype(dtype), None
+    lengths = np.diff(postings.indptr)
+    peak = np.zeros(postings.shape[1], dtype=np.float64)
+    nonempty = lengths > 0
+    if postings.nnz:
+        peak[nonempty] = np.maximum.reduceat(postings.data, postings.indptr[:-1][nonempty])
+    scales = np.where(peak > 0, peak / 255.0, 1.0)
+    codes = np.rint(postings.data / np.repeat(scales, lengths))
+    # a term a passage contains never rounds away to "absent"
+    return np.clip(codes, 1, 255).astype(np.uint8), scales.astype(np.float32)
+
+
+class _MetaTable:
+    """``(path, title, chunk_id)`` per row, derived from the per-file row ranges."""
+
+    def __init__(self, documents: List[Dict]) -> None:
+        self._documents = sorted(documents, key=lambda d: (d["start"], d["stop"]))
+        self._starts = [d["start"] for d in self._documents]
+        self._rows = self._documents[-1]["stop"] if self._documents else 0
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def __getitem__(self, row: int) -> Tuple[str, str, int]:
+        if not 0 <= row < self._rows:
+            raise IndexError(row)
+        doc = self._documents[bisect.bisect_right(self._starts, row) - 1]
+        return doc["path"], doc["title"], row - doc["start"]
+
+    def __iter__(self):
+        for doc in self._documents:
+            for row in range(doc["start"], doc["stop"]):
+                yield doc["path"], doc["title"], row - doc["start"]
+
+
+def _empty_index() -> Dict:
+    return {
+        "vocabulary": {},
+        "df": np.zeros(0, dtype=np.int64),
+        "counts": csr_matrix((0, 0), dtype=np.int32),
+        "passages": [],
+        "sections": [],
+        "manifest": {},
+    }
+
+
+def _open_index(gen_dir: Path) -> Dict:
+    """Map a published generation; nothing but the manifest is read eagerly."""
+    manifest = index_store.read_manifest(gen_dir)
+    if manifest.get("chunker") != CHUNKER:
+        raise ValueError(f"index was chunked with {manifest.get('chunker')!r}, not {CHUNKER!r}")
+    documents: List[Dict] = manifest["documents"]
+    vocabulary = index_store.open_string_table(gen_dir, "vocab")
+    shape = (int(manifest["chunks"]), len(vocabulary))
+    compaction = Compaction(**manifest.get("compaction", {}))
+    indices = index_store.load_array(gen_dir, "indices")
+    indptr = index_store.load_array(gen_dir, "indptr")
+    terms = index_store.open_string_table(gen_dir, "terms") if compaction.prunes_terms else vocabulary
+    # Per-term postings for query scoring, one column per served term.
+    postings = csc_matrix(
+        (
+            index_store.load_array(gen_dir, "post_data"),
+            index_store.load_array(gen_dir, "post_indices"),
+            index_store.load_array(gen_dir, "post_indptr"),
+        ),
+        shape=(shape[0], len(terms)),
+        copy=False,
+    )
+    if compaction.full:
+        matrix = csr_matrix((index_store.load_array(gen_dir, "data"), indices, indptr), shape=shape, copy=False)
+    else:
+        # no row-major copy of the weights; the column-major postings stand in for it
+        matrix = postings
+    return {
+        "generation": manifest["generation"],
+        "compaction": compaction,
+        # all indexed terms (columns of ``counts`` and ``df``) and the ones queries are matched against
+        "vocabulary": vocabulary,
+        "terms": terms,
+        "df": index_store.load_array(gen_dir, "df"),
+        "idf": index_store.load_array(gen_dir, "idf"),
+        "counts": csr_matrix((index_store.load_array(gen_dir, "counts"), indices, indptr), shape=shape, copy=False),
+        # passages x served terms; with ``uint8`` compaction, codes to multiply by ``scales[term]``
+        "matrix": matrix,
+        "postings": postings,
+        "scales": index_store.load_array(gen_dir, "scales") if compaction.dtype == "uint8" else None,
+        "passages": index_store.open_string_table(gen_dir, "passages"),
+        "sections": index_store.open_string_table(gen_dir, "sections"),
+        "meta": _MetaTable(documents),
+        "manifest": {d["path"]: d for d in documents},
+        "files": int(manifest["files"]),
+        "chunks": int(manifest["chunks"]),
+        "_dir": gen_dir,
+    }
+
+
+def _save_index(index: Dict, index_dir: Path, compaction: Compaction = FULL) -> Path:
+    """Publish ``index`` as a new memory-mappable generation.
+
+    Terms are written as a sorted string table and columns are renumbered to
+    match, dropping terms whose document frequency fell to zero. Unless
+    ``compaction`` is :data:`FULL`, only the pruned, narrowed postings hold
+    weights (no row-major copy).
+    """
+    vocabulary: Dict[str, int] = index["vocabulary"]
+    df: np.ndarray = index["df"]
+    terms = index_store.sort_terms(t for t, col in vocabulary.items() if df[col] > 0)
+    remap = np.full(df.size, -1, dtype=np.int64)
+    order = np.fromiter((vocabulary[t] for t in terms), dtype=np.int64, count=len(terms))
+    remap[order] = np.arange(len(terms))
+
+    counts: csr_matrix = index["counts"]
+    n_rows = counts.shape[0]
+    idx_dtype = np.int32 if max(counts.nnz, len(terms)) < np.iinfo(np.int32).max else np.int64
+    counts = csr_matrix(
+        (counts.data, remap[counts.indices].astype(idx_dtype), counts.indptr.astype(idx_dtype)),
+        shape=(n_rows, len(terms)),
+    )
+    counts.sort_indices()
+    df = df[order]
+    idf = _idf(df, n_rows)
+    matrix = _weight(counts, idf)
+    served: Optional[List[str]] = None
+    if compaction.full:
+        postings = matrix.tocsc()
+    else:
+        keep = _served_terms(df, compaction)
+        postings = _prune(matrix, keep, compaction.row_terms).tocsc()
+        idf = idf[keep].astype(np.float32)
+        if compaction.prunes_terms:
+            served = [terms[i] for i in np.flatnonzero(keep)]
+    post_data, scales = _quantize(postings, compaction.dtype)
+
+    documents = sorted(index["manifest"].values(), key=lambda d: (d["start"], d["stop"]))
+
+    def write(gen_dir: Path) -> None:
+        if compaction.full:
+            index_store.save_array(gen_dir, "data", matrix.data)
+        index_store.save_array(gen_dir, "counts", counts.data.astype(np.int32))
+        index_store.save_array(gen_dir, "indices", counts.indices.astype(idx_dtype))
+        index_store.save_array(gen_dir, "indptr", counts.indptr.astype(idx_dtype))
+        index_store.save_array(gen_dir, "post_data", post_data)
+        if scales is not None:
+            index_store.save_array(gen_dir, "scales", scales)
+        index_store.save_array(gen_dir, "post_indices", postings.indices.astype(idx_dtype))
+        index_store.save_array(gen_dir, "post_indptr", postings.indptr.astype(idx_dtype))
+        index_store.save_array(gen_dir, "df", df)
+        index_store.save_array(gen_dir, "idf", idf)
+        index_store.write_string_table(gen_dir, "vocab", terms)
+        if served is not None:
+            index_store.write_string_table(gen_dir, "terms", served)
+        index_store.write_string_table(gen_dir, "passages", list(index["passages"]))
+        index_store.write_string_table(gen_dir, "sections", list(index["sections"]))
+
+    return index_store.publish(
+        index_dir,
+        {
+            "chunker": CHUNKER,
+            "compaction": asdict(compaction),
+            "files": len(documents),
+            "chunks": n_rows,
+            "documents": documents,
+        },
+        write,
+    )
+
+
+def _update_index(
+    previous: Dict,
+    md_files: List[Path],
+    changed: Dict[str, List[Tuple[str, str]]],
+    manifest: Dict[str, Dict],
+) -> Dict:
+    """Re-vectorize only ``changed`` files (path -> ``(chunk, section)`` list) on top of ``previous``.
+
+    Rows of unchanged files are kept (in file order), rows of changed and
+    deleted files are dropped, and new rows are appended. Document
+    frequencies are adjusted by the dropped/added rows only, so the cost is
+    proportional to the size of the change plus one vectorised reweighting
+    pass over the kept matrix.
+    """
+    prev_counts: csr_matrix = previous["counts"]
+    prev_manifest: Dict[str, Dict] = previous["manifest"]
+    vocabulary = previous["vocabulary"]
+    vocabulary = dict(vocabulary) if isinstance(vocabulary, dict) else vocabulary.to_dict()
+
+    keep = np.zeros(prev_counts.shape[0], dtype=bool)
+    for path, entry in prev_manifest.items():
+        if path in manifest and path not in changed:
+            keep[entry["start"]:entry["stop"]] = True
+
+    df = np.array(previous["df"], dtype=np.int64)
+    dropped = prev_counts[~keep]
+    if dropped.nnz:
+        df -= np.bincount(dropped.indices, minlength=df.size)
+
+    passages: List[str] = []
+    sections: List[str] = []
+    blocks: List[csr_matrix] = []
+    new_manifest: Dict[str, Dict] = {}
+
+    for fp in md_files:
+        path = str(fp)
+        if path in changed:
+            continue
+        start, stop = prev_manifest[path]["start"], prev_manifest[path]["stop"]
+        offset = len(passages)
+        passages.extend(previous["passages"][start:stop])
+        sections.extend(previous["sections"][start:stop])
+        blocks.append(prev_counts[start:stop])
+        new_manifest[path] = {**manifest[path], "start": offset, "stop": len(passages)}
+
+    fresh: List[str] = []
+    for fp in md_files:
+        path = str(fp)
+        if path not in changed:
+            continue
+        chunks = changed[path]
+        offset = len(passages) + len(fresh)
+        fresh.extend(text for text, _ in chunks)
+        sections.extend(section for _, section in chunks)
+        new_manifest[path] = {**manifest[path], "start": offset, "stop": offset + len(chunks)}
+    passages.extend(fresh)
+
+    added = _count_terms(fresh, vocabulary)
+    n_terms = len(vocabulary)
+    if n_terms > df.size:
+        df = np.concatenate([df, np.zeros(n_terms - df.size, dtype=np.int64)])
+    if added.nnz:
+        df += np.bincount(added.indices, minlength=n_terms)
+
+    resized = [
+        csr_matrix((b.data, b.indices, b.indptr), shape=(b.shape[0], n_terms)) for b in blocks if b.shape[0]
+    ]
+    if added.shape[0]:
+        resized.append(added)
+    counts = vstack(resized, format="csr") if resized else csr_matrix((0, n_terms), dtype=np.int32)
+
+    return {
+        "vocabulary": vocabulary,
+        "df": df,
+        "counts": counts,
+        "passages": passages,
+        "sections": sections,
+        "manifest": new_manifest,
+    }
+
+
 def build_or_load_index(
     docs_dir: str,
-    index_path: str = ".local_index.pkl",
+    index_path: str = ".local_index",
     force_rebuild: bool = False,
+    workers: int = 0,
+    compaction: Compaction = FULL,
 ) -> Dict:
-    """Load a previously built local index or (re)build it.
-
-    The index is automatically rebuilt if:
-    1. ``force_rebuild`` is explicitly set to ``True``; or
-    2. Any markdown file inside ``docs_dir`` was modified after the index file
-       was created.
+    """Load a previously built local index, updating it incrementally.
+
+    The index lives in ``index_path`` as memory-mapped generations (see
+    :mod:`src.services.index_store`) with a manifest of the mtime, size,
+    content hash and chunk row range of every markdown file. On load:
+
+    1. files whose mtime/size are unchanged are trusted as-is;
+    2. files whose content hash changed (or that are new) are re-chunked and
+       re-vectorized, and files that disappeared have their rows dropped;
+    3. IDF is recomputed from the maintained document frequencies and a new
+       generation is published atomically.
+
+    ``force_rebuild`` ignores any existing index and rebuilds everything.
+    Reading and chunking of the files to (re)index is spread over ``workers``
+    processes (``0``: one per CPU). The weights are stored as ``compaction``
+    says; an index stored otherwise is rewritten from its counts, without
+    re-chunking.
+
+    An up-to-date index is loaded without locking. Anything else happens
+    under :func:`index_store.lock`, after re-reading ``CURRENT``: when
+    several workers start (or see the same docs change) at once, one of them
+    builds and the others load its generation.
     """
+    if compaction.dtype not in WEIGHT_DTYPES:
+        raise ValueError(f"Unknown weight dtype {compaction.dtype!r}; expected one of {list(WEIGHT_DTYPES)}")
 
-    index_file = Path(index_path)
-    docs_path = Path(docs_dir)
-
-    # Gather markdown files *before* deciding to load the index so we can
-    # compare modification times when necessary.
-    md_files = list(docs_path.glob("**/*.md"))
-
-    latest_doc_mtime: float = 0.0
-    if md_files:
-        latest_doc_mtime = max(fp.stat().st_mtime for fp in md_files)
-
-    should_rebuild = force_rebuild
-    if index_file.exists() and not force_rebuild:
-        try:
-            index_mtime = index_file.stat().st_mtime
-            # Rebuild if any markdown was updated after the index file.
-            if latest_doc_mtime > index_mtime:
-                LOGGER.info("Docs changed after index build (index: %s, docs: %s). Rebuilding index.", index_mtime, latest_doc_mtime)
-                should_rebuild = True
-            else:
-                with index_file.open("rb") as f:
-                    data = pickle.load(f)
-                LOGGER.info("Local index loaded: %s", index_file)
-                return data
-        except Exception:
-            LOGGER.warning("Failed to load index, rebuilding.")
-            should_rebuild = True
-
+    index_dir = Path(index_path)
+    md_files = sorted(Path(docs_dir).glob("**/*.md"))
     if not md_files:
         LOGGER.info("No markdown files found in %s", docs_dir)
 
-    # If we reached this point, we need to build the index (first time or rebuild).
+    if not force_rebuild:
+        current = _load_current(index_dir)
+        if current is not None and _up_to_date(current, md_files, compaction):
+            LOGGER.info("Local index loaded: %s", current["_dir"])
+            return current
+    with index_store.lock(index_dir):
+        return _build_locked(docs_dir, index_dir, md_files, force_rebuild, workers, compaction)
 
-    if should_rebuild:
-        LOGGER.info("Building local index from %s", docs_dir)
 
-    passages: List[str] = []
-    meta: List[Tuple[str, str, int]] = []  # (path, title, chunk_id)
+def _load_current(index_dir: Path) -> Optional[Dict]:
+    gen_dir = index_store.current_generation(index_dir) if index_dir.is_dir() else None
+    if gen_dir is None:
+        return None
+    try:
+        return _open_index(gen_dir)
+    except Exception:
+        LOGGER.warning("Failed to load index, rebuilding.")
+        return None
 
+
+def _up_to_date(index: Dict, md_files: List[Path], compaction: Compaction) -> bool:
+    """Whether ``index`` covers exactly ``md_files`` with unchanged mtime/size, stored as ``compaction``."""
+    manifest: Dict[str, Dict] = index["manifest"]
+    if index["compaction"] != compaction or len(manifest) != len(md_files):
+        return False
     for fp in md_files:
-        raw = _read_markdown(fp)
-        title = _extract_title(raw, default=fp.name)
-        chunks = _chunk_text(raw)
-        for idx, ch in enumerate(chunks):
-            passages.append(ch)
-            meta.append((str(fp), title, idx))
-
-    if not passages:
-        LOGGER.info("No passages extracted from markdown in %s", docs_dir)
+        entry = manifest.get(str(fp))
+        st = fp.stat()
+        if not entry or entry["mtime_ns"] != st.st_mtime_ns or entry["size"] != st.st_size:
+            return False
+    return True
 
-    vectorizer = TfidfVectorizer(ngram_range=(1, 2))
-    matrix = vectorizer.fit_transform(passages)
 
-    data = {
-        "vectorizer": vectorizer,
-        "matrix": matrix,
-        "passages": passages,
-        "meta": meta,
-        "files": len(md_files),
-        "chunks": len(passages),
-    }
+def _build_locked(
+    docs_dir: str,
+    index_dir: Path,
+    md_files: List[Path],
+    force_rebuild: bool,
+    workers: int,
+    compaction: Compaction,
+) -> Dict:
+    """The update step of :func:`build_or_load_index`; runs with the index lock held."""
+    previous = None
+    if not force_rebuild:
+        previous = _load_current(index_dir)
+    if previous is None:
+        LOGGER.info("Building local index from %s", docs_dir)
+        previous = _empty_index()
 
-    with index_file.open("wb") as f:
-        pickle.dump(data, f)
-    LOGGER.info("Local index built: %s files, %s chunks", data["files"], data["chunks"])
-    return data
+    prev_manifest: Dict[str, Dict] = previous["manifest"]
+    manifest: Dict[str, Dict] = {}
+    changed: Dict[str, List[Tuple[str, str]]] = {}
+    touched = False
+    stale: List[Tuple[Path, os.stat_result]] = []
+    for fp in md_files:
+        path = str(fp)
+        st = fp.stat()
+        entry = prev_manifest.get(path)
+        if entry and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+            manifest[path] = {key: entry[key] for key in ("path", "title", "sha1", "mtime_ns", "size")}
+        else:
+            manifest[path] = {}  # placeholder keeps ``md_files`` order
+            stale.append((fp, st))
+
+    jobs = [(str(fp), prev_manifest.get(str(fp), {}).get("sha1")) for fp, _ in stale]
+    for (fp, st), (digest, title, chunks) in zip(stale, _ingest(jobs, workers)):
+        path = str(fp)
+        if chunks is None:
+            touched = True  # mtime bumped without a content change
+            manifest[path] = {**prev_manifest[path], "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+            continue
+        manifest[path] = {"path": path, "title": title, "sha1": digest, "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+        changed[path] = chunks
+    removed = [p for p in prev_manifest if p not in manifest]
+
+    if not changed and not removed and "matrix" in previous and previous["compaction"] == compaction:
+        if touched:
+            documents = [{**prev_manifest[p], **manifest[p]} for p in manifest]
+            index_store.rewrite_manifest(
+                previous["_dir"],
+                {
+                    "chunker": CHUNKER,
+                    "compaction": asdict(compaction),
+                    "files": previous["files"],
+                    "chunks": previous["chunks"],
+                    "documents": documents,
+                },
+            )
+            previous["manifest"] = {d["path"]: d for d in documents}
+        LOGGER.info("Local index loaded: %s", previous["_dir"])
+        return previous
+
+    if prev_manifest:
+        LOGGER.info(
+            "Updating local index: %s changed/added, %s removed, %s unchanged",
+            len(changed), len(removed), len(md_files) - len(changed),
+        )
 
+    updated = _update_index(previous, md_files, changed, manifest)
+    if not updated["passages"]:
+        LOGGER.info("No passages extracted from markdown in %s", docs_dir)
 
-def search(index: Dict, query: str, k: int = 5) -> List[Passage]:
-    if not index or index.get("matrix") is None:
-        return []
-    vec = index["vectorizer"].transform([query])
-    sim = cosine_similarity(vec, index["matrix"]).ravel()
-    if sim.size == 0:
-        return []
-    top_idx = np.argsort(sim)[::-1][:k]
+    index = _open_index(_save_index(updated, index_dir, compaction))
+    LOGGER.info("Local index built: %s files, %s chunks", index["files"], index["chunks"])
+    return index
+
+
+def _transform(index: Dict, queries: List[str]) -> csr_matrix:
+    """Vectorize ``queries`` with the served terms and IDF (L2-normalised)."""
+    vocabulary: Dict[str, int] = index.get("terms", index["vocabulary"])
+    indices: List[int] = []
+    values: List[int] = []
+    indptr = [0]
+    for query in queries:
+        counts: Dict[int, int] = {}
+        for term in _analyze(query):
+            col = vocabulary.get(term)
+            if col is not None:
+                counts[col] = counts.get(col, 0) + 1
+        indices.extend(counts.keys())
+        values.extend(counts.values())
+        indptr.append(len(indices))
+    counts_matrix = csr_matrix(
+        (np.asarray(values, dtype=np.float64), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+        shape=(len(queries), len(vocabulary)),
+    )
+    return _weight(counts_matrix, index["idf"])
+
+
+def _similarities(index: Dict, vectors: csr_matrix) -> csr_matrix:
+    """Sparse cosine scores (queries x passages) touching only the query terms' postings.
+
+    Rows of the index matrix and the query vectors are L2-normalised, so the
+    dot product is the cosine similarity; passages sharing no term with a
+    query are simply absent from the result instead of scored as zero.
+    """
+    n_rows = index["postings"].shape[0]
+    cols = np.unique(vectors.indices)
+    if cols.size == 0:
+        return csr_matrix((vectors.shape[0], n_rows))
+    sub = index["postings"][:, cols]  # passages x query terms
+    query = vectors[:, cols]
+    if index.get("scales") is not None:
+        query.data *= index["scales"][cols][query.indices]
+    return (query @ sub.T).tocsr()
+
+
+def _top_k(rows: np.ndarray, scores: np.ndarray, k: int, min_score: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Best ``k`` (rows, scores) above ``min_score``, highest first."""
+    keep = scores > 0
+    if min_score > 0:
+        keep &= scores >= min_score
+    rows, scores = rows[keep], scores[keep]
+    if scores.size > k:
+        part = np.argpartition(-scores, k - 1)[:k]
+        rows, scores = rows[part], scores[part]
+    order = np.lexsort((rows, -scores))
+    return rows[order], scores[order]
+
+
+def _passages(index: Dict, rows: np.ndarray, scores: np.ndarray) -> List[Passage]:
     results: List[Passage] = []
-    for i in top_idx:
-        path, title, chunk_id = index["meta"][int(i)]
+    for i, score in zip(rows.tolist(), scores.tolist()):
+        path, title, chunk_id = index["meta"][i]
         results.append(
             Passage(
-                text=index["passages"][int(i)],
+                text=index["passages"][i],
                 path=path,
                 title=title,
                 chunk_id=int(chunk_id),
-                score=float(sim[int(i)]),
+                score=float(score),
+                section=index["sections"][i],
             )
         )
     return results
 
 
+def search(index: Dict, query: str, k: int = 5, min_score: float = 0.0) -> List[Passage]:
+    """Top ``k`` passages for ``query``; passages scoring below ``min_score``
+    (or sharing no term with the query) are never returned."""
+    return search_many(index, [query], k=k, min_score=min_score)[0]
+
+
+def search_many(index: Dict, queries: List[str], k: int = 5, min_score: float = 0.0) -> List[List[Passage]]:
+    """Batched :func:`search`: one transform and one sparse product for all queries."""
+    if not index or index.get("matrix") is None or index["matrix"].shape[0] == 0 or k <= 0:
+        return [[] for _ in queries]
+    if not queries:
+        return []
+    with metrics.span("retrieval.vectorize", backend="tfidf"):
+        vectors = _transform(index, list(queries))
+    with metrics.span("retrieval.score", backend="tfidf"):
+        sim = _similarities(index, vectors)
+        results: List[List[Passage]] = []
+        for q in range(len(queries)):
+            start, stop = sim.indptr[q], sim.indptr[q + 1]
+            rows, scores = _top_k(sim.indices[start:stop], sim.data[start:stop], k, min_score)
+            results.append(_passages(index, rows, scores))
+    return results
+
+
+def score_ceiling(index: Dict, query: str) -> float:
+    """Upper bound of any score :func:`search` can return for ``query`` (cosine: 1)."""
+    return 1.0
+
+
+def chunk_key(index: Dict, passage: Passage) -> str:
+    """Content-addressed id of a passage: path, chunk number and source file hash."""
+    digest = index.get("manifest", {}).get(passage.path, {}).get("sha1", "")
+    return f"{passage.path}#{passage.chunk_id}@{digest[:16]}"
+
+
 def stats(index: Dict) -> Dict[str, int]:
     return {"files": int(index.get("files", 0)), "chunks": int(index.get("chunks", 0))}
 
+
+def serving_bytes(index: Dict) -> int:
+    """Bytes of the arrays the query path reads: served terms, IDF, scales and postings."""
+    postings, vocabulary = index["postings"], index["terms"]
+    arrays = [index["idf"], postings.data, postings.indices, postings.indptr]
+    if index.get("scales") is not None:
+        arrays.append(index["scales"])
+    table = vocabulary.nbytes if isinstance(vocabulary, index_store.StringTable) else 0
+    return table + int(sum(np.asarray(a).nbytes for a in arrays))
+
@@ -0,0 +1,170 @@
+"""Named index shards searched with scatter-gather.
+
+Each shard is one docs directory (e.g. one product line) with its own index
+files, its own :class:`~src.services.index_watcher.LiveIndex` and its own
+watcher, so rebuilding one shard never holds a lock the others need::
+
+    DOCS_SHARDS=loja=./docs/loja,erp=./docs/erp
+
+A query is scattered over the selected shards, one job per shard on the
+retrieval executor (the sparse products release the GIL), and the per-shard
+top ``k`` lists are gathered by :func:`merge`. Raw scores are not comparable
+across shards -- IDF and BM25 statistics are per shard -- so each is divided
+by the backend's :meth:`~src.services.retriever.Retriever.score_ceiling` for
+that shard and query before the lists are merged.
+"""
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+from concurrent.futures import Executor
+from typing import Dict, List, Optional, Tuple
+
+from src.services.retrieval_cache import RetrievalCache
+from src.services.retriever import Retriever
+from src.services.retriever_local import Passage
+
+
+DEFAULT = "default"
+
+
+def select(indexes: Dict[str, Dict], names: Optional[List[str]]) -> Dict[str, Dict]:
+    """The subset of ``indexes`` named by ``names`` (all of them when empty)."""
+    if not names:
+        return indexes
+    unknown = sorted(set(names) - set(indexes))
+    if unknown:
+        raise ValueError(f"Unknown shards {unknown}; expected some of {list(indexes)}")
+    return {name: index for name, index in indexes.items() if name in names}
+
+
+def _search_shard(
+    retriever: Retriever,
+    name: str,
+    index: Dict,
+    queries: List[str],
+    k: int,
+    min_score: float,
+    normalize: bool,
+    cache: Optional[RetrievalCache],
+) -> Tuple[List[List[Passage]], List[float]]:
+    if cache is None:
+        results = retriever.search_many(index, queries, k=k, min_score=min_score)
+    else:
+        backend = getattr(retriever, "__name__", type(retriever).__name__)
+        results = cache.get_many(backend, name, index, queries, k, min_score)
+        missing = [q for q, found in enumerate(results) if found is None]
+        if missing:
+            fresh = retriever.search_many(index, [queries[q] for q in missing], k=k, min_score=min_score)
+            cache.put_many(backend, name, index, [queries[q] for q in missing], k, min_score, fresh)
+            for q, passages in zip(missing, fresh):
+                results[q] = passages
+    ceilings = [retriever.score_ceiling(index, q) if normalize else 1.0 for q in queries]
+    return results, ceilings
+
+
+def merge(shard_results: Dict[str, List[Passage]], ceilings: Dict[str, float], k: int) -> List[Passage]:
+    """Top ``k`` of per-shard results by score / ceiling, tagged with their shard.
+
+    Ties keep shard order, then each shard's own ranking.
+    """
+    merged: List[Tuple[float, int, int, Passage]] = []
+    for order, (name, passages) in enumerate(shard_results.items()):
+        ceiling = ceilings.get(name, 1.0)
+        for rank, passage in enumerate(passages):
+            score = passage.score / ceiling if ceiling > 0 else 0.0
+            merged.append((-score, order, rank, dataclasses.replace(passage, score=score, shard=name)))
+    merged.sort(key=lambda item: item[:3])
+    return [item[3] for item in merged[:k]]
+
+
+async def search_many(
+    executor: Executor,
+    retriever: Retriever,
+    indexes: Dict[str, Dict],
+    queries: List[str],
+    k: int = 5,
+    min_score: float = 0.0,
+    cache: Optional[RetrievalCache] = None,
+) -> List[List[Passage]]:
+    """Scatter ``queries`` over ``indexes`` on ``executor`` and merge per query.
+
+    ``min_score`` applies per shard in the backend's own units. A single
+    shard keeps its raw scores, exactly as an unsharded search would. Each
+    shard job answers what it can from ``cache`` and searches the rest.
+    """
+    if not indexes:
+        return [[] for _ in queries]
+    normalize = len(indexes) > 1
+    loop = asyncio.get_running_loop()
+    gathered = await asyncio.gather(*(
+        loop.run_in_executor(
+            executor, _search_shard, retriever, name, index, queries, k, min_score, normalize, cache
+        )
+        for name, index in indexes.items()
+    ))
+    names = list(indexes)
+    return [
+        merge(
+            {name: results[q] for name, (results, _) in zip(names, gathered)},
+            {name: ceilings[q] for name, (_, ceilings) in zip(names, gathered)},
+            k,
+        )
+        for q in range(len(queries))
+    ]
+
+
+async def search(
+    executor: Executor,
+    retriever: Retriever,
+    indexes: Dict[str, Dict],
+    query: str,
+    k: int = 5,
+    min_score: float = 0.0,
+    cache: Optional[RetrievalCache] = None,
+) -> List[Passage]:
+    return (await search_many(executor, retriever, indexes, [query], k=k, min_score=min_score, cache=cache))[0]
+
+
+def cache_view(indexes: Dict[str, Dict], primary: str) -> Dict:
+    """One index-like view of all shards for :class:`~src.services.answer_cache.AnswerCache`.
+
+    Generations are combined and manifests merged (paths include the shard's
+    docs directory, so they do not collide); query vectors use the
+    vocabulary of ``primary``, the shard the top passage came from.
+    """
+    if len(indexes) == 1:
+        return next(iter(indexes.values()))
+    manifest: Dict[str, Dict] = {}
+    for index in indexes.values():
+        manifest.update(index.get("manifest", {}))
+    base = indexes.get(primary) or next(iter(indexes.values()))
+    return {
+        "generation": "+".join(f"{name}:{index.get('generation')}" for name, index in indexes.items()),
+        "manifest": manifest,
+        "vocabulary": base.get("vocabulary", {}),
+        "terms": base.get("terms", base.get("vocabulary", {})),
+        "idf": base.get("idf"),
+    }
+
+
+def stats(retriever: Retriever, indexes: Dict[str, Dict], builds: Dict[str, Dict]) -> Dict:
+    """Per-shard index and build stats plus their totals."""
+    per_shard = {
+        name: {**retriever.stats(index), "generation": index.get("generation"), **{
+            key: builds.get(name, {}).get(key) for key in ("build_seconds", "built_at", "reloads")
+        }}
+        for name, index in indexes.items()
+    }
+    if len(per_shard) == 1:
+        return {**next(iter(per_shard.values())), "shards": per_shard}
+    shards = list(per_shard.values())
+    return {
+        "files": sum(s.get("files", 0) for s in shards),
+        "chunks": sum(s.get("chunks", 0) for s in shards),
+        "generation": "+".join(f"{name}:{s['generation']}" for name, s in per_shard.items()),
+        "build_seconds": max(s["build_seconds"] or 0.0 for s in shards),
+        "built_at": max((s["built_at"] for s in shards if s["built_at"]), default=None),
+        "reloads": sum(s["reloads"] or 0 for s in shards),
+        "shards": per_shard,
+    }
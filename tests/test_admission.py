@@ -0,0 +1,90 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.app.deps import ask_flights, doc_researcher, llm_limiter, local_index
+from src.app.main import app
+from src.services import retriever_local
+from src.services.admission import Limiter, Overloaded, SingleFlight
+
+
+def test_limiter_queues_then_sheds():
+    async def scenario():
+        limiter = Limiter("llm", max_concurrent=1, max_queue=1, queue_timeout=0.05)
+        await limiter.acquire()
+        queued = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as full:
+            await limiter.acquire()
+        with pytest.raises(Overloaded) as late:
+            await queued
+
+        handed = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        limiter.release()
+        await handed
+        stats = limiter.stats()
+        limiter.release()
+        return full.value.status_code, late.value.status_code, stats, limiter.stats()
+
+    assert asyncio.run(scenario()) == (429, 503, {"active": 1, "queued": 0}, {"active": 0, "queued": 0})
+
+
+def _serve(tmp_path, agent, overrides):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "faq.md").write_text("# FAQ\n\nPrazo da página de resgate: cinco dias.", encoding="utf-8")
+    index = retriever_local.build_or_load_index(str(docs), str(tmp_path / "idx"))
+    previous = app.dependency_overrides.get(local_index)
+    app.dependency_overrides.update({local_index: lambda: index, doc_researcher: lambda: agent, **overrides})
+
+    def restore():
+        for dep in (doc_researcher, *overrides):
+            del app.dependency_overrides[dep]
+        app.dependency_overrides[local_index] = previous
+
+    return restore
+
+
+async def _burst(queries):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(client.post("/ask", json={"query": q}) for q in queries))
+
+
+class SlowAgent:
+    def __init__(self):
+        self.calls = 0
+
+    async def ahandle_local(self, query, passages, sources):
+        self.calls += 1
+        await asyncio.sleep(0.2)
+        return {"answer": f"resposta {self.calls}", "sources": sources}
+
+
+def test_identical_questions_share_one_model_call(tmp_path):
+    agent, flights = SlowAgent(), SingleFlight("answer")
+    restore = _serve(tmp_path, agent, {ask_flights: lambda: flights})
+    try:
+        responses = asyncio.run(_burst(["Qual o prazo da página de resgate?"] * 8 + ["qual o prazo da pagina de resgate"]))
+        assert len(flights) == 0
+    finally:
+        restore()
+
+    assert agent.calls == 1
+    assert {r.json()["answer"] for r in responses} == {"resposta 1"}
+
+
+def test_full_model_queue_is_shed_with_429(tmp_path):
+    agent = SlowAgent()
+    limiter = Limiter("mock", max_concurrent=1, max_queue=1, queue_timeout=5)
+    restore = _serve(tmp_path, agent, {llm_limiter: lambda: limiter})
+    try:
+        responses = asyncio.run(_burst([f"prazo da página de resgate {i}" for i in range(5)]))
+    finally:
+        restore()
+
+    codes = sorted(r.status_code for r in responses)
+    assert codes == [200, 200, 429, 429, 429]
+    assert all(r.headers["Retry-After"] == "5" for r in responses if r.status_code == 429)
@@ -0,0 +1,62 @@
+import time
+
+from src.services import retriever_local
+from src.services.answer_cache import AnswerCache, normalize_query
+
+
+def _index(tmp_path, faq_text="# FAQ\n\nPrazo de desenvolvimento da página de resgate é de cinco dias."):
+    docs = tmp_path / "docs"
+    docs.mkdir(exist_ok=True)
+    (docs / "faq.md").write_text(faq_text, encoding="utf-8")
+    (docs / "loja.md").write_text("# Loja\n\nCadastro de produtos, estoque e frete grátis.", encoding="utf-8")
+    return retriever_local.build_or_load_index(str(docs), str(tmp_path / "idx"))
+
+
+def test_normalize_query():
+    assert normalize_query("  Qual o PRAZO da Página?! ") == "qual o prazo da pagina"
+
+
+def test_exact_and_near_duplicate_hits(tmp_path):
+    index = _index(tmp_path)
+    cache = AnswerCache(similarity=0.8)
+    query = "qual o prazo da página de resgate"
+    passages = retriever_local.search(index, query, k=1)
+    assert cache.get(index, query, passages) is None
+
+    cache.put(index, query, passages, {"answer": "cinco dias", "sources": ["faq.md"]})
+    assert cache.get(index, "Qual o prazo da página de resgate?", passages)["answer"] == "cinco dias"
+
+    near = "qual é o prazo da página de resgate"
+    assert cache.get(index, near, retriever_local.search(index, near, k=1))["answer"] == "cinco dias"
+
+    other = retriever_local.search(index, "frete grátis", k=1)
+    assert cache.get(index, query, other) is None
+    assert cache.stats() == {"entries": 1, "hits": 2, "misses": 2}
+
+
+def test_ttl_and_lru_eviction(tmp_path, monkeypatch):
+    index = _index(tmp_path)
+    cache = AnswerCache(max_entries=1, ttl=10)
+    a = retriever_local.search(index, "prazo", k=1)
+    b = retriever_local.search(index, "frete", k=1)
+    cache.put(index, "prazo", a, {"answer": "a", "sources": []})
+    cache.put(index, "frete", b, {"answer": "b", "sources": []})
+    assert cache.get(index, "prazo", a) is None
+
+    now = time.time()
+    monkeypatch.setattr("src.services.answer_cache.time.time", lambda: now + 60)
+    assert cache.get(index, "frete", b) is None
+
+
+def test_persistent_tier_is_invalidated_by_rebuild(tmp_path):
+    db = str(tmp_path / "answers.db")
+    index = _index(tmp_path)
+    passages = retriever_local.search(index, "prazo", k=1)
+    AnswerCache(db_path=db).put(index, "prazo", passages, {"answer": "cinco dias", "sources": []})
+
+    assert AnswerCache(db_path=db).get(index, "prazo", passages)["answer"] == "cinco dias"
+
+    rebuilt = _index(tmp_path, faq_text="# FAQ\n\nPrazo de desenvolvimento da página de resgate é de dez dias.")
+    fresh = AnswerCache(db_path=db)
+    assert fresh.get(rebuilt, "prazo", passages) is None
+    assert fresh.get(rebuilt, "prazo", retriever_local.search(rebuilt, "prazo", k=1)) is None
@@ -4,7 +4,8 @@ from src.app.main import app
 client = TestClient(app)
 
 # Override dependencies to speed up tests and avoid external calls
-from src.app.deps import local_index
+from src.app.deps import local_index, request_log
+from src.core.request_log import RequestLog
 
 def _empty_index():
     """Return an empty index so that /ask does not call external services."""
@@ -27,13 +28,25 @@ def test_stats():
     data = response.json()
     # With the empty index override we expect zeros but simply assert keys exist
     assert "files" in data and "chunks" in data
+    assert "generation" in data and "build_seconds" in data
     assert isinstance(data["files"], int)
     assert isinstance(data["chunks"], int)
 
 
-def test_ask_empty_query():
-    response = client.post("/ask", json={"query": ""})
+def _logged(tmp_path, path, query):
+    log = tmp_path / "requests.log"
+    app.dependency_overrides[request_log] = lambda: RequestLog(str(log))
+    try:
+        response = client.post(path, json={"query": query})
+    finally:
+        del app.dependency_overrides[request_log]
+    return response, log.exists()
+
+
+def test_ask_empty_query(tmp_path):
+    response, logged = _logged(tmp_path, "/ask", "")
     assert response.status_code == 400
+    assert not logged
 
 
 def test_ask_no_results():
@@ -43,3 +56,91 @@ def test_ask_no_results():
     assert "answer" in payload
     assert "sources" in payload
     assert isinstance(payload["sources"], list)
+
+
+def test_search_batch_empty_index():
+    response = client.post("/search/batch", json={"queries": ["pergunta um", "pergunta dois"], "k": 3})
+    assert response.status_code == 200
+    assert response.json() == {"results": [[], []]}
+
+
+def test_search_batch_requires_queries():
+    response = client.post("/search/batch", json={"queries": []})
+    assert response.status_code == 400
+
+
+def test_ask_serves_concurrent_requests(tmp_path):
+    import asyncio
+    import time
+
+    import httpx
+
+    from src.app.deps import doc_researcher
+    from src.services import retriever_local
+
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "faq.md").write_text("# FAQ\n\nPrazo da página de resgate: cinco dias.", encoding="utf-8")
+    index = retriever_local.build_or_load_index(str(docs), str(tmp_path / "idx"))
+
+    class SlowAgent:
+        async def ahandle_local(self, query, passages, sources):
+            await asyncio.sleep(0.2)
+            return {"answer": query, "sources": sources}
+
+    app.dependency_overrides[local_index] = lambda: index
+    app.dependency_overrides[doc_researcher] = SlowAgent
+    try:
+        async def burst():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+                return await asyncio.gather(
+                    *(ac.post("/ask", json={"query": f"prazo da página {i}"}) for i in range(20))
+                )
+
+        start = time.perf_counter()
+        responses = asyncio.run(burst())
+        elapsed = time.perf_counter() - start
+    finally:
+        app.dependency_overrides[local_index] = _empty_index
+        del app.dependency_overrides[doc_researcher]
+
+    assert all(r.status_code == 200 for r in responses)
+    assert elapsed < 20 * 0.2 / 2
+
+
+def test_ask_stream_emits_sources_tokens_and_answer(tmp_path):
+    from src.app.deps import doc_researcher
+    from src.services import retriever_local
+
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "faq.md").write_text("# FAQ\n\nPrazo da página de resgate: cinco dias.", encoding="utf-8")
+    index = retriever_local.build_or_load_index(str(docs), str(tmp_path / "idx"))
+
+    class StreamingAgent:
+        async def astream_local(self, query, passages, sources):
+            for token in ["Cinco ", "dias."]:
+                yield "token", {"text": token}
+            yield "answer", {"answer": "Cinco dias.", "sources": sources}
+
+    app.dependency_overrides[local_index] = lambda: index
+    app.dependency_overrides[doc_researcher] = StreamingAgent
+    try:
+        response = client.post("/ask/stream", json={"query": "qual o prazo da página de resgate em dias"})
+    finally:
+        app.dependency_overrides[local_index] = _empty_index
+        del app.dependency_overrides[doc_researcher]
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [block.split("\n", 1) for block in response.text.strip().split("\n\n")]
+    names = [head.removeprefix("event: ") for head, _ in events]
+    assert names == ["sources", "token", "token", "answer"]
+    assert '"Cinco dias."' in events[-1][1]
+
+
+def test_ask_stream_empty_query(tmp_path):
+    response, logged = _logged(tmp_path, "/ask/stream", "  ")
+    assert response.status_code == 400
+    assert not logged
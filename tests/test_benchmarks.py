@@ -0,0 +1,60 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks import compact_index, retrieval, startup
+from src.services.retriever_local import Compaction
+
+
+def test_real_queries_report_latency_only(tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "faq.md").write_text("# FAQ\n\nPrazo da página de resgate: cinco dias.", encoding="utf-8")
+    (docs / "loja.md").write_text("# Loja\n\nFrete grátis acima de cem reais.", encoding="utf-8")
+    log = tmp_path / "requests.log"
+    log.write_text(
+        "\n".join(json.dumps(r) for r in [{"query": "prazo da página"}, {"title": "frete grátis"}, {"query": "prazo da página"}])
+        + "\nnot json\n",
+        encoding="utf-8",
+    )
+    assert retrieval.read_queries(log, 10) == ["prazo da página", "frete grátis"]
+
+    report = retrieval.run_real(docs, log, "tfidf", limit=10, k=2, batch=4)
+    assert report["queries"] == 2 and "recall@2" not in report
+    assert report["batched"]["qps"] > 0
+
+
+def test_compare_flags_slowdowns_and_recall_drops():
+    run = {"single": {"p50_ms": 1.0}, "batched": {"p50_ms": 0.5}, "recall@5": 0.9}
+    baseline = {"k": 5, "sizes": {"1000": run}, "real": {}}
+    current = {
+        "k": 5,
+        "sizes": {"1000": {"single": {"p50_ms": 2.0}, "batched": {"p50_ms": 0.5}, "recall@5": 0.8}},
+        "real": {"queries": 0},
+    }
+    problems = retrieval.compare(current, baseline, max_slowdown=1.25, max_recall_drop=0.01)
+    assert problems == ["1000 chunks: single p50 2.0 ms vs 1.0 ms", "1000 chunks: recall@5 0.8 vs 0.9"]
+    assert retrieval.compare(baseline, baseline, 1.25, 0.01) == []
+    # a baseline that still scored real queries does not break a latency-only run
+    old = {"k": 5, "sizes": {}, "real": {**run, "recall@5": 1.0}}
+    assert retrieval.compare({"k": 5, "sizes": {}, "real": {"single": run["single"], "batched": run["batched"]}},
+                             old, 1.25, 0.01) == []
+
+
+def test_app_import_stays_lazy_and_importtime_is_parsed():
+    code = "import sys, src.app.main; print(','.join(m for m in %r if m in sys.modules))" % (startup.HEAVY_MODULES,)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
+
+    slowest = startup.parse_importtime(result.stderr, top=3)
+    assert slowest[0]["module"] == "src.app.main"
+    assert [r["cumulative_ms"] for r in slowest] == sorted((r["cumulative_ms"] for r in slowest), reverse=True)
+
+
+def test_compaction_specs_are_parsed():
+    assert compact_index.parse_config("uint8, min_df=2,row_terms=64") == Compaction("uint8", min_df=2, row_terms=64)
+    assert compact_index.parse_config("float32") == Compaction("float32")
+    with pytest.raises(ValueError):
+        compact_index.parse_config("uint8,top=3")
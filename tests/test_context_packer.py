@@ -0,0 +1,31 @@
+from src.services import context_packer, retriever_local
+from src.services.retriever_local import Passage
+
+
+def test_merges_overlapping_chunks_back_into_source_text():
+    text = " ".join(f"palavra{i}" for i in range(400))
+    chunks = retriever_local._chunk_text(text)
+    assert len(chunks) > 2
+    passages = [Passage(text=c, path="doc.md", title="Doc", chunk_id=i, score=1.0 - i / 10) for i, c in enumerate(chunks)]
+
+    packed = context_packer.pack(passages)
+    assert packed.passages == [text]
+    assert packed.sources == ["doc.md"]
+    assert packed.tokens_saved > 0
+
+
+def test_drops_near_duplicates_and_respects_budget():
+    body = "Prazo de desenvolvimento da página de resgate é de cinco dias úteis após aprovação. " * 20
+    passages = [
+        Passage(text=body, path="a.md", title="A", chunk_id=0, score=0.9),
+        Passage(text=body + " ok", path="b.md", title="B", chunk_id=3, score=0.5),
+        Passage(text="Frete grátis para todo o Brasil. " * 40, path="c.md", title="C", chunk_id=1, score=0.4),
+    ]
+
+    packed = context_packer.pack(passages, token_budget=600)
+    assert packed.sources == ["a.md", "c.md"]
+    assert packed.tokens <= 600
+    assert packed.passages[1].endswith("…")
+    assert packed.dropped == 1
+
+    assert context_packer.pack([]).passages == []
@@ -0,0 +1,102 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from src.app.deps import doc_researcher, faq_index, local_indexes
+from src.app.main import app
+from src.core.config import Settings, get_settings
+from src.services import retriever_local
+from src.services.faq import FaqEntry, FaqIndex, load_faq, mine_candidates
+
+
+def test_load_skips_unanswered_entries_and_matches_confidently(tmp_path):
+    path = tmp_path / "faq.json"
+    path.write_text(
+        "\n".join(json.dumps(r, ensure_ascii=False) for r in [
+            {"question": "Quanto tempo leva um desenvolvimento de pagina de resgate?", "answer": "Cinco dias úteis."},
+            {"question": "Como redefinir minha senha?", "answer": "Pelo link do email.", "sources": ["senha.md"]},
+            {"question": "Qual o horário do suporte?", "date": "2023-10-07"},
+        ]),
+        encoding="utf-8",
+    )
+    entries = load_faq(str(path))
+    assert [e.question for e in entries] == [
+        "Quanto tempo leva um desenvolvimento de pagina de resgate?",
+        "Como redefinir minha senha?",
+    ]
+    assert entries[0].sources == ["faq.json"]
+
+    faq = FaqIndex(entries)
+    entry, score = faq.match("quanto tempo leva o desenvolvimento de uma página de resgate")
+    assert entry.answer == "Cinco dias úteis." and score >= faq.min_similarity
+    assert faq.match("Quanto tempo leva um desenvolvimento de landing page?") is None
+    assert faq.match("como configurar o servidor de email") is None
+
+
+def test_mining_groups_repeated_questions():
+    questions = (
+        ["Como emitir a segunda via do boleto?"] * 3
+        + ["como emitir segunda via do boleto"] * 2
+        + ["Como redefinir minha senha?"] * 4
+        + ["Qual o prazo do frete?"]
+    )
+    existing = FaqIndex([FaqEntry("Como redefinir minha senha?", "Pelo link do email.")])
+    candidates = mine_candidates(questions, existing, min_count=3)
+    assert candidates == [{
+        "question": "Como emitir a segunda via do boleto?",
+        "answer": "",
+        "count": 5,
+        "variants": ["como emitir segunda via do boleto"],
+    }]
+
+
+def test_ask_answers_faq_without_the_model():
+    class NoModel:
+        async def ahandle_local(self, *args):
+            raise AssertionError("the model must not be called")
+
+    faq = FaqIndex([FaqEntry("Qual o prazo da página de resgate?", "Cinco dias úteis.", ["prazos.md"])])
+    app.dependency_overrides[faq_index] = lambda: faq
+    app.dependency_overrides[doc_researcher] = NoModel
+    try:
+        client = TestClient(app)
+        response = client.post("/ask", json={"query": "qual o prazo da pagina de resgate"})
+        stream = client.post("/ask/stream", json={"query": "Qual o prazo da página de resgate?"})
+    finally:
+        del app.dependency_overrides[faq_index]
+        del app.dependency_overrides[doc_researcher]
+
+    assert response.json() == {"answer": "Cinco dias úteis.", "sources": ["prazos.md"]}
+    assert [b.split("\n", 1)[0] for b in stream.text.strip().split("\n\n")] == ["event: sources", "event: answer"]
+
+
+def test_faq_is_skipped_when_the_request_narrows_the_shards(tmp_path):
+    class Model:
+        async def ahandle_local(self, query, passages, sources):
+            return {"answer": "Do shard erp.", "sources": sources}
+
+    indexes = {}
+    for name in ("loja", "erp"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / f"{name}.md").write_text(f"# {name}\n\nPrazo da página de resgate no {name}.", encoding="utf-8")
+        indexes[name] = retriever_local.build_or_load_index(str(tmp_path / name), str(tmp_path / "idx" / name))
+    faq = FaqIndex([FaqEntry("Qual o prazo da página de resgate?", "Cinco dias úteis.", ["prazos.md"])])
+    app.dependency_overrides.update({faq_index: lambda: faq, doc_researcher: Model, local_indexes: lambda: indexes})
+    try:
+        client = TestClient(app)
+        everywhere = client.post("/ask", json={"query": "Qual o prazo da página de resgate?"}).json()
+        erp = client.post("/ask", json={"query": "Qual o prazo da página de resgate?", "shards": ["erp"]}).json()
+        unknown = client.post("/ask", json={"query": "Qual o prazo da página de resgate?", "shards": ["crm"]})
+    finally:
+        for dep in (faq_index, doc_researcher, local_indexes):
+            del app.dependency_overrides[dep]
+
+    assert everywhere["answer"] == "Cinco dias úteis."
+    assert erp["answer"] == "Do shard erp." and erp["sources"] != ["prazos.md"]
+    assert unknown.status_code == 400
+
+
+def test_faq_path_default_is_the_same_everywhere(monkeypatch):
+    monkeypatch.delenv("FAQ_PATH", raising=False)
+    monkeypatch.delenv("DOCS_DIR", raising=False)
+    assert get_settings().faq_path == Settings().faq_path
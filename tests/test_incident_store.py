@@ -0,0 +1,101 @@
+from datetime import datetime, timezone
+
+import httpx
+
+from src.core.config import get_settings
+from src.services import incidents
+from src.services.incident_store import IncidentStore
+from src.services.incidents import IncidentFeed
+
+
+NOW = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+
+
+def _payload(*executions):
+    by_workflow = {}
+    for workflow, ts, node, message in executions:
+        incident = by_workflow.setdefault(workflow, {"workflow": workflow, "count": 0, "responsibles": ["U1"], "executions": []})
+        incident["count"] += 1
+        incident["executions"].append({"ts": ts, "last_node": node, "error_message": message, "execution_url": f"u/{workflow}/{ts}"})
+    for incident in by_workflow.values():
+        stamps = sorted(e["ts"] for e in incident["executions"])
+        incident["first_ts"], incident["last_ts"] = stamps[0], stamps[-1]
+        sigs = {}
+        for e in incident["executions"]:
+            sigs[(e["last_node"], e["error_message"])] = sigs.get((e["last_node"], e["error_message"]), 0) + 1
+        incident["error_signatures"] = [{"last_node": n, "error_message": m, "count": c} for (n, m), c in sigs.items()]
+    return {"incidents": list(by_workflow.values())}
+
+
+def test_ingest_is_incremental_and_prunes_old_executions():
+    store = IncidentStore(retention_hours=24)
+    first = _payload(
+        ("Pedidos", "2024-05-01T12:00:00Z", "HTTP", "timeout"),
+        ("Pedidos", "2024-05-01T09:00:00-03:00", "HTTP", "timeout"),
+        ("Pedidos", "2024-04-20T10:00:00Z", "HTTP", "timeout"),  # beyond retention
+    )
+    assert store.ingest(first, now=NOW) == 2
+    second = _payload(
+        ("Pedidos", "2024-05-01T12:00:00Z", "HTTP", "timeout"),
+        ("Pedidos", "2024-05-01T12:10:00Z", "DB", "deadlock"),
+    )
+    assert store.ingest(second, now=NOW) == 1
+
+    [pedidos] = store.workflow("pedi")
+    assert pedidos["first_ts"] == "2024-04-20T10:00:00Z" and pedidos["last_ts"] == "2024-05-01T12:10:00Z"
+    # -03:00 is normalized to UTC, so both 12:00Z executions sort together
+    assert [e["ts"] for e in pedidos["executions"]] == ["2024-05-01T12:10:00Z", "2024-05-01T12:00:00Z", "2024-05-01T12:00:00Z"]
+    assert store.workflow("100%") == []
+
+
+def test_time_window_and_top_signatures():
+    store = IncidentStore()
+    store.ingest(_payload(
+        ("Pedidos", "2024-05-01T12:20:00Z", "HTTP", "timeout"),
+        ("Pedidos", "2024-05-01T08:00:00Z", "HTTP", "timeout"),
+        ("Estoque", "2024-05-01T12:25:00Z", "HTTP", "timeout"),
+        ("Estoque", "2024-05-01T12:05:00Z", "DB", "deadlock"),
+        ("Estoque", "2024-05-01T07:00:00Z", "DB", "deadlock"),
+        ("Estoque", "2024-05-01T06:00:00Z", "DB", "deadlock"),
+    ), now=NOW)
+
+    window = store.since(1, now=NOW)
+    assert window["executions"] == 3
+    assert [w["workflow"] for w in window["workflows"]] == ["Estoque", "Pedidos"]
+    assert window["latest"][0]["ts"] == "2024-05-01T12:25:00Z"
+    assert store.since(1, workflow="pedidos", now=NOW)["executions"] == 1
+
+    recent = store.top_signatures(1, hours=1, now=NOW)
+    assert (recent[0]["error_message"], recent[0]["count"]) == ("timeout", 2)
+    assert sorted(recent[0]["workflows"]) == ["Estoque", "Pedidos"]
+    overall = store.top_signatures(2)
+    assert sorted((s["error_message"], s["count"]) for s in overall) == [("deadlock", 3), ("timeout", 3)]
+
+
+def test_history_on_disk_survives_a_restart(tmp_path, monkeypatch):
+    monkeypatch.setenv("INDEX_PATH", str(tmp_path / "idx"))
+    monkeypatch.delenv("INCIDENT_DB", raising=False)
+    db = get_settings().incident_db
+    assert db == str(tmp_path / "idx" / "incidents.db")
+
+    store = IncidentStore(db)
+    store.ingest(_payload(("Pedidos", "2024-05-01T12:20:00Z", "HTTP", "timeout")), now=NOW)
+    store.close()
+    assert IncidentStore(db).since(1, now=NOW)["executions"] == 1
+
+
+def test_feed_ingests_each_fresh_payload(monkeypatch):
+    payload = _payload(("Pedidos", "2024-05-01T12:20:00Z", "HTTP", "timeout"))
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json=payload)
+
+    monkeypatch.setattr(incidents, "get_client", lambda: httpx.Client(transport=httpx.MockTransport(handler)))
+    store = IncidentStore(retention_hours=0)
+    feed = IncidentFeed("http://n8n.local/hook", ttl=30, on_payload=store.ingest)
+    feed.fetch()
+    feed.fetch()
+    assert len(calls) == 1
+    assert store.workflow("Pedidos")[0]["count"] == 1
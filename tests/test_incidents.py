@@ -0,0 +1,103 @@
+import asyncio
+import json
+import threading
+
+import httpx
+
+from src.services import incidents
+from src.services.incidents import IncidentFeed, digest
+
+
+PAYLOAD = {
+    "incidents": [
+        {
+            "workflow": "Pedidos",
+            "count": 3,
+            "first_ts": "2024-05-01T10:00:00Z",
+            "last_ts": "2024-05-01T12:00:00Z",
+            "responsibles": ["U1"],
+            "error_signatures": [{"last_node": "HTTP", "error_message": "timeout", "count": 3}],
+            "executions": [
+                {"ts": "2024-05-01T12:00:00Z", "last_node": "HTTP", "error_message": "timeout", "execution_url": "u/3"},
+                {"ts": "2024-05-01T10:00:00Z", "last_node": "HTTP", "error_message": "timeout", "execution_url": "u/1"},
+            ],
+        },
+        {
+            "workflow": "Estoque",
+            "count": 5,
+            "first_ts": "2024-04-30T08:00:00Z",
+            "last_ts": "2024-05-01T11:00:00Z",
+            "responsibles": ["U2"],
+            "error_signatures": [
+                {"last_node": "HTTP", "error_message": "timeout", "count": 4},
+                {"last_node": "DB", "error_message": "deadlock", "count": 1},
+            ],
+            "executions": [{"ts": "2024-05-01T11:00:00Z", "last_node": "DB", "error_message": "deadlock", "execution_url": "u/2"}],
+        },
+    ]
+}
+
+
+def test_digest_ranks_workflows_and_groups_signatures():
+    summary = digest(PAYLOAD, latest_executions=2)
+    assert summary["incidents"] == 2 and summary["occurrences"] == 8
+    assert summary["window"] == {"first_ts": "2024-04-30T08:00:00Z", "last_ts": "2024-05-01T12:00:00Z"}
+    assert [w["workflow"] for w in summary["top_workflows"]] == ["Estoque", "Pedidos"]
+    top = summary["error_signatures"][0]
+    assert (top["last_node"], top["count"], top["workflows"]) == ("HTTP", 7, ["Pedidos", "Estoque"])
+    assert [e["execution_url"] for e in summary["latest_executions"]] == ["u/3", "u/2"]
+    # n8n sometimes wraps the body in a list of items
+    assert digest([PAYLOAD])["occurrences"] == 8
+
+
+def _feed(monkeypatch, handler, ttl=30.0):
+    transport = httpx.MockTransport(handler)
+    monkeypatch.setattr(incidents, "get_client", lambda: httpx.Client(transport=transport))
+    monkeypatch.setattr(incidents, "get_async_client", lambda: httpx.AsyncClient(transport=transport))
+    return IncidentFeed("http://n8n.local/hook", ttl=ttl)
+
+
+def test_concurrent_fetches_share_one_request(monkeypatch):
+    calls = []
+    entered, release = threading.Event(), threading.Event()
+
+    def handler(request):
+        calls.append(request)
+        entered.set()
+        release.wait(2)
+        return httpx.Response(200, json=PAYLOAD)
+
+    feed = _feed(monkeypatch, handler)
+
+    leader = threading.Thread(target=feed.fetch)
+    leader.start()
+    entered.wait(2)
+    followers = []
+    workers = [threading.Thread(target=lambda: followers.append(feed.fetch())) for _ in range(7)]
+    for worker in workers:
+        worker.start()
+    release.set()
+    for worker in [leader, *workers]:
+        worker.join()
+    assert len(calls) == 1 and len(set(followers)) == 1
+
+    feed.ttl = 0
+
+    async def burst():
+        return await asyncio.gather(*(feed.afetch() for _ in range(10)))
+
+    results = asyncio.run(burst())
+    assert len(calls) == 2 and len(set(results)) == 1
+    assert json.loads(results[0])["occurrences"] == 8
+
+
+def test_cached_digest_is_reused_and_served_stale_on_error(monkeypatch):
+    responses = [httpx.Response(200, json=PAYLOAD), httpx.Response(502, text="bad gateway")]
+    feed = _feed(monkeypatch, lambda request: responses.pop(0))
+
+    first = feed.fetch()
+    assert feed.fetch() == first and len(responses) == 1  # second call hit the cache
+
+    feed.ttl = 0
+    stale = json.loads(feed.fetch())
+    assert stale["stale"] is True and stale["occurrences"] == 8
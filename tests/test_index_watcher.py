@@ -0,0 +1,77 @@
+import threading
+import time
+
+import pytest
+
+from src.services import retriever_local
+from src.services.index_watcher import DocsWatcher, LiveIndex
+
+
+def _live(tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "loja.md").write_text("# Loja\n\nCadastro de produtos e frete grátis.", encoding="utf-8")
+    return docs, _live_over(docs, tmp_path)
+
+
+def _live_over(docs, tmp_path):
+    return LiveIndex(lambda: retriever_local.build_or_load_index(str(docs), str(tmp_path / "idx")))
+
+
+def test_workers_refreshing_at_once_share_one_rebuild(tmp_path):
+    docs, first = _live(tmp_path)
+    # one LiveIndex per API worker, all over the same docs and index directory
+    workers = [first] + [_live_over(docs, tmp_path) for _ in range(3)]
+    old = {live.get()["generation"] for live in workers}
+
+    (docs / "novo.md").write_text("# Novo\n\nIntegração com Slack via n8n.", encoding="utf-8")
+    threads = [threading.Thread(target=live.refresh) for live in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    new = {live.get()["generation"] for live in workers}
+    assert len(old) == 1 and len(new) == 1 and new != old
+    generations = [p.name for p in (tmp_path / "idx").iterdir() if p.name.startswith("gen-")]
+    assert sorted(generations) == sorted(old | new)
+
+
+def test_refresh_swaps_generation_and_keeps_old_index_usable(tmp_path):
+    docs, live = _live(tmp_path)
+    old = live.get()
+    assert live.refresh() is False
+
+    (docs / "novo.md").write_text("# Novo\n\nIntegração com Slack via n8n.", encoding="utf-8")
+    assert live.refresh() is True
+    new = live.get()
+    assert new["generation"] != old["generation"]
+    assert retriever_local.search(new, "slack", k=1)[0].path.endswith("novo.md")
+    # a request that resolved the old generation keeps searching it
+    assert retriever_local.search(old, "slack", k=1) == []
+    assert retriever_local.search(old, "frete", k=1)[0].path.endswith("loja.md")
+    assert live.stats()["generation"] == new["generation"] and live.stats()["reloads"] == 1
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_watcher_debounces_and_reloads(tmp_path, use_inotify):
+    docs, live = _live(tmp_path)
+    first = live.get()["generation"]
+    reloaded = threading.Event()
+
+    def on_change():
+        live.refresh()
+        reloaded.set()
+
+    watcher = DocsWatcher(str(docs), on_change, debounce=0.2, poll_interval=0.1, use_inotify=use_inotify)
+    watcher.start()
+    try:
+        for i in range(3):
+            (docs / "loja.md").write_text(f"# Loja\n\nVersão {i} com cupom de desconto.", encoding="utf-8")
+            time.sleep(0.05)
+        assert reloaded.wait(10)
+    finally:
+        watcher.stop()
+    assert live.reloads == 1
+    assert live.get()["generation"] != first
+    assert retriever_local.search(live.get(), "cupom", k=1)
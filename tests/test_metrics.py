@@ -0,0 +1,58 @@
+from fastapi.testclient import TestClient
+
+from src.app.deps import local_index
+from src.app.main import app
+from src.core import metrics
+from src.services import retriever_local
+
+
+def test_disabled_metrics_record_nothing():
+    metrics.configure(False)
+    metrics.reset()
+    try:
+        with metrics.span("retrieval.score", backend="tfidf"):
+            pass
+        metrics.CACHE_REQUESTS.inc(cache="answer", result="hit")
+        assert "docbot_span_seconds_count" not in metrics.render()
+        assert "docbot_cache_requests_total{" not in metrics.render()
+    finally:
+        metrics.configure(True)
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics.configure(True)
+    metrics.reset()
+    for value in (50, 300, 300, 200000):
+        metrics.PROMPT_CHARS.observe(value, agent="doc_researcher")
+    text = metrics.render()
+    assert 'docbot_prompt_chars_bucket{agent="doc_researcher",le="100"} 1' in text
+    assert 'docbot_prompt_chars_bucket{agent="doc_researcher",le="500"} 3' in text
+    assert 'docbot_prompt_chars_bucket{agent="doc_researcher",le="+Inf"} 4' in text
+    assert 'docbot_prompt_chars_sum{agent="doc_researcher"} 200650' in text
+    assert 'docbot_prompt_chars_count{agent="doc_researcher"} 4' in text
+
+
+def test_metrics_endpoint_exposes_retrieval_spans(tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "faq.md").write_text("# FAQ\n\nPrazo da página de resgate: cinco dias.", encoding="utf-8")
+    index = retriever_local.build_or_load_index(str(docs), str(tmp_path / "idx"))
+
+    metrics.configure(True)
+    metrics.reset()
+    previous = app.dependency_overrides.get(local_index)
+    app.dependency_overrides[local_index] = lambda: index
+    try:
+        client = TestClient(app)
+        assert client.post("/search/batch", json={"queries": ["prazo"]}).status_code == 200
+        response = client.get("/metrics")
+    finally:
+        if previous is None:
+            app.dependency_overrides.pop(local_index, None)
+        else:
+            app.dependency_overrides[local_index] = previous
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'docbot_span_seconds_count{backend="tfidf",span="retrieval.vectorize"} 1' in response.text
+    assert 'docbot_span_seconds_count{backend="tfidf",span="retrieval.score"} 1' in response.text
@@ -0,0 +1,61 @@
+import asyncio
+import json
+
+import httpx
+
+from benchmarks import load
+from src.agents.doc_researcher import DocResearcher
+from src.agents.models import build_model
+from src.app.deps import doc_researcher, local_index
+from src.app.main import app
+from src.core.config import Settings
+from src.services import retriever_local
+
+
+FAST = Settings(llm_backend="mock", mock_llm_ttft_ms=5, mock_llm_tokens_per_second=5000)
+
+
+def test_mock_backend_is_deterministic():
+    agent = DocResearcher(FAST)
+    first = agent.handle_local("qual o prazo?", ["Prazo de cinco dias úteis."], ["faq.md"])
+    again = DocResearcher(FAST).handle_local("qual o prazo?", ["Prazo de cinco dias úteis."], ["faq.md"])
+    assert first == again == {"answer": "Prazo de cinco dias úteis.", "sources": ["faq.md"]}
+
+    model = build_model(FAST)
+    assert model._plan([]) == build_model(FAST)._plan([])
+    assert build_model(Settings()) is None
+
+
+def test_mock_backend_streams_json_answer():
+    async def collect():
+        return [e async for e in DocResearcher(FAST).astream_local("prazo?", ["Prazo de cinco dias."], ["faq.md"])]
+
+    events = asyncio.run(collect())
+    assert "".join(p["text"] for e, p in events if e == "token") == "Prazo de cinco dias."
+    assert events[-1] == ("answer", {"answer": "Prazo de cinco dias.", "sources": ["faq.md"]})
+
+
+def test_load_generator_reports_latency(tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "faq.md").write_text("# FAQ\n\nPrazo da página de resgate: cinco dias.", encoding="utf-8")
+    index = retriever_local.build_or_load_index(str(docs), str(tmp_path / "idx"))
+    previous = app.dependency_overrides.get(local_index)
+    app.dependency_overrides[local_index] = lambda: index
+    app.dependency_overrides[doc_researcher] = lambda: DocResearcher(FAST)
+
+    async def go():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+            return await load.run(client, ["prazo da página de resgate"], rate=40, duration=0.25, concurrency=4)
+
+    try:
+        report = asyncio.run(go())
+    finally:
+        del app.dependency_overrides[doc_researcher]
+        if previous is None:
+            app.dependency_overrides.pop(local_index, None)
+        else:
+            app.dependency_overrides[local_index] = previous
+    assert report["requests"] > 0 and report["ok"] == report["requests"]
+    assert set(report["latency_ms"]) == {"p50", "p90", "p99", "max"}
+    json.dumps(report)
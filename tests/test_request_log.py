@@ -0,0 +1,130 @@
+import asyncio
+import json
+import threading
+import time
+
+from src.core.request_log import RequestLog
+
+
+def _lines(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_batches_and_flushes_on_stop(tmp_path):
+    path = tmp_path / "requests.log"
+
+    async def run():
+        log = RequestLog(str(path), flush_interval=60)
+        await log.start()
+        for i in range(10):
+            await log.log({"query": f"pergunta {i}", "k": None})
+        await log.stop()
+        return log
+
+    log = asyncio.run(run())
+    records = _lines(path)
+    assert [r["query"] for r in records] == [f"pergunta {i}" for i in range(10)]
+    assert all("ts" in r for r in records)
+    assert log.written == 10 and log.dropped == 0
+
+
+def test_stop_flushes_the_batch_the_writer_is_holding(tmp_path):
+    path = tmp_path / "requests.log"
+
+    async def run():
+        log = RequestLog(str(path), flush_interval=60)
+        await log.start()
+        for i in range(5):
+            await log.log({"query": str(i)})
+        await asyncio.sleep(0.05)  # the writer has taken the records and waits for more
+        assert log._queue.qsize() == 0
+        await log.stop()
+
+    asyncio.run(run())
+    assert [r["query"] for r in _lines(path)] == ["0", "1", "2", "3", "4"]
+
+
+def test_writes_through_without_writer(tmp_path):
+    path = tmp_path / "requests.log"
+    asyncio.run(RequestLog(str(path)).log({"query": "prazo"}))
+    assert _lines(path)[0]["query"] == "prazo"
+
+
+def test_drop_policy_when_queue_is_full(tmp_path):
+    path = tmp_path / "requests.log"
+
+    async def run():
+        log = RequestLog(str(path), max_queue=2, policy="drop")
+        await log.start()
+        # The writer cannot run between these calls, so the queue fills up.
+        for i in range(5):
+            await log.log({"query": str(i)})
+        await log.stop()
+        return log
+
+    log = asyncio.run(run())
+    assert log.dropped == 3
+    assert [r["query"] for r in _lines(path)] == ["0", "1"]
+
+
+def test_rotates_by_size(tmp_path):
+    path = tmp_path / "requests.log"
+    log = RequestLog(str(path), max_bytes=200, backups=2)
+    for i in range(20):
+        asyncio.run(log.log({"query": "x" * 40, "i": i}))
+    rotated = sorted(p.name for p in tmp_path.glob("requests.log*") if p.suffix != ".lock")
+    assert rotated == ["requests.log", "requests.log.1", "requests.log.2"]
+    assert all(p.stat().st_size <= 200 for p in tmp_path.glob("requests.log*"))
+    assert _lines(path)[-1]["i"] == 19
+
+
+def test_workers_rotating_the_same_file_lose_nothing(tmp_path):
+    path = tmp_path / "requests.log"
+    errors = []
+
+    def worker(n):
+        # one RequestLog per thread stands in for one per worker process
+        log = RequestLog(str(path), max_bytes=300, backups=500)
+        try:
+            for i in range(100):
+                asyncio.run(log.log({"worker": n, "i": i}))
+        except Exception as exc:  # pragma: no cover - what the lock prevents
+            errors.append(exc)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    records = [r for p in tmp_path.glob("requests.log*") if p.suffix != ".lock" for r in _lines(p)]
+    assert sorted((r["worker"], r["i"]) for r in records) == [(n, i) for n in range(4) for i in range(100)]
+
+
+def test_rotates_by_age_under_steady_traffic(tmp_path):
+    path = tmp_path / "requests.log"
+    # started two hours ago, written to ever since
+    path.write_text(
+        "".join(json.dumps({"ts": time.time() - age, "query": q}) + "\n"
+                for age, q in ((7200, "antiga"), (1, "recente"))),
+        encoding="utf-8",
+    )
+    log = RequestLog(str(path), rotate_seconds=3600, backups=2)
+    asyncio.run(log.log({"query": "nova"}))
+
+    assert [r["query"] for r in _lines(tmp_path / "requests.log.1")] == ["antiga", "recente"]
+    assert [r["query"] for r in _lines(path)] == ["nova"]
+
+
+def test_file_age_survives_a_restart(tmp_path):
+    path = tmp_path / "requests.log"
+    first = RequestLog(str(path), rotate_seconds=3600, backups=2)
+    asyncio.run(first.log({"query": "antiga", "ts": time.time() - 7200}))
+
+    # a restarted (or another) worker must not treat the file as new
+    restarted = RequestLog(str(path), rotate_seconds=3600, backups=2)
+    asyncio.run(restarted.log({"query": "nova"}))
+
+    assert [r["query"] for r in _lines(tmp_path / "requests.log.1")] == ["antiga"]
+    assert [r["query"] for r in _lines(path)] == ["nova"]
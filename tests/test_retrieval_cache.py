@@ -0,0 +1,62 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from src.services import retriever_local, shards
+from src.services.retrieval_cache import RetrievalCache
+
+
+def _index(tmp_path, body="Prazo de entrega: cinco dias úteis."):
+    docs = tmp_path / "docs"
+    docs.mkdir(exist_ok=True)
+    (docs / "loja.md").write_text(f"# Loja\n\n{body}", encoding="utf-8")
+    return retriever_local.build_or_load_index(str(docs), str(tmp_path / "idx"))
+
+
+def test_workers_share_results_through_sqlite(tmp_path):
+    index = _index(tmp_path)
+    db = str(tmp_path / "retrieval.db")
+    first, second = RetrievalCache(db_path=db), RetrievalCache(db_path=db)
+    hits = retriever_local.search_many(index, ["prazo de entrega"], k=3)
+
+    assert first.get_many("tfidf", "default", index, ["prazo de entrega"], 3, 0.0) == [None]
+    first.put_many("tfidf", "default", index, ["prazo de entrega"], 3, 0.0, hits)
+
+    found = second.get_many("tfidf", "default", index, ["  Prazo de   ENTREGA ", "prazo"], 3, 0.0)
+    assert found == [hits[0], None]
+    assert second.get_many("tfidf", "default", index, ["prazo de entrega"], 5, 0.0) == [None]
+    assert second.stats() == {"entries": 1, "hits": 1, "misses": 2}
+
+
+def test_generation_change_invalidates_both_tiers(tmp_path):
+    index = _index(tmp_path)
+    db = str(tmp_path / "retrieval.db")
+    cache = RetrievalCache(db_path=db)
+    cache.put_many("tfidf", "default", index, ["prazo"], 3, 0.0, retriever_local.search_many(index, ["prazo"], k=3))
+
+    rebuilt = _index(tmp_path, "Prazo de entrega: dez dias.")
+    assert rebuilt["generation"] != index["generation"]
+    assert cache.get_many("tfidf", "default", rebuilt, ["prazo"], 3, 0.0) == [None]
+    rows = sqlite3.connect(db).execute("SELECT generation FROM retrievals").fetchall()
+    assert rows == []
+
+
+def test_scatter_gather_searches_only_cache_misses(tmp_path):
+    index = _index(tmp_path)
+    calls = []
+
+    def search_many(idx, queries, k=5, min_score=0.0):
+        calls.append(list(queries))
+        return retriever_local.search_many(idx, queries, k=k, min_score=min_score)
+
+    backend = SimpleNamespace(__name__="tfidf", search_many=search_many, score_ceiling=retriever_local.score_ceiling)
+    cache = RetrievalCache()
+    with ThreadPoolExecutor(1) as executor:
+        once = asyncio.run(shards.search_many(executor, backend, {"default": index}, ["prazo"], k=3, cache=cache))
+        twice = asyncio.run(
+            shards.search_many(executor, backend, {"default": index}, ["prazo", "entrega"], k=3, cache=cache)
+        )
+
+    assert calls == [["prazo"], ["entrega"]]
+    assert twice[0] == once[0] and twice[0][0].shard == "default"
@@ -0,0 +1,46 @@
+import random
+
+import numpy as np
+
+from src.services import retriever_bm25, retriever_local
+
+
+def _corpus(tmp_path, n_files=40, seed=7):
+    rng = random.Random(seed)
+    words = [f"termo{i}" for i in range(300)]
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for f in range(n_files):
+        # Zipf-like: low ids are frequent, high ids are rare.
+        body = " ".join(words[min(int(rng.paretovariate(1.1)) - 1, 299)] for _ in range(400))
+        (docs / f"doc{f}.md").write_text(f"# Doc {f}\n\n{body}", encoding="utf-8")
+    return docs
+
+
+def test_maxscore_matches_exhaustive_bm25(tmp_path):
+    docs = _corpus(tmp_path)
+    index = retriever_bm25.build_or_load_index(str(docs), str(tmp_path / "idx"))
+
+    for query in ["termo0 termo1 termo42", "termo3 termo150 termo7 termo0", "termo299 termo1"]:
+        terms, weights = retriever_bm25._query_terms(index, query)
+        full_docs, full_scores, full_visited = retriever_bm25._score(index, terms, weights, k=index["chunks"])
+        order = np.argsort(-full_scores, kind="stable")[:5]
+
+        hits = retriever_bm25.search(index, query, k=5)
+        assert np.allclose([h.score for h in hits], full_scores[order])
+
+        _, _, visited = retriever_bm25._score(index, terms, weights, k=5)
+        assert visited <= full_visited
+
+
+def test_bm25_postings_follow_base_index(tmp_path):
+    docs = _corpus(tmp_path, n_files=5)
+    index_path = str(tmp_path / "idx")
+    first = retriever_bm25.build_or_load_index(str(docs), index_path)
+    assert retriever_bm25.build_or_load_index(str(docs), index_path)["generation"] == first["generation"]
+
+    (docs / "novo.md").write_text("# Novo\n\nfrete grátis", encoding="utf-8")
+    updated = retriever_bm25.build_or_load_index(str(docs), index_path)
+    assert updated["base_generation"] != first["base_generation"]
+    assert retriever_bm25.search(updated, "frete grátis", k=1)[0].path.endswith("novo.md")
+    assert retriever_bm25.stats(updated) == retriever_local.stats(updated)
@@ -0,0 +1,78 @@
+import random
+
+import numpy as np
+
+from src.services import retriever_hybrid, retriever_local
+
+
+TOPICS = {
+    "frete": "O frete é calculado no checkout a partir do CEP de entrega e do peso dos produtos.",
+    "servidor": "Para configuração do servidor de email informe o host SMTP, a porta e as credenciais.",
+    "senha": "A redefinição de senha é feita pelo link enviado ao email cadastrado.",
+    "estoque": "A sincronização de estoque com o ERP roda a cada quinze minutos.",
+}
+
+
+def _docs(tmp_path, filler=0, seed=3):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for name, text in TOPICS.items():
+        (docs / f"{name}.md").write_text(f"# {name.title()}\n\n{text}", encoding="utf-8")
+    rng = random.Random(seed)
+    words = [f"palavra{i}" for i in range(400)]
+    for f in range(filler):
+        paragraphs = [" ".join(rng.choice(words) for _ in range(120)) for _ in range(20)]
+        (docs / f"filler{f}.md").write_text(f"# Filler {f}\n\n" + "\n\n".join(paragraphs), encoding="utf-8")
+    return docs
+
+
+def test_dense_channel_recovers_near_miss_wording(tmp_path):
+    docs = _docs(tmp_path)
+    index = retriever_hybrid.build_or_load_index(str(docs), str(tmp_path / "idx"))
+
+    query = "configuracao servidr emial"  # no exact term in common with the docs
+    assert retriever_local.search(index, query, k=3) == []
+    hits = retriever_hybrid.search(index, query, k=1)
+    assert hits and hits[0].path.endswith("servidor.md")
+
+    # exact matches still come first, and unrelated questions find nothing
+    assert retriever_hybrid.search(index, "frete CEP checkout", k=1)[0].path.endswith("frete.md")
+    assert retriever_hybrid.search(index, "xyzzy qwv", k=3) == []
+
+
+def test_dense_rows_are_reused_on_update(tmp_path):
+    docs = _docs(tmp_path)
+    index_path = str(tmp_path / "idx")
+    first = retriever_hybrid.build_or_load_index(str(docs), index_path)
+    assert retriever_hybrid.build_or_load_index(str(docs), index_path)["generation"] == first["generation"]
+
+    def vectors_by_path(index):
+        rows = np.asarray(index["dense_rows"])
+        out = {}
+        for path, doc in index["manifest"].items():
+            positions = np.flatnonzero((rows >= doc["start"]) & (rows < doc["stop"]))
+            out[path] = np.asarray(index["dense_vectors"][positions]).tobytes()
+        return out
+
+    before = vectors_by_path(first)
+    (docs / "senha.md").write_text("# Senha\n\nTroque a senha no painel.", encoding="utf-8")
+    updated = retriever_hybrid.build_or_load_index(str(docs), index_path)
+    after = vectors_by_path(updated)
+    assert updated["base_generation"] != first["base_generation"]
+    for path in before:
+        assert (before[path] == after[path]) == (not path.endswith("senha.md"))
+
+
+def test_ivf_probes_match_exact_search(tmp_path, monkeypatch):
+    monkeypatch.setattr(retriever_hybrid, "MIN_IVF_ROWS", 16)
+    docs = _docs(tmp_path, filler=6)
+    index = retriever_hybrid.build_or_load_index(str(docs), str(tmp_path / "idx"), dtype="float16")
+    n_lists = index["dense_centroids"].shape[0]
+    assert n_lists > 1 and index["dense_vectors"].dtype == np.float16
+
+    query = retriever_hybrid.embed(index, ["palavra7 palavra42 palavra300"])[0]
+    exact = np.asarray(index["dense_vectors"], dtype=np.float32) @ query
+    expected = np.asarray(index["dense_rows"])[np.argsort(-exact, kind="stable")[:5]]
+    monkeypatch.setattr(retriever_hybrid, "NPROBE", n_lists)
+    rows, _ = retriever_hybrid._dense_top(index, query, 5)
+    assert set(rows.tolist()) == set(expected.tolist())
@@ -0,0 +1,284 @@
+import os
+import random
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+from src.services import index_store, retriever_local
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def _docs(tmp_path):
+    docs = tmp_path / "docs"
+    _write(docs / "resgate.md", "# Página de Resgate\n\nLogo vetorizado e cor principal da identidade visual.")
+    _write(docs / "loja.md", "# Loja\n\nCadastro de produtos, estoque e frete grátis para o cliente.")
+    _write(docs / "sub" / "faq.md", "# FAQ\n\nPrazo de desenvolvimento da página de resgate é de cinco dias.")
+    return docs
+
+
+def _scores(index, query):
+    return {(p.path, p.chunk_id): round(p.score, 6) for p in retriever_local.search(index, query, k=10)}
+
+
+def test_full_build_matches_sklearn(tmp_path):
+    docs = _docs(tmp_path)
+    index = retriever_local.build_or_load_index(str(docs), str(tmp_path / "idx"))
+
+    vectorizer = TfidfVectorizer(ngram_range=(1, 2))
+    matrix = vectorizer.fit_transform(list(index["passages"]))
+    expected = cosine_similarity(vectorizer.transform(["página de resgate"]), matrix).ravel()
+
+    got = cosine_similarity(retriever_local._transform(index, ["página de resgate"]), index["matrix"]).ravel()
+    assert np.allclose(sorted(got), sorted(expected))
+
+
+def test_incremental_update_only_rechunks_changed_files(tmp_path, monkeypatch):
+    docs = _docs(tmp_path)
+    index_path = str(tmp_path / "idx")
+    retriever_local.build_or_load_index(str(docs), index_path)
+
+    _write(docs / "loja.md", "# Loja\n\nCadastro de produtos e cupom de desconto.")
+    _write(docs / "novo.md", "# Novo\n\nIntegração com Slack via n8n.")
+    os.remove(docs / "sub" / "faq.md")
+
+    chunked = []
+    original = retriever_local._chunk_markdown
+    monkeypatch.setattr(retriever_local, "_chunk_markdown", lambda text, *a, **kw: chunked.append(text) or original(text, *a, **kw))
+    updated = retriever_local.build_or_load_index(str(docs), index_path)
+
+    assert len(chunked) == 2
+    assert updated["files"] == 3
+    assert all("faq.md" not in path for path, _, _ in updated["meta"])
+
+    monkeypatch.setattr(retriever_local, "_chunk_markdown", original)
+    rebuilt = retriever_local.build_or_load_index(str(docs), str(tmp_path / "full"), force_rebuild=True)
+    for query in ["cupom de desconto", "slack n8n", "identidade visual", "página de resgate"]:
+        assert _scores(updated, query) == _scores(rebuilt, query)
+
+
+def test_unchanged_docs_load_without_rechunking(tmp_path, monkeypatch):
+    docs = _docs(tmp_path)
+    index_path = str(tmp_path / "idx")
+    first = retriever_local.build_or_load_index(str(docs), index_path)
+
+    # Bump mtime without touching the content: the hash check keeps the rows.
+    os.utime(docs / "loja.md", ns=(0, 10**18))
+    monkeypatch.setattr(retriever_local, "_chunk_markdown", lambda *a, **kw: (_ for _ in ()).throw(AssertionError))
+    loaded = retriever_local.build_or_load_index(str(docs), index_path)
+
+    assert loaded["chunks"] == first["chunks"]
+    assert _scores(loaded, "frete grátis") == _scores(first, "frete grátis")
+
+
+def test_loaded_index_is_memory_mapped(tmp_path):
+    docs = _docs(tmp_path)
+    index_path = str(tmp_path / "idx")
+    built = retriever_local.build_or_load_index(str(docs), index_path)
+    loaded = retriever_local.build_or_load_index(str(docs), index_path)
+
+    assert loaded["generation"] == built["generation"]
+    assert isinstance(loaded["idf"], np.memmap)
+    assert np.shares_memory(loaded["matrix"].indices, loaded["counts"].indices)
+    assert loaded["vocabulary"].get("resgate") is not None
+    hit = retriever_local.search(loaded, "frete grátis", k=1)[0]
+    assert hit.path.endswith("loja.md") and "frete grátis" in hit.text
+
+
+def test_search_skips_zero_and_low_scores(tmp_path):
+    docs = _docs(tmp_path)
+    index = retriever_local.build_or_load_index(str(docs), str(tmp_path / "idx"))
+
+    dense = cosine_similarity(retriever_local._transform(index, ["página de resgate"]), index["matrix"]).ravel()
+    hits = retriever_local.search(index, "página de resgate", k=10)
+    assert [round(h.score, 6) for h in hits] == [round(s, 6) for s in sorted(dense[dense > 0], reverse=True)]
+
+    assert retriever_local.search(index, "termo inexistente", k=5) == []
+    best = hits[0].score
+    assert [h.score for h in retriever_local.search(index, "página de resgate", k=10, min_score=best)] == [best]
+
+
+def test_search_many_matches_single_queries(tmp_path):
+    docs = _docs(tmp_path)
+    index = retriever_local.build_or_load_index(str(docs), str(tmp_path / "idx"))
+
+    queries = ["página de resgate", "frete grátis", "nada a ver", "identidade visual do cliente"]
+    batched = retriever_local.search_many(index, queries, k=2)
+    assert batched == [retriever_local.search(index, q, k=2) for q in queries]
+    assert batched[2] == []
+
+
+def _reference_chunks(text, chunk_size, overlap):
+    # Token-rescanning chunker the prefix-offset version replaced.
+    tokens = re.split(r"(\s+)", text)
+    chunks, i = [], 0
+    while i < len(tokens):
+        j, acc = i, 0
+        while j < len(tokens) and acc < chunk_size:
+            acc += len(tokens[j])
+            j += 1
+        chunk = "".join(tokens[i:j]).strip()
+        if chunk:
+            chunks.append(chunk)
+        if j >= len(tokens):
+            break
+        k, consumed = i, 0
+        while k < len(tokens) and consumed < max(chunk_size - overlap, 1):
+            consumed += len(tokens[k])
+            k += 1
+        i = k
+    return chunks
+
+
+def test_chunker_matches_reference():
+    rng = random.Random(0)
+    words = ["página", "resgate", "a", "identidade-visual", "x" * 120, "frete"]
+    for _ in range(50):
+        text = "".join(rng.choice(words) + rng.choice([" ", "\n", "\n\n", "  \t"]) for _ in range(rng.randint(0, 600)))
+        for size, overlap in [(900, 150), (50, 10), (10, 20), (1, 0)]:
+            assert retriever_local._chunk_text(text, size, overlap) == _reference_chunks(text, size, overlap)
+
+
+def test_parallel_ingestion_is_deterministic(tmp_path, monkeypatch):
+    docs = tmp_path / "docs"
+    for i in range(12):
+        _write(docs / f"doc{i:02d}.md", f"# Documento {i}\n\n" + " ".join(f"termo{i} comum{j}" for j in range(400)))
+
+    serial = retriever_local.build_or_load_index(str(docs), str(tmp_path / "serial"), workers=1)
+    monkeypatch.setattr(retriever_local, "PARALLEL_MIN_FILES", 2)
+    methods = []
+    pool = retriever_local.ProcessPoolExecutor
+
+    def spy(**kwargs):
+        methods.append(kwargs["mp_context"].get_start_method())
+        return pool(**kwargs)
+
+    monkeypatch.setattr(retriever_local, "ProcessPoolExecutor", spy)
+    # off the main thread, like the docs watcher and the startup warm-up
+    with ThreadPoolExecutor(1) as thread:
+        parallel = thread.submit(
+            retriever_local.build_or_load_index, str(docs), str(tmp_path / "parallel"), workers=3
+        ).result()
+
+    assert methods == ["spawn"]
+
+    assert list(parallel["passages"]) == list(serial["passages"])
+    assert list(parallel["meta"]) == list(serial["meta"])
+    assert _scores(parallel, "termo7 comum3") == _scores(serial, "termo7 comum3")
+
+
+MARKDOWN = """Introdução solta.
+
+# Loja
+
+## Frete
+
+Frete grátis acima de cem reais.
+
+| Região | Prazo |
+|--------|-------|
+| Sul    | 3 dias |
+| Norte  | 9 dias |
+
+## Integração
+
+```python
+def enviar(pedido):
+
+    return webhook.post(pedido)
+```
+"""
+
+
+def test_markdown_chunks_follow_sections():
+    chunks = retriever_local._chunk_markdown(MARKDOWN, chunk_size=120)
+    assert [section for _, section in chunks] == ["", "Loja > Frete", "Loja > Frete", "Loja > Integração"]
+    assert chunks[1][0].startswith("# Loja\n\n## Frete")
+    assert chunks[2][0].startswith("| Região") and chunks[2][0].endswith("| 9 dias |")
+    assert chunks[3][0].endswith("return webhook.post(pedido)\n```")
+
+
+def test_oversized_fence_is_split_with_its_fence():
+    code = "```sql\n" + "".join(f"select {i} from pedidos;\n" for i in range(200)) + "```\n"
+    pieces = [text for text, _ in retriever_local._chunk_markdown("# SQL\n\n" + code, chunk_size=300)]
+    assert len(pieces) > 1
+    assert pieces[0].startswith("# SQL\n\n```sql")
+    assert all(p.startswith("```sql") for p in pieces[1:])
+    assert all(p.endswith("```") for p in pieces)
+
+
+def test_search_returns_section_and_chunker_change_rebuilds(tmp_path, monkeypatch):
+    docs = tmp_path / "docs"
+    _write(docs / "loja.md", MARKDOWN)
+    index_path = str(tmp_path / "idx")
+    index = retriever_local.build_or_load_index(str(docs), index_path)
+    hit = retriever_local.search(index, "prazo região norte", k=1)[0]
+    assert hit.section == "Loja > Frete" and "| Norte" in hit.text
+
+    monkeypatch.setattr(retriever_local, "CHUNKER", "markdown-test")
+    rebuilt = retriever_local.build_or_load_index(str(docs), index_path)
+    assert rebuilt["generation"] != index["generation"]
+    assert rebuilt["manifest"][str(docs / "loja.md")]["sha1"] != index["manifest"][str(docs / "loja.md")]["sha1"]
+
+
+def test_compact_index_rewrites_weights_without_rechunking(tmp_path, monkeypatch):
+    docs = _docs(tmp_path)
+    index_path = str(tmp_path / "idx")
+    full = retriever_local.build_or_load_index(str(docs), index_path)
+
+    monkeypatch.setattr(retriever_local, "_chunk_markdown", lambda *a, **kw: (_ for _ in ()).throw(AssertionError))
+    compact = retriever_local.build_or_load_index(
+        str(docs), index_path, compaction=retriever_local.Compaction("uint8", min_df=2)
+    )
+    assert compact["generation"] != full["generation"]
+    assert compact["postings"].data.dtype == np.uint8 and compact["idf"].dtype == np.float32
+    assert not (compact["_dir"] / "data.npy").exists()
+    assert len(compact["terms"]) < len(compact["vocabulary"]) == len(full["vocabulary"])
+    assert retriever_local.serving_bytes(compact) < retriever_local.serving_bytes(full)
+
+    # only "página de resgate" (and its words) appear in more than one passage
+    exact = _scores(full, "prazo da página de resgate")
+    approx = _scores(compact, "prazo da página de resgate")
+    assert set(approx) == set(exact)
+    assert all(0 < approx[key] for key in approx)
+
+    trimmed = retriever_local.build_or_load_index(
+        str(docs), index_path, compaction=retriever_local.Compaction("float32", row_terms=3)
+    )
+    assert np.diff(trimmed["matrix"].tocsr().indptr).max() == 3
+    assert len(trimmed["terms"]) == len(full["vocabulary"])
+
+    restored = retriever_local.build_or_load_index(str(docs), index_path)
+    assert _scores(restored, "prazo da página de resgate") == exact
+
+
+def test_concurrent_builds_publish_one_generation(tmp_path):
+    docs = _docs(tmp_path)
+    index_path = tmp_path / "idx"
+    with ThreadPoolExecutor(4) as pool:
+        built = list(pool.map(lambda _: retriever_local.build_or_load_index(str(docs), str(index_path)), range(4)))
+
+    assert len({index["generation"] for index in built}) == 1
+    assert [p.name for p in index_path.iterdir() if p.name.startswith("gen-")] == [built[0]["generation"]]
+
+
+def test_prune_removes_generations_left_half_written(tmp_path):
+    docs = _docs(tmp_path)
+    index_path = tmp_path / "idx"
+    retriever_local.build_or_load_index(str(docs), str(index_path))
+    partial = index_path / "gen-0000000000000001-1"  # a writer died before its manifest
+    partial.mkdir()
+    (partial / "matrix.npy").write_bytes(b"\0" * 64)
+
+    _write(docs / "novo.md", "# Novo\n\nVersão 1.")
+    latest = retriever_local.build_or_load_index(str(docs), str(index_path))
+
+    generations = sorted(p.name for p in index_path.iterdir() if p.name.startswith("gen-"))
+    assert not partial.exists() and latest["generation"] in generations
+    assert len(generations) == index_store.KEEP_GENERATIONS
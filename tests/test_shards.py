@@ -0,0 +1,66 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.app.deps import local_indexes
+from src.app.main import app
+from src.core.config import parse_shards
+from src.services import retriever_bm25, shards
+
+
+def _shard(tmp_path, name, docs):
+    root = tmp_path / name
+    root.mkdir()
+    for i, body in enumerate(docs):
+        (root / f"{name}{i}.md").write_text(f"# {name} {i}\n\n{body}", encoding="utf-8")
+    return retriever_bm25.build_or_load_index(str(root), str(tmp_path / "idx" / name))
+
+
+def test_scatter_gather_normalizes_per_shard(tmp_path):
+    indexes = {
+        "loja": _shard(tmp_path, "loja", ["prazo de entrega do pedido " * 20, "cupom de desconto", "troca e devolução"]),
+        "erp": _shard(tmp_path, "erp", ["emissão de nota fiscal", "prazo de entrega fiscal", "cadastro de produto"]),
+    }
+    with ThreadPoolExecutor(2) as executor:
+        merged = asyncio.run(shards.search(executor, retriever_bm25, indexes, "prazo de entrega", k=4))
+        only_erp = asyncio.run(
+            shards.search(executor, retriever_bm25, shards.select(indexes, ["erp"]), "prazo de entrega", k=4)
+        )
+
+    assert {p.shard for p in merged} == {"loja", "erp"}
+    assert all(0 < p.score <= 1.0 for p in merged)
+    assert [p.score for p in merged] == sorted((p.score for p in merged), reverse=True)
+    # a single shard keeps raw BM25 scores, as an unsharded search would
+    raw = retriever_bm25.search(indexes["erp"], "prazo de entrega", k=4)
+    assert [(p.path, p.score) for p in only_erp] == [(p.path, p.score) for p in raw]
+    assert {p.shard for p in only_erp} == {"erp"}
+
+
+def test_search_batch_restricts_to_requested_shards(tmp_path):
+    indexes = {
+        "loja": _shard(tmp_path, "loja", ["prazo de entrega do pedido"]),
+        "erp": _shard(tmp_path, "erp", ["prazo de entrega da nota"]),
+    }
+    app.dependency_overrides[local_indexes] = lambda: indexes
+    try:
+        client = TestClient(app)
+        both = client.post("/search/batch", json={"queries": ["prazo de entrega"]}).json()["results"][0]
+        erp = client.post("/search/batch", json={"queries": ["prazo de entrega"], "shards": ["erp"]}).json()
+        unknown = client.post("/search/batch", json={"queries": ["prazo"], "shards": ["crm"]})
+    finally:
+        del app.dependency_overrides[local_indexes]
+
+    assert {p["shard"] for p in both} == {"loja", "erp"}
+    assert [p["shard"] for p in erp["results"][0]] == ["erp"]
+    assert unknown.status_code == 400 and "crm" in unknown.json()["detail"]
+
+
+def test_parse_shards():
+    assert parse_shards("loja=./docs/loja, erp = ./docs/erp,") == {"loja": "./docs/loja", "erp": "./docs/erp"}
+    assert parse_shards("") == {}
+    with pytest.raises(ValueError):
+        parse_shards("loja")
+    with pytest.raises(ValueError):
+        parse_shards("a=x,a=y")